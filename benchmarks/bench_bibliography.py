@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of bibliography2rdf.py against the size of the RDF/XML export.
+
+Synthetic exports of increasing size are written by repeating the records of a sample export (by
+default the one of datasets/uni-graz) with new rdf:about uris. Every export is converted to Turtle, and
+the time, the throughput in MB and records per second and the peak memory (tracemalloc, in an extra
+untimed run) are printed. With the streaming parser the throughput and the peak memory should stay the
+same whatever the size; with --dom the peak memory of loading the same export with ElementTree.parse,
+which grows with the size, is printed too.
+
+How to run it:
+bench_bibliography.py [--sample <RDF/XML file>] [--records N [N ...]] [--repeat N] [--dom]
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import tracemalloc
+from xml.etree import ElementTree
+from os.path import abspath, dirname, join, getsize
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from sdllod19.bibliography2rdf import RecordWriter, convert_file, RDF
+
+DEFAULT_SAMPLE = join(dirname(dirname(abspath(__file__))), "datasets", "uni-graz",
+                      "glossa.uni-graz.at_archive_objects_o_aaif.spacdh.bibl_datastreams_RDF_content.xml")
+
+
+def make_export(sample, n_records, filename):
+    """ writes an export with n_records records, copies of the records of the sample with new uris """
+    root = ElementTree.parse(sample).getroot()
+    records = list(root)
+    namespaces = [namespace for _, namespace in ElementTree.iterparse(sample, events=("start-ns",))]
+    for prefix, uri in namespaces:
+        ElementTree.register_namespace(prefix, uri)
+    with io.open(filename, mode="w", encoding="utf-8") as f_out:
+        f_out.write("<rdf:RDF" + "".join(' xmlns:%s="%s"' % namespace for namespace in namespaces) + ">")
+        for i in range(n_records):
+            record = records[i % len(records)]
+            about = record.get("{%s}about" % RDF)
+            if about is not None:
+                record.set("{%s}about" % RDF, about.split("#")[0] + "#r%d" % i)
+            f_out.write(ElementTree.tostring(record, encoding="unicode"))
+            if about is not None:
+                record.set("{%s}about" % RDF, about)
+        f_out.write("</rdf:RDF>")
+
+
+def convert(filename, out_dir):
+    writer = RecordWriter(join(out_dir, "bibliography.ttl"))
+    n_records = convert_file(filename, writer)
+    writer.close()
+    return n_records
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times bibliography2rdf.py on RDF/XML exports of increasing size')
+    parser.add_argument("--sample", default=DEFAULT_SAMPLE, help="RDF/XML export the synthetic records are copied from")
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 10000, 100000], help="sizes of the exports, in records")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs, the best one is kept")
+    parser.add_argument("--dom", action="store_true", help="also measure the peak memory of ElementTree.parse")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_bibliography_")
+    try:
+        print("%10s %10s %9s %9s %12s %12s%s" % ("records", "MB", "seconds", "MB/s", "records/s", "peak MB",
+                                                 " %12s" % "dom peak MB" if args.dom else ""))
+        for n_records in args.records:
+            filename = join(tmp_dir, "export.xml")
+            make_export(args.sample, n_records, filename)
+            size = getsize(filename)
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                convert(filename, tmp_dir)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            peak = peak_memory(convert, filename, tmp_dir)
+            line = "%10d %10.1f %9.3f %9.1f %12.0f %12.2f" % (n_records, size / 1e6, best, size / 1e6 / best,
+                                                             n_records / best, peak / 1e6)
+            if args.dom:
+                line += " %12.2f" % (peak_memory(ElementTree.parse, filename) / 1e6)
+            print(line)
+            os.remove(filename)
+    finally:
+        shutil.rmtree(tmp_dir)
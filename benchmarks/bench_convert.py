@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the conversion scripts, to find out whether a change makes them faster or slower.
+
+The input is either a vertical file or a synthetic file written by make_vertical.py. Every stage of the
+scripts is timed on its own, over the whole input:
+* read: reading the vertical file into lines.
+* header_parse: parsing the <doc ...> lines (vertical2json.process_document).
+* vertical2json.sentence_assembly: splitting the token lines and building the terminals, tokens and
+  sentence nodes (process_line and process_sentence).
+* vertical2json.read_document: the whole documents built in memory by read_document, the reader of
+  vertical2json.py before stream_documents, kept here as the reference of the streaming reader.
+* vertical2json.serialization: building the 5 json layers of every document and serializing them.
+* vertical2json.file_io: writing the 5 files of every document.
+* vertical2json.end_to_end: stream_documents, all of the above in a single pass.
+* vertical2json.batched_assembly: the terminals, tokens and sentence nodes of every document built and
+  serialized at once from the arrays of offsets (serialize_sentences), to compare with sentence_assembly
+  plus the serialization of the same 3 layers.
+* vertical2json.end_to_end_batched: stream_documents with --batch_tokens (the whole document by default).
+  Use long documents (e.g. --sentences 2000) to see the difference with the per sentence conversion.
+* vertical2conll.sentence_assembly and vertical2conll.file_io: read_document and write_document.
+* metadata2rdf.serialization: the metadata triples of every document.
+* conllrdf.serialization: the CoNLL-RDF Turtle of every document.
+* vertical2all.end_to_end: json, conll, metadata and CoNLL-RDF written in a single read.
+Every stage is run --repeat times and the best time is kept. Its throughput is given in tokens per second,
+or in headers per second for header_parse, which does not read the tokens, and its peak memory is measured with tracemalloc in an extra, untimed run (tracemalloc makes that run
+several times slower, --no_memory skips it).
+
+The results are saved as json with --out. --compare prints the change of every stage against a previous
+result file and exits with status 1 when a stage is slower by more than --threshold. A stage that takes
+less than --min_seconds in either result is marked as noise and never reported as a regression: the timing
+of such short stages changes by more than the threshold from one run to the next. Use a larger input to
+compare them.
+
+How to run it:
+bench_convert.py [--input <vertical file> | --docs N --sentences N --tokens N] [--repeat N] [--stages <name> ...] [--no_memory]
+                 [--batch_tokens N]
+                 [--out <results.json>] [--compare <previous results.json> [--threshold 0.1] [--min_seconds 0.01]]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+import tracemalloc
+from datetime import datetime
+from os.path import abspath, dirname, join, getsize, basename
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from sdllod19 import vertical2json
+from sdllod19 import vertical2conll
+from sdllod19 import metadata2rdf
+from sdllod19 import vertical2all
+from sdllod19.conllrdf import ConllRdfWriter, ConllRdfSink
+from make_vertical import make_vertical
+
+RESULTS_VERSION = 1
+# stages faster than this are not compared, their timing is mostly noise
+MIN_SECONDS = 0.01
+# batch size of the batched stages, large enough to convert every document at once
+BATCH_TOKENS = 1 << 30
+
+
+class Corpus(object):
+    """ the input of the benchmark, read once, with the intermediate results some stages start from """
+
+    def __init__(self, filename, batch_tokens=BATCH_TOKENS):
+        self.filename = filename
+        self.batch_tokens = batch_tokens
+        self.lines = read_lines(filename)
+        self.headers = [line for line in self.lines if line.startswith("<doc ")]
+        self.tokens = sum(1 for line in self.lines if not line.startswith("<"))
+        self.sentences = sum(1 for line in self.lines if line.startswith("</s>"))
+        # documents as (doc_id, header, list of sentences), each sentence being a list of token lines
+        self.documents = []
+        for line in self.lines:
+            if line.startswith("<doc "):
+                header = line
+                sentences = []
+            elif line.startswith("<s>"):
+                sentence = []
+            elif line.startswith("</s>"):
+                sentences.append(sentence)
+            elif line.startswith("</doc>"):
+                doc_id, _ = vertical2json.process_document(header)
+                self.documents.append((doc_id, header, sentences))
+            else:
+                sentence.append(line)
+        self.assembled = assemble_json(self)
+        self.serialized = serialize_json(self)
+        self.conll = assemble_conll(self)
+
+
+def read_lines(filename):
+    with io.open(filename, mode="r", encoding="utf-8") as f_in:
+        return f_in.readlines()
+
+
+def parse_headers(corpus):
+    for header in corpus.headers:
+        vertical2json.process_document(header)
+
+
+def process_line(line):
+    """splits a line of a vertical file to find out the elements it contains"""
+    ar_line = line.strip().split("\t")
+    return ar_line[0], ar_line[1], ar_line[2], ar_line[3]
+
+
+def read_document(f_in):
+    """ the reader of vertical2json.py before stream_documents: every document is built in memory and
+    yielded with the data of its 5 json layers """
+    segments_list = doc = doc_id = None
+    token_idx = terminal_idx = char_idx = 0
+    for line in f_in:
+        if line.startswith("<doc "):
+            token_idx = terminal_idx = char_idx = 0
+            doc_id, doc = vertical2json.process_document(line)
+            segments_list = {"data": [], "terminals": [], "tokens": [], "sentences": []}
+        elif line.startswith("<s>") and doc_id is not None:
+            segment = {"text": [], "token": [], "lemma": [], "pos": [], "sentence": {}}
+        elif line.startswith("</s>") and doc_id is not None:
+            data, terminals, tokens, sentence, token_idx, terminal_idx, char_idx = vertical2json.process_sentence(
+                segment, token_idx, terminal_idx, char_idx)
+            segments_list["data"].append(data)
+            segments_list["terminals"].extend(terminals)
+            segments_list["tokens"].extend(tokens)
+            segments_list["sentences"].append(sentence)
+        elif line.startswith("</doc>") and doc_id is not None:
+            yield doc_id, doc, segments_list
+        elif doc_id is not None:
+            word, token, lemma, pos = process_line(line)
+            segment["text"].append(word)
+            segment["token"].append(token)
+            segment["lemma"].append(lemma)
+            segment["pos"].append(pos)
+
+
+def segments(sentences):
+    """ the sentence dictionaries of read_document, from lists of token lines """
+    for sentence in sentences:
+        segment = {"text": [], "token": [], "lemma": [], "pos": [], "sentence": {}}
+        for line in sentence:
+            word, token, lemma, pos = process_line(line)
+            segment["text"].append(word)
+            segment["token"].append(token)
+            segment["lemma"].append(lemma)
+            segment["pos"].append(pos)
+        yield segment
+
+
+def assemble_json(corpus):
+    """ returns, for every document, the data of its 5 json layers """
+    assembled = []
+    for doc_id, header, sentences in corpus.documents:
+        token_idx = terminal_idx = char_idx = 0
+        data, terminals, tokens, nodes = [], [], [], []
+        for segment in segments(sentences):
+            text, s_terminals, s_tokens, node, token_idx, terminal_idx, char_idx = vertical2json.process_sentence(
+                segment, token_idx, terminal_idx, char_idx)
+            data.append(text)
+            terminals.extend(s_terminals)
+            tokens.extend(s_tokens)
+            nodes.append(node)
+        assembled.append((doc_id, header, data, terminals, tokens, nodes))
+    return assembled
+
+
+def assemble_batched(corpus):
+    """ returns, for every document, the text of its terminals, tokens and sentences lists """
+    return [vertical2json.serialize_sentences(list(segments(sentences)), 2)[1:4] for _, _, sentences in corpus.documents]
+
+
+def serialize_json(corpus):
+    """ returns, for every document, the text of its 5 json files """
+    serialized = []
+    for doc_id, header, data, terminals, tokens, nodes in corpus.assembled:
+        _, doc = vertical2json.process_document(header)
+        layers = vertical2json.document_layers(doc_id, doc, terminals, " ".join(data), tokens, nodes)
+        serialized.append((doc_id, [vertical2json.dump_json(layer, 2) for layer in layers]))
+    return serialized
+
+
+def write_json_files(corpus, out_dir):
+    for doc_id, texts in corpus.serialized:
+        for file_type, text in zip(("document", "datalayer", "terminals", "tokens", "sentences"), texts):
+            with io.open(join(out_dir, "%s.%s.json" % (doc_id, file_type)), mode="w", encoding="utf-8") as f_out:
+                f_out.write(text)
+
+
+def stream_json(corpus, out_dir):
+    for _ in vertical2json.stream_documents(corpus.lines, out_dir, "bench"):
+        pass
+
+
+def stream_json_batched(corpus, out_dir):
+    for _ in vertical2json.stream_documents(corpus.lines, out_dir, "bench", batch_tokens=corpus.batch_tokens):
+        pass
+
+
+def assemble_conll(corpus):
+    return list(vertical2conll.read_document(corpus.lines))
+
+
+def write_conll_files(corpus, out_dir):
+    for doc_id, segments in corpus.conll:
+        with io.open(join(out_dir, doc_id + ".conll"), mode="w", encoding="utf-8") as f_conll:
+            vertical2conll.write_document(segments, f_conll)
+
+
+def serialize_metadata(corpus):
+    f_out = io.StringIO()
+    metadata2rdf.write_document_header(f_out)
+    for doc_id, header, _ in corpus.documents:
+        _, metadata = metadata2rdf.process_document(header)
+        metadata2rdf.write_document_triples(doc_id, metadata, f_out)
+    return f_out.getvalue()
+
+
+def serialize_conllrdf(corpus):
+    for doc_id, header, sentences in corpus.documents:
+        writer = ConllRdfWriter(io.StringIO(), doc_id, header)
+        for sentence in sentences:
+            writer.write_sentence(sentence)
+
+
+def convert_all(corpus, out_dir):
+    for name in ("json", "conll", "meta", "crdf"):
+        os.makedirs(join(out_dir, name))
+    sinks = [vertical2all.JsonSink(join(out_dir, "json")), vertical2all.ConllSink(join(out_dir, "conll")),
+             vertical2all.MetadataSink(join(out_dir, "meta")), ConllRdfSink(join(out_dir, "crdf"))]
+    for _ in vertical2all.read_vertical(corpus.lines, "bench", sinks):
+        pass
+    for sink in sinks:
+        sink.close()
+
+
+# name of the stage, function, whether the function writes files in an output folder, and the unit of its
+# throughput
+STAGES = [
+    ("read", lambda corpus: read_lines(corpus.filename), False, "tokens"),
+    ("header_parse", parse_headers, False, "headers"),
+    ("vertical2json.sentence_assembly", assemble_json, False, "tokens"),
+    ("vertical2json.read_document", lambda corpus: list(read_document(corpus.lines)), False, "tokens"),
+    ("vertical2json.serialization", serialize_json, False, "tokens"),
+    ("vertical2json.file_io", write_json_files, True, "tokens"),
+    ("vertical2json.end_to_end", stream_json, True, "tokens"),
+    ("vertical2json.batched_assembly", assemble_batched, False, "tokens"),
+    ("vertical2json.end_to_end_batched", stream_json_batched, True, "tokens"),
+    ("vertical2conll.sentence_assembly", assemble_conll, False, "tokens"),
+    ("vertical2conll.file_io", write_conll_files, True, "tokens"),
+    ("metadata2rdf.serialization", serialize_metadata, False, "tokens"),
+    ("conllrdf.serialization", serialize_conllrdf, False, "tokens"),
+    ("vertical2all.end_to_end", convert_all, True, "tokens"),
+]
+
+
+def run_stage(function, corpus, writes_files):
+    """ runs a stage once and returns its time in seconds. Output folders are removed after the timing """
+    out_dir = tempfile.mkdtemp(prefix="bench_") if writes_files else None
+    try:
+        started = time.perf_counter()
+        if writes_files:
+            function(corpus, out_dir)
+        else:
+            function(corpus)
+        return time.perf_counter() - started
+    finally:
+        if out_dir:
+            shutil.rmtree(out_dir)
+
+
+def peak_memory(function, corpus, writes_files):
+    """ returns the peak of the memory allocated by a stage, in bytes """
+    tracemalloc.start()
+    try:
+        run_stage(function, corpus, writes_files)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def max_rss():
+    """ peak resident memory of the process in bytes, when the platform reports it """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=dirname(abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(corpus, stages, repeat, memory=True):
+    results = {}
+    for name, function, writes_files, unit in STAGES:
+        if stages and name not in stages:
+            continue
+        seconds = min(run_stage(function, corpus, writes_files) for _ in range(repeat))
+        count = len(corpus.headers) if unit == "headers" else corpus.tokens
+        results[name] = {
+            "seconds": seconds,
+            unit + "_per_sec": count / seconds if seconds else None,
+            "peak_memory": peak_memory(function, corpus, writes_files) if memory else None,
+        }
+        print("%-34s %8.3f s %12.0f %-8s %10.1f MB" % (
+            name, seconds, results[name][unit + "_per_sec"] or 0, unit + "/s", (results[name]["peak_memory"] or 0) / 1e6))
+    return results
+
+
+def compare(previous, current, threshold, min_seconds=MIN_SECONDS):
+    """ prints the change of every stage found in both results and returns the names of the stages that
+    are slower by more than threshold. Stages faster than min_seconds in either result are marked as noise """
+    if previous["input"] != current["input"]:
+        print("Warning: the results were measured on different inputs")
+    regressions = []
+    print("%-34s %10s %10s %8s" % ("stage", "previous", "current", "change"))
+    for name, result in current["stages"].items():
+        if name not in previous["stages"]:
+            continue
+        before, after = previous["stages"][name]["seconds"], result["seconds"]
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if min(before, after) < min_seconds:
+            flag = "  noise (below %.3f s)" % min_seconds
+        elif change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("%-34s %9.3fs %9.3fs %+7.1f%%%s" % (name, before, after, change * 100, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times the stages of the conversion scripts')
+    parser.add_argument("--input", help="vertical file, a synthetic one is generated when it is not given")
+    parser.add_argument("--docs", type=int, default=200, help="documents of the synthetic file")
+    parser.add_argument("--sentences", type=int, default=16, help="average sentences per document of the synthetic file")
+    parser.add_argument("--tokens", type=int, default=25, help="average tokens per sentence of the synthetic file")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic file")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs of every stage, the best one is kept")
+    parser.add_argument("--stages", nargs="+", choices=[name for name, _, _, _ in STAGES], help="stages to run, all by default")
+    parser.add_argument("--no_memory", action="store_true", help="do not measure the peak memory of the stages")
+    parser.add_argument("--out", help="json file where the results are saved")
+    parser.add_argument("--compare", help="json file with previous results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slow down reported as a regression by --compare")
+    parser.add_argument("--min_seconds", type=float, default=MIN_SECONDS, help="stages faster than this are not compared")
+    parser.add_argument("--batch_tokens", type=int, default=BATCH_TOKENS, help="batch size of the batched stages, whole documents by default")
+    args = parser.parse_args()
+
+    synthetic = None
+    if args.input:
+        filename = args.input
+        description = {"file": basename(filename), "bytes": getsize(filename)}
+    else:
+        synthetic = tempfile.mkdtemp(prefix="bench_input_")
+        filename = join(synthetic, "synthetic.vert")
+        make_vertical(filename, args.docs, args.sentences, args.tokens, args.seed)
+        description = {"synthetic": {"docs": args.docs, "sentences": args.sentences, "tokens": args.tokens,
+                                     "seed": args.seed}, "bytes": getsize(filename)}
+    try:
+        corpus = Corpus(filename, args.batch_tokens)
+        description.update({"documents": len(corpus.documents), "sentences": corpus.sentences, "tokens": corpus.tokens})
+        print("Input:", filename, "-", len(corpus.documents), "documents,", corpus.sentences, "sentences,", corpus.tokens, "tokens")
+        stages = run_benchmarks(corpus, args.stages, args.repeat, not args.no_memory)
+    finally:
+        if synthetic:
+            shutil.rmtree(synthetic)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "input": description,
+        "stages": stages,
+        "max_rss": max_rss(),
+    }
+    if args.out:
+        with io.open(args.out, mode="w", encoding="utf-8") as f_out:
+            json.dump(results, f_out, indent=2)
+        print("Results saved to", args.out)
+    if args.compare:
+        with io.open(args.compare, mode="r", encoding="utf-8") as f_in:
+            previous = json.load(f_in)
+        exit(1 if compare(previous, results, args.threshold, args.min_seconds) else 0)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the <doc ...> header parsing.
+
+It compares the previous path used by the scripts (str.replace, ElementTree and dictify) with
+doc_header.parse_header, on the headers found in a vertical file.
+
+How to run it:
+bench_doc_header.py [--input <vertical file>] [--repeat N]
+"""
+
+import io
+import sys
+import time
+import argparse
+import xml.etree.ElementTree as ET
+from copy import copy
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from sdllod19.doc_header import parse_header
+
+DEFAULT_INPUT = join(dirname(dirname(abspath(__file__))), "datasets", "oup", "komodo_mar_concat_100K.docend.txt")
+
+
+def dictify(r, root=True):
+    """ converts an xml element to json (copy of the function previously used by the scripts) """
+
+    if root:
+        return {r.tag : dictify(r, False)}
+    d=copy(r.attrib)
+    if r.text:
+        d["_text"]=r.text
+    for x in r.findall("./*"):
+        if x.tag not in d:
+            d[x.tag]=[]
+        d[x.tag].append(dictify(x,False))
+    return d
+
+
+def parse_header_etree(document):
+    """ header parsing as it was done in process_document before doc_header.py """
+    document = document.strip().replace(document[len(document)-2], '/>')
+    document = document.replace("&", "&amp;")
+    return dictify(ET.fromstring(document))["doc"]
+
+
+def time_parser(parser, headers, repeat):
+    """ returns the best time out of `repeat` runs of the parser over all the headers """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for header in headers:
+            parser(header)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the ElementTree header parsing with doc_header.parse_header')
+    parser.add_argument("--input", default=DEFAULT_INPUT, help="vertical file to take the headers from")
+    parser.add_argument("--repeat", type=int, default=20, help="number of timed runs, the best one is reported")
+    args = parser.parse_args()
+
+    with io.open(args.input, mode="r", encoding="utf-8") as f_input:
+        headers = [line for line in f_input if line.startswith("<doc ")]
+    print("Headers:", len(headers))
+
+    etree_time = time_parser(parse_header_etree, headers, args.repeat)
+    regex_time = time_parser(parse_header, headers, args.repeat)
+    print("ElementTree + dictify: %8.2f us/header" % (etree_time / len(headers) * 1e6))
+    print("parse_header:          %8.2f us/header" % (regex_time / len(headers) * 1e6))
+    print("Speed-up:              %8.2fx" % (etree_time / regex_time))
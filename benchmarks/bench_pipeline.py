@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of running the conversion scripts once per input file in a new interpreter, as orchestration
+code without the library interface has to, against converting all the files in the same process.
+
+The input vertical file (by default datasets/oup/komodo_mar_concat_100K.docend.txt) is split into --files
+smaller files, like daily files, and the json, conll and metadata outputs of all of them are written in
+3 ways:
+* subprocess: vertical2json.py, vertical2conll.py and metadata2rdf.py are run in a new interpreter for
+  every file, 3 processes per file; every process pays for starting python and importing the modules.
+* in_process: the main functions of the 3 scripts are called for every file in this process; every file
+  is still read 3 times.
+* pipeline: the stages of pipeline.py are chained and all the files are read once, in a single batch.
+Every way is run --repeat times and the best time is kept. The time, the files and documents per second
+and the speedup against subprocess are printed, with the time python takes to start and import
+pipeline.py and vertical2json.py. The json and conll outputs of the 3 ways are compared at the end.
+Most of the time of a run is spent serializing the indented json files; with --compact the conversion is
+faster and the cost of starting the processes weighs more.
+
+How to run it:
+bench_pipeline.py [--input <vertical file>] [--files N] [--repeat N] [--compact]
+"""
+
+import io
+import sys
+import time
+import shutil
+import filecmp
+import tempfile
+import argparse
+import subprocess
+from os import makedirs
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sdllod19 import vertical2json
+from sdllod19 import vertical2conll
+from sdllod19 import metadata2rdf
+from sdllod19.metadata2rdf import MetadataWriter, output_filename
+from sdllod19.pipeline import read_documents, write_json, write_conll, write_metadata, run
+
+DEFAULT_INPUT = join(dirname(dirname(abspath(__file__))), "datasets", "oup", "komodo_mar_concat_100K.docend.txt")
+
+
+def split_input(filename, n_files, out_dir):
+    """ writes the documents of a vertical file to n_files files of consecutive documents, returns their
+    names and the number of documents """
+    documents = []
+    with io.open(filename, mode="r", encoding="utf-8") as f_in:
+        for line in f_in:
+            if line.startswith("<doc "):
+                documents.append([])
+            if documents:
+                documents[-1].append(line)
+    per_file = -(-len(documents) // n_files)
+    filenames = []
+    for i in range(0, len(documents), per_file):
+        filenames.append(join(out_dir, "day%03d.vert" % len(filenames)))
+        with io.open(filenames[-1], mode="w", encoding="utf-8") as f_out:
+            for document in documents[i:i + per_file]:
+                f_out.writelines(document)
+    return filenames, len(documents)
+
+
+def output_dirs(out_dir):
+    dirs = [join(out_dir, name) for name in ("json", "conll", "metadata")]
+    for d in dirs:
+        makedirs(d, exist_ok=True)
+    return dirs
+
+
+def run_subprocess(filenames, out_dir, compact):
+    json_dir, conll_dir, metadata_dir = output_dirs(out_dir)
+    for i, filename in enumerate(filenames):
+        # every run writes its own metadata.ttl
+        for module, d, extra in (("vertical2json", json_dir, ["--compact"] if compact else []),
+                                 ("vertical2conll", conll_dir, []), ("metadata2rdf", join(metadata_dir, str(i)), [])):
+            subprocess.run([sys.executable, "-m", "sdllod19." + module, "--input", filename, "--out_dir", d, "--quiet"] + extra,
+                           check=True, stdout=subprocess.DEVNULL, cwd=ROOT)
+
+
+def run_in_process(filenames, out_dir, compact):
+    json_dir, conll_dir, metadata_dir = output_dirs(out_dir)
+    for i, filename in enumerate(filenames):
+        vertical2json.main(["--input", filename, "--out_dir", json_dir, "--quiet"] + (["--compact"] if compact else []))
+        vertical2conll.main(["--input", filename, "--out_dir", conll_dir, "--quiet"])
+        metadata2rdf.main(["--input", filename, "--out_dir", join(metadata_dir, str(i)), "--quiet"])
+
+
+def run_pipeline(filenames, out_dir, compact):
+    json_dir, conll_dir, metadata_dir = output_dirs(out_dir)
+    writer = MetadataWriter(output_filename(metadata_dir))
+    run(write_metadata(write_conll(write_json(read_documents(filenames), json_dir, None if compact else 2), conll_dir), writer))
+    writer.close()
+
+
+MODES = (("subprocess", run_subprocess), ("in_process", run_in_process), ("pipeline", run_pipeline))
+
+
+def startup_time(statement, repeat):
+    """ the best time of starting python and running a statement, in seconds """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True, cwd=ROOT)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def same_outputs(dir1, dir2):
+    for name in ("json", "conll"):
+        comparison = filecmp.dircmp(join(dir1, name), join(dir2, name))
+        if comparison.left_only or comparison.right_only:
+            return False
+        _, mismatch, errors = filecmp.cmpfiles(join(dir1, name), join(dir2, name), comparison.common_files, shallow=False)
+        if mismatch or errors:
+            return False
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times the scripts run per file in new processes against batch runs in the same process')
+    parser.add_argument("--input", default=DEFAULT_INPUT, help="vertical file split into the input files")
+    parser.add_argument("--files", type=int, default=20, help="number of input files")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs, the best one is kept")
+    parser.add_argument("--compact", action="store_true", help="write the json files without indentation")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        filenames, n_docs = split_input(args.input, args.files, tmp_dir)
+        print("Input: %d files, %d documents" % (len(filenames), n_docs))
+        for statement in ("pass", "import sdllod19.pipeline", "import sdllod19.vertical2json"):
+            print("startup %-31s %.3f s" % (statement, startup_time(statement, args.repeat)))
+        print("%12s %9s %9s %9s %9s" % ("mode", "seconds", "files/s", "docs/s", "speedup"))
+        reference = None
+        for name, function in MODES:
+            best = None
+            for _ in range(args.repeat):
+                out_dir = join(tmp_dir, name)
+                shutil.rmtree(out_dir, ignore_errors=True)
+                started = time.perf_counter()
+                function(filenames, out_dir, args.compact)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            reference = reference or best
+            print("%12s %9.3f %9.1f %9.0f %8.1fx" % (name, best, len(filenames) / best, n_docs / best, reference / best))
+        print("Same json and conll outputs:", all(same_outputs(join(tmp_dir, "subprocess"), join(tmp_dir, name))
+                                                  for name, _ in MODES[1:]))
+    finally:
+        shutil.rmtree(tmp_dir)
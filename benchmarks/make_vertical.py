@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generator of synthetic Komodo vertical files, used by the benchmarks.
+
+The headers and the token lines are modeled on a real vertical file (by default
+datasets/oup/komodo_mar_concat_100K.docend.txt): every <doc ...> header takes its attribute values from
+one of the headers of the sample, with a new random primary_doc_id, and the token lines are drawn from the
+token lines of the sample, so the words, lemmas and tags follow the same distribution. The number of
+sentences per document and of tokens per sentence vary uniformly between half and 1.5 times the given
+averages. The same seed always gives the same file.
+
+How to run it:
+make_vertical.py --out <vertical file> [--docs N] [--sentences N] [--tokens N] [--seed N] [--sample <vertical file>]
+"""
+
+import io
+import re
+import random
+import argparse
+from os.path import abspath, dirname, join
+
+DEFAULT_SAMPLE = join(dirname(dirname(abspath(__file__))), "datasets", "oup", "komodo_mar_concat_100K.docend.txt")
+
+_ATTRIBUTE = re.compile(r'(\w+)="([^"]*)"')
+
+
+def load_sample(filename):
+    """ returns the attributes of the headers (as they are written, not unescaped) and the token lines
+    of a vertical file """
+    headers = []
+    rows = []
+    with io.open(filename, mode="r", encoding="utf-8") as f_in:
+        for line in f_in:
+            if line.startswith("<doc "):
+                headers.append(_ATTRIBUTE.findall(line))
+            elif not line.startswith("<") and line.strip():
+                rows.append(line if line.endswith("\n") else line + "\n")
+    return headers, rows
+
+
+def header_line(attributes, rng):
+    """ returns a <doc ...> line with the attributes of a sample header and a new primary_doc_id """
+    doc_id = "%032x" % rng.getrandbits(128)
+    return "<doc %s>\n" % " ".join('%s="%s"' % (name, doc_id if name == "primary_doc_id" else value)
+                                   for name, value in attributes)
+
+
+def _around(rng, mean):
+    return rng.randint(max(1, mean // 2), max(1, mean + mean // 2))
+
+
+def generate(f_out, n_docs, sentences, tokens, headers, rows, seed=0):
+    """ writes a synthetic vertical file. It returns the numbers of documents, sentences and tokens written """
+    rng = random.Random(seed)
+    n_sentences = n_tokens = 0
+    for _ in range(n_docs):
+        f_out.write(header_line(rng.choice(headers), rng))
+        for _ in range(_around(rng, sentences)):
+            k = _around(rng, tokens)
+            f_out.write("<s>\n")
+            f_out.writelines(rng.choices(rows, k=k))
+            f_out.write("</s>\n")
+            n_sentences += 1
+            n_tokens += k
+        f_out.write("</doc>\n")
+    return n_docs, n_sentences, n_tokens
+
+
+def make_vertical(filename, n_docs, sentences, tokens, seed=0, sample=DEFAULT_SAMPLE):
+    """ writes a synthetic vertical file modeled on a sample file """
+    headers, rows = load_sample(sample)
+    with io.open(filename, mode="w", encoding="utf-8") as f_out:
+        return generate(f_out, n_docs, sentences, tokens, headers, rows, seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes a synthetic vertical file modeled on a Komodo vertical file')
+    parser.add_argument("--out", required=True, help="output vertical file")
+    parser.add_argument("--docs", type=int, default=1000, help="number of documents")
+    parser.add_argument("--sentences", type=int, default=16, help="average number of sentences per document")
+    parser.add_argument("--tokens", type=int, default=25, help="average number of tokens per sentence")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    parser.add_argument("--sample", default=DEFAULT_SAMPLE, help="vertical file the headers and tokens are taken from")
+    args = parser.parse_args()
+
+    docs, sentences, tokens = make_vertical(args.out, args.docs, args.sentences, args.tokens, args.seed, args.sample)
+    print("Wrote", docs, "documents,", sentences, "sentences and", tokens, "tokens to", args.out)
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+Conversion of the Komodo vertical corpus files to json, CoNLL, CoNLL-RDF and RDF metadata.
+
+The modules of the package are the conversion scripts and the modules they share. The commands
+vertical2json, vertical2conll, metadata2rdf and vertical2all are installed with "pip install ." from the root
+of the repository (see pyproject.toml); every script can also be run from the root of the repository with
+python -m sdllod19.<script>, e.g. python -m sdllod19.vertical2all. The library interface is pipeline.py.
+"""
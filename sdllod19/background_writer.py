@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Background writing of the json files of vertical2json.py (--writer_threads N).
+
+Without it the thread that parses the vertical file also opens, writes and closes the 5 files of every
+document, and it sits idle while the file system works (slow on network file systems). With it the text
+of the files of a document is handed to a pool of writer threads while the document is read, in chunks of
+at most chunk_size characters (1 MB by default) per file, and the parsing goes on at once. All the files of
+a document are written by the same thread, in the order of the chunks, and they are closed when the
+document is complete.
+
+* backpressure: the text waiting to be written is capped (max_pending, 64 MB by default). When the cap is
+  reached the parser waits until the writers catch up, so the memory used does not grow with the input nor
+  with the size of a document.
+* errors: when a file of a document cannot be written, all the files of the document are removed and the
+  error is kept. It is raised as a WriteError in the parsing thread on the next chunk handed to the pool, or
+  at the latest by close(), so a run never ends successfully with files missing. The files of a document
+  that is not complete when the pool is closed are removed as well.
+"""
+
+import io
+import os
+import threading
+from collections import deque
+
+from .vertical2json import JsonDocumentWriter
+from .instrumentation import stats
+
+MAX_PENDING = 64 << 20
+CHUNK_SIZE = 1 << 20
+
+
+class WriteError(IOError):
+    """ raised in the parsing thread when a writer thread could not write a file """
+
+
+class BackgroundWriter(object):
+    """ pool of threads that write the text files of documents. A document is a number returned by
+    new_document; its files are appended to with write, and closed with end_document or removed with
+    discard_document """
+
+    def __init__(self, threads=2, max_pending=MAX_PENDING, chunk_size=CHUNK_SIZE):
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.pending = 0
+        self.documents = 0
+        # one queue per thread, so that the jobs of a document are done in order
+        self.jobs = [deque() for _ in range(threads)]
+        self.errors = []
+        self.bytes_written = 0
+        self.closing = False
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.threads = [threading.Thread(target=self._run, args=(jobs,), name="writer-%d" % i, daemon=True)
+                        for i, jobs in enumerate(self.jobs)]
+        for thread in self.threads:
+            thread.start()
+
+    def _raise_errors(self):
+        if self.errors:
+            filename, ex = self.errors[0]
+            raise WriteError("could not write %s: %s (%d files failed)" % (filename, ex, len(self.errors)))
+
+    def _submit(self, document, job, size=0, check=True):
+        with self.changed:
+            if check:
+                self._raise_errors()
+            while self.pending and self.pending + size > self.max_pending:
+                self.changed.wait()
+                if check:
+                    self._raise_errors()
+            self.pending += size
+            self.jobs[document % len(self.jobs)].append(job + (size,))
+            self.changed.notify_all()
+
+    def new_document(self):
+        self.documents += 1
+        return self.documents
+
+    def write(self, document, filename, chunks):
+        """ queues a list of strings to append to a file of a document. It blocks while too much text is
+        waiting """
+        self._submit(document, ("write", document, filename, chunks), sum(len(chunk) for chunk in chunks))
+
+    def end_document(self, document):
+        """ queues the closing of the files of a document """
+        self._submit(document, ("end", document, None, None))
+
+    def discard_document(self, document):
+        """ queues the removal of the files of a document that was not completed """
+        self._submit(document, ("discard", document, None, None), check=False)
+
+    def _fail(self, files, filename, ex):
+        with self.lock:
+            self.errors.append((filename, ex))
+        self._remove(files)
+
+    @staticmethod
+    def _remove(files):
+        for filename, f_out in files.items():
+            try:
+                f_out.close()
+            except Exception:
+                pass
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def _run(self, jobs):
+        # open files of the documents of this thread, and documents whose files were removed after an error
+        open_files = {}
+        failed = set()
+        while True:
+            with self.changed:
+                while not jobs and not self.closing:
+                    self.changed.wait()
+                if not jobs:
+                    break
+                kind, document, filename, chunks, size = jobs.popleft()
+            written = 0
+            files = open_files.setdefault(document, {})
+            if document in failed:
+                if kind != "write":
+                    failed.discard(document)
+                    del open_files[document]
+            elif kind == "write":
+                try:
+                    f_out = files.get(filename)
+                    if f_out is None:
+                        f_out = files[filename] = io.open(filename, mode="w", encoding="utf-8")
+                    for chunk in chunks:
+                        f_out.write(chunk)
+                except Exception as ex:
+                    self._fail(files, filename, ex)
+                    failed.add(document)
+            elif kind == "end":
+                try:
+                    for filename, f_out in files.items():
+                        written += f_out.tell()
+                        f_out.close()
+                except Exception as ex:
+                    self._fail(files, filename, ex)
+                    written = 0
+                del open_files[document]
+            else:
+                self._remove(files)
+                del open_files[document]
+            with self.changed:
+                self.pending -= size
+                self.bytes_written += written
+                self.changed.notify_all()
+        # documents still open when the pool is closed are not complete
+        for files in open_files.values():
+            self._remove(files)
+
+    def close(self, raise_errors=True):
+        """ waits until all the files are written and stops the threads. It raises a WriteError if a file
+        could not be written, unless raise_errors is False (when the parsing stopped on another error) """
+        with self.changed:
+            self.closing = True
+            self.changed.notify_all()
+        for thread in self.threads:
+            thread.join()
+        stats.counts["bytes_written"] += self.bytes_written
+        if raise_errors:
+            self._raise_errors()
+
+
+class TextBuffer(object):
+    """ file like object that keeps the text written to it and hands it to the pool in chunks """
+
+    def __init__(self, pool, document, filename):
+        self.pool = pool
+        self.document = document
+        self.filename = filename
+        self.chunks = []
+        self.size = 0
+
+    def write(self, text):
+        self.chunks.append(text)
+        self.size += len(text)
+        if self.size >= self.pool.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.chunks:
+            self.pool.write(self.document, self.filename, self.chunks)
+            self.chunks = []
+            self.size = 0
+
+    def tell(self):
+        # the bytes are counted by the writer threads
+        return 0
+
+    def close(self):
+        self.flush()
+
+
+class BackgroundDocumentWriter(JsonDocumentWriter):
+    """ JsonDocumentWriter that hands the files of a document to a BackgroundWriter while the document is
+    read """
+
+    def __init__(self, pool, output_file, doc_id, doc, indent=2, batch_tokens=0):
+        self.pool = pool
+        self.document = pool.new_document()
+        JsonDocumentWriter.__init__(self, output_file, doc_id, doc, indent, batch_tokens)
+
+    def open_file(self, file_type):
+        return TextBuffer(self.pool, self.document, self.output_file + "." + file_type + ".json")
+
+    def close(self):
+        JsonDocumentWriter.close(self)
+        self.pool.end_document(self.document)
+
+    def abort(self):
+        self.pool.discard_document(self.document)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Converts RDF/XML bibliographic exports, such as the GAMS export of datasets/uni-graz, to the Turtle or
+N-Triples graph written by metadata2rdf.py, so that they can be merged with the metadata of the corpus.
+
+The file is read with ElementTree.iterparse: every record (a child of rdf:RDF, e.g. a
+dcterms:BibliographicResource) is written as soon as its end tag is read, and then removed from the
+tree. The memory used does not depend on the size of the file. Every record is a subject:
+* rdf:about gives its uri, rdf:nodeID or a generated id a blank node.
+* the tag of the record gives its type (rdf:Description records have no type).
+* every child element is a property: its text is a literal (with the xml:lang or rdf:datatype of the
+  element), or rdf:resource gives a uri. The properties of the namespaces of metadata2rdf.py, the
+  Dublin Core / DCAT model (dc:title, dcterms:issued, rdau:P60163, dc:publisher, ...), are written with
+  the same prefixes, the other ones as full uris.
+Property elements containing nested elements are not supported: they are skipped and counted. As in
+metadata2rdf.py, a record whose uri was already written is skipped and the first one wins.
+
+How to run it:
+python -m sdllod19.bibliography2rdf --input <input folder|input file> --out_dir <output_folder> [--format turtle|ntriples] [--gzip]
+                                    [--quiet] [--stats text|json]
+
+It takes the following parameters:
+* input: it can be either a file or a folder. If it is a folder the script will read all files in the
+  folder. Files compressed with gzip, xz or zstd are decompressed while they are read.
+* out_dir: the output folder. A single graph is written for all the input files: bibliography.ttl, or
+  bibliography.nt with --format ntriples, with .gz added with --gzip.
+* quiet, stats: see instrumentation.py. The documents counter is the number of records written.
+"""
+
+import re
+import argparse
+from os import makedirs
+from os.path import join, getsize
+from time import perf_counter
+from xml.etree import ElementTree
+
+from .conllrdf import turtle_literal
+from .compressed_input import open_binary
+from .metadata2rdf import MetadataWriter, PREFIXES
+from . import instrumentation
+from .instrumentation import stats
+from .pipeline import input_files
+
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+# namespace uri -> prefix, for the namespaces of metadata2rdf.py
+_PREFIXES = dict((namespace, prefix) for prefix, namespace in PREFIXES if prefix)
+_LOCAL_NAME = re.compile(r'^[A-Za-z_][\w-]*$')
+_NOT_WORD = re.compile(r'\W')
+
+
+def _split_tag(tag):
+    """ returns the uri of an ElementTree tag "{namespace}local" """
+    namespace, _, local = tag[1:].partition("}")
+    return namespace + local
+
+
+class Record(object):
+    """ a subject of the graph: its uri or blank node id, its type and its (predicate uri, object) pairs.
+    An object is ("literal", text, lang, datatype) or ("uri", uri) """
+
+    def __init__(self, subject, blank, type_uri):
+        self.subject = subject
+        self.blank = blank
+        self.type_uri = type_uri
+        self.properties = []
+
+
+def read_records(f_in, skipped=None, blank_prefix="b"):
+    """ yields a Record for every child of the rdf:RDF element of a binary RDF/XML stream. The elements
+    are cleared once converted. skipped is an optional list where the tags of the unsupported property
+    elements are added. blank_prefix is added to the blank node ids, which are local to a file """
+    depth = 0
+    root = None
+    blank_ids = 0
+    for event, element in ElementTree.iterparse(f_in, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 1:
+                root = element
+            continue
+        depth -= 1
+        # the property elements are converted when their record ends
+        if depth == 1:
+            attributes = element.attrib
+            about = attributes.get("{%s}about" % RDF)
+            if about is not None:
+                subject, blank = about, False
+            else:
+                blank_ids += 1
+                node_id = attributes.get("{%s}nodeID" % RDF) or "r%d" % blank_ids
+                subject, blank = blank_prefix + _NOT_WORD.sub("_", node_id), True
+            type_uri = _split_tag(element.tag)
+            record = Record(subject, blank, None if type_uri == RDF + "Description" else type_uri)
+            for child in element:
+                if len(child):
+                    if skipped is not None:
+                        skipped.append(child.tag)
+                    continue
+                predicate = _split_tag(child.tag)
+                resource = child.get("{%s}resource" % RDF)
+                if resource is not None:
+                    record.properties.append((predicate, ("uri", resource)))
+                else:
+                    record.properties.append((predicate, ("literal", child.text or "", child.get(XML_LANG),
+                                                          child.get("{%s}datatype" % RDF))))
+            yield record
+            # the record and its properties are no longer needed, the root keeps no reference to them
+            root.clear()
+
+
+def _turtle_name(uri):
+    """ returns a uri as a prefixed name when it is in one of the namespaces of metadata2rdf.py """
+    for namespace, prefix in _PREFIXES.items():
+        if uri.startswith(namespace) and _LOCAL_NAME.match(uri[len(namespace):]):
+            return prefix + ":" + uri[len(namespace):]
+    return "<" + uri + ">"
+
+
+def _object(value, name):
+    if value[0] == "uri":
+        return name(value[1])
+    _, text, lang, datatype = value
+    literal = turtle_literal(text, xml_escape=False)
+    if lang:
+        return literal + "@" + lang
+    if datatype:
+        return literal + "^^" + name(datatype)
+    return literal
+
+
+def _subject(record, name):
+    return "_:" + record.subject if record.blank else name(record.subject)
+
+
+def write_record_triples(record, f_out):
+    """ writes the triples of a record in Turtle, as a single subject with a predicate list """
+    predicates = ["a " + _turtle_name(record.type_uri)] if record.type_uri else []
+    predicates.extend(_turtle_name(predicate) + " " + _object(value, _turtle_name) for predicate, value in record.properties)
+    if predicates:
+        f_out.write("\n" + _subject(record, _turtle_name) + " " + " ;\n    ".join(predicates) + " .\n")
+
+
+def _full_uri(uri):
+    return "<" + uri + ">"
+
+
+def write_record_ntriples(record, f_out):
+    """ writes the triples of a record in N-Triples, one triple per line with full uris """
+    subject = _subject(record, _full_uri)
+    lines = [subject + " <" + RDF + "type> <" + record.type_uri + "> ."] if record.type_uri else []
+    lines.extend(subject + " <" + predicate + "> " + _object(value, _full_uri) + " ." for predicate, value in record.properties)
+    if lines:
+        f_out.write("\n".join(lines) + "\n")
+
+
+class RecordWriter(MetadataWriter):
+    """ MetadataWriter for the records of read_records: same prefixes, formats, compression and
+    duplicate detection (by subject uri) """
+
+    def __init__(self, filename, rdf_format="turtle", compress=False):
+        MetadataWriter.__init__(self, filename, rdf_format, compress)
+        self.write_triples = write_record_ntriples if rdf_format == "ntriples" else write_record_triples
+
+    def write(self, record):
+        """ writes the triples of a record and returns False if it is a duplicate """
+        if not record.blank and not self.seen.add(record.subject):
+            self.duplicates += 1
+            return False
+        self.write_triples(record, self.f_out)
+        return True
+
+
+def output_filename(out_dir, rdf_format="turtle", compress=False):
+    return join(out_dir, "bibliography" + (".nt" if rdf_format == "ntriples" else ".ttl") + (".gz" if compress else ""))
+
+
+def convert_file(filename, writer, skipped=None, blank_prefix="b"):
+    """ writes the records of an RDF/XML file, returns the number of records read """
+    n_records = 0
+    f_in = open_binary(filename)
+    try:
+        for record in read_records(f_in, skipped, blank_prefix):
+            n_records += 1
+            stats.start_document()
+            started = perf_counter()
+            if writer.write(record):
+                stats.end_document()
+            stats.times["serialization"] += perf_counter() - started
+    finally:
+        f_in.close()
+    return n_records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Streams RDF/XML bibliographic records to the Turtle metadata model of metadata2rdf.py')
+    parser.add_argument("--input", help="input filename")
+    parser.add_argument("--out_dir", help="output folder")
+    parser.add_argument("--format", choices=["turtle", "ntriples"], default="turtle", help="rdf syntax of the output")
+    parser.add_argument("--gzip", action="store_true", help="compress the output with gzip")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.quiet:
+        print('Reading from:', args.input)
+        print('Writing to:', args.out_dir)
+    makedirs(args.out_dir, exist_ok=True)
+
+    filenames_list = input_files(args.input)
+
+    instrumentation.start(args)
+    writer = RecordWriter(output_filename(args.out_dir, args.format, args.gzip), args.format, args.gzip)
+    skipped = []
+    for i, (d, f) in enumerate(filenames_list):
+        if not args.quiet:
+            print('Reading :', join(d, f))
+        stats.counts["bytes_read"] += getsize(join(d, f))
+        try:
+            n_records = convert_file(join(d, f), writer, skipped, "f%d_" % i)
+        except ElementTree.ParseError as ex:
+            stats.counts["parse_errors"] += 1
+            print("Error in the following file: ", join(d, f), ex)
+            continue
+        if not args.quiet:
+            print("Read", n_records, "records")
+    writer.close()
+    stats.counts["bytes_written"] += getsize(writer.filename)
+    if not args.quiet:
+        print("Wrote", stats.counts["documents"], "records to", writer.filename, "-", writer.duplicates, "duplicates skipped,",
+              len(skipped), "nested properties skipped")
+    instrumentation.finish(args)
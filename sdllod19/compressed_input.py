@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reads vertical files that are compressed with gzip, xz or zstd without decompressing them to disk first.
+
+open_vertical(filename) returns a text stream over the decompressed lines, so pipeline.read_events, the
+reader of the scripts, sees the same lines as with the uncompressed file. The compression is
+detected from the first bytes of the file, not from its extension; other files are opened as text.
+The decompressed data goes through a 1 MB read buffer, so the decompressor is called on large blocks.
+
+* gzip: files made of several gzip members (written by bgzip, or by concatenating .gz files) are
+  decompressed in parallel by a pool of threads (zlib releases the GIL while it inflates). The members
+  are found by looking for gzip headers in a memory map of the file. A header can also appear by chance
+  inside compressed data, so a block is only accepted when its decompression stops exactly at the next
+  header; otherwise the member is decompressed serially from its real start. Members are decompressed a
+  few at a time, in order, so the memory used depends on the size of the members and not of the file.
+  Single member files are decompressed with the gzip module.
+* xz: decompressed with the lzma module.
+* zstd: decompressed with the zstandard module when it is installed, otherwise through the zstd command.
+
+A compressed file cannot be split in byte ranges (vertical2json.py --workers converts a compressed file
+in a single range) and cannot be memory mapped (vertical2json.py --incremental and vertical_index.py need
+uncompressed files).
+
+How to run it:
+python -m sdllod19.compressed_input --input <file> [--decompress_threads N]
+    decompresses a file to the standard output and prints the time taken on the standard error.
+"""
+
+import io
+import os
+import sys
+import gzip
+import lzma
+import mmap
+import zlib
+import time
+import shutil
+import argparse
+from collections import deque
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# suffixes removed from the name of a compressed input to name its outputs
+SUFFIXES = (".gz", ".xz", ".zst", ".zstd")
+BUFFER_SIZE = 1 << 20
+DECOMPRESS_THREADS = min(4, os.cpu_count() or 1)
+
+
+def detect_compression(filename):
+    """ returns "gzip", "xz", "zstd" or None, from the magic bytes at the start of a file """
+    with io.open(filename, mode="rb") as f_in:
+        magic = f_in.read(6)
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic.startswith(XZ_MAGIC):
+        return "xz"
+    if magic.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def source_name(filename, compression):
+    """ name used for the outputs of an input file: the compressed file a.txt.gz gives the outputs of a.txt """
+    if compression:
+        for suffix in SUFFIXES:
+            if filename.endswith(suffix):
+                return filename[:-len(suffix)]
+    return filename
+
+
+def _gzip_members(data):
+    """ offsets of the gzip headers found in a memory map: the magic bytes, deflate as compression method,
+    no reserved flag, a known extra flag and operating system """
+    starts = []
+    pos = data.find(GZIP_MAGIC + b"\x08")
+    while pos >= 0:
+        header = data[pos:pos + 10]
+        if len(header) == 10 and not header[3] & 0xe0 and header[8] in (0, 2, 4) and (header[9] <= 13 or header[9] == 255):
+            starts.append(pos)
+        pos = data.find(GZIP_MAGIC + b"\x08", pos + 1)
+    return starts
+
+
+def _inflate_block(data, start, end):
+    """ decompresses the bytes between two gzip headers. Returns the data and whether they were exactly
+    one or more complete members """
+    out = []
+    pos = start
+    try:
+        while pos < end:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            out.append(decompressor.decompress(data[pos:end]))
+            if not decompressor.eof:
+                return None, False
+            pos = end - len(decompressor.unused_data)
+    except zlib.error:
+        return None, False
+    return b"".join(out), True
+
+
+def _inflate_member(data, pos):
+    """ generator that decompresses the gzip member starting at pos block by block, and returns the
+    offset of its end """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    while not decompressor.eof:
+        if pos >= len(data):
+            raise EOFError("compressed file ended before the end-of-stream marker was reached")
+        block = data[pos:pos + BUFFER_SIZE]
+        pos += len(block)
+        yield decompressor.decompress(block)
+    return pos - len(decompressor.unused_data)
+
+
+def parallel_gunzip(data, threads=DECOMPRESS_THREADS, starts=None):
+    """ yields the decompressed blocks of a multi member gzip file mapped in memory, in order. starts are
+    the offsets of the headers when they are already known """
+    if starts is None:
+        starts = _gzip_members(data)
+    bounds = list(zip(starts, starts[1:] + [len(data)]))
+    # imported here: the readers of uncompressed files (pipeline.py) do not pay for it
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(threads) as executor:
+        pending = deque()
+        submitted = 0
+        pos = 0
+        while pos < len(data):
+            while submitted < len(bounds) and len(pending) < threads * 2:
+                start, end = bounds[submitted]
+                pending.append((start, end, executor.submit(_inflate_block, data, start, end)))
+                submitted += 1
+            # blocks starting inside a member decompressed serially are not needed
+            while pending and pending[0][0] < pos:
+                pending.popleft()[2].cancel()
+            if pending and pending[0][0] == pos:
+                start, end, future = pending.popleft()
+                block, complete = future.result()
+                if complete:
+                    yield block
+                    pos = end
+                    continue
+            if data[pos:pos + 2] != GZIP_MAGIC and not data[pos:].strip(b"\x00"):
+                # padding at the end of the file, ignored like the gzip module does
+                break
+            pos = yield from _inflate_member(data, pos)
+
+
+class _BlockStream(io.RawIOBase):
+    """ binary file like object over an iterator of byte strings """
+
+    def __init__(self, blocks, on_close=None):
+        self.blocks = blocks
+        self.on_close = on_close
+        self.block = b""
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.offset >= len(self.block):
+            self.block = next(self.blocks, None)
+            self.offset = 0
+            if self.block is None:
+                self.block = b""
+                return 0
+        n = min(len(buffer), len(self.block) - self.offset)
+        buffer[:n] = self.block[self.offset:self.offset + n]
+        self.offset += n
+        return n
+
+    def close(self):
+        if not self.closed and self.on_close is not None:
+            self.on_close()
+        io.RawIOBase.close(self)
+
+
+def _open_gzip(filename, threads):
+    f_in = io.open(filename, mode="rb")
+    if os.fstat(f_in.fileno()).st_size:
+        data = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        starts = _gzip_members(data) if threads > 1 else []
+        if len(starts) > 1:
+            blocks = parallel_gunzip(data, threads, starts)
+
+            def close():
+                blocks.close()
+                data.close()
+                f_in.close()
+            return _BlockStream(blocks, close)
+        data.close()
+    f_in.close()
+    return gzip.open(filename, mode="rb")
+
+
+def _open_zstd(filename):
+    if zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(io.open(filename, mode="rb"), read_size=BUFFER_SIZE, closefd=True)
+    import subprocess
+    if shutil.which("zstd") is None:
+        raise IOError("%s is compressed with zstd: install the zstandard module or the zstd command" % filename)
+    process = subprocess.Popen(["zstd", "-dcq", filename], stdout=subprocess.PIPE, bufsize=BUFFER_SIZE)
+
+    def close():
+        process.stdout.close()
+        if process.wait() not in (0, -13):
+            raise IOError("zstd could not decompress %s" % filename)
+    return _BlockStream(iter(lambda: process.stdout.read(BUFFER_SIZE), b""), close)
+
+
+def open_binary(filename, threads=DECOMPRESS_THREADS):
+    """ opens a file, compressed or not, as a binary stream of its decompressed bytes """
+    compression = detect_compression(filename)
+    if compression == "gzip":
+        raw = _open_gzip(filename, threads)
+    elif compression == "xz":
+        raw = lzma.open(filename, mode="rb")
+    elif compression == "zstd":
+        raw = _open_zstd(filename)
+    else:
+        return io.open(filename, mode="rb", buffering=BUFFER_SIZE)
+    return io.BufferedReader(raw, buffer_size=BUFFER_SIZE)
+
+
+def open_vertical(filename, threads=DECOMPRESS_THREADS):
+    """ opens a vertical file, compressed or not, as a utf-8 text stream """
+    return io.TextIOWrapper(open_binary(filename, threads), encoding="utf-8")
+
+
+def add_arguments(parser):
+    """ adds --decompress_threads to an argparse parser """
+    parser.add_argument("--decompress_threads", type=int, default=DECOMPRESS_THREADS,
+                        help="threads decompressing a multi member gzip input file")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decompresses a gzip, xz or zstd file to the standard output')
+    parser.add_argument("--input", required=True, help="input filename")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    size = 0
+    f_in = open_binary(args.input, args.decompress_threads)
+    out = sys.stdout.buffer
+    for block in iter(lambda: f_in.read(BUFFER_SIZE), b""):
+        out.write(block)
+        size += len(block)
+    f_in.close()
+    out.flush()
+    sys.stderr.write("%s: %s, %d bytes in %.2f s\n" % (args.input, detect_compression(args.input), size, time.perf_counter() - started))
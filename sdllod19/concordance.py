@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Inverted index over a token store (see token_store.py) and keyword in context (KWIC) search.
+
+For the word, lemma, pos and lempos columns the index maps every value to its postings: the positions of
+the tokens that have it, in corpus order. The document, sentence and token of a posting are found from
+the sentence and document offsets of the token store. The postings are compressed: each position is
+stored as the difference with the previous one, encoded as a varint (7 bits per byte). For every column
+the index has, in the token store folder:
+* <column>.postings: the compressed postings of all the values, one after the other, in id order.
+* <column>.postings.u64: offset of the postings of every id in the .postings file, plus its size at the end.
+* <column>.df.u32: number of postings of every id.
+Both files are memory mapped, only the postings of the values that are searched for are read.
+
+A query is a sequence of token patterns, each one being conditions on columns joined by "&", e.g.
+"lemma=slow & pos=VBD" "pos=RB" finds a token with lemma slow and tag VBD followed by an adverb, in the
+same sentence. A pattern "*" matches any token. Only the postings of the rarest condition are decoded;
+the other conditions are checked on the columns of the token store at the positions it gives.
+
+How to run it:
+python -m sdllod19.concordance --store <folder> --build
+    builds the index of a token store (vertical2all.py --tokens_dir <folder> --tokens_index does it too).
+python -m sdllod19.concordance --store <folder> --query "<column>=<value> & ..." ["..." ...] [--context N] [--limit N]
+    prints the matches as KWIC lines: doc_id, left context, match and right context.
+"""
+
+import io
+import json
+import mmap
+import time
+import argparse
+from array import array
+from bisect import bisect_right
+from os.path import join, isfile, getsize
+
+from .token_store import TokenStore, _U32, _U64
+
+INDEXED_COLUMNS = ("word", "lemma", "pos", "lempos")
+INDEX_VERSION = 1
+
+
+def encode_postings(positions):
+    """ returns the varint encoding of the differences between increasing positions """
+    out = bytearray()
+    last = 0
+    for position in positions:
+        delta = position - last
+        last = position
+        while delta >= 0x80:
+            out.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return out
+
+
+def decode_postings(data):
+    """ returns the positions encoded by encode_postings """
+    positions = []
+    last = value = shift = 0
+    for byte in data:
+        if byte & 0x80:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+        else:
+            last += value | (byte << shift)
+            positions.append(last)
+            value = shift = 0
+    return positions
+
+
+def _postings_by_id(ids, size):
+    """ yields the sorted positions of every id of a column, in id order """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None:
+        ids = numpy.asarray(ids)
+        order = numpy.argsort(ids, kind="stable")
+        bounds = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(ids, minlength=size))))
+        for i in range(size):
+            yield order[bounds[i]:bounds[i + 1]].tolist()
+        return
+    buckets = [[] for _ in range(size)]
+    for position, i in enumerate(ids):
+        buckets[i].append(position)
+    for bucket in buckets:
+        yield bucket
+
+
+def build_index(store, columns=INDEXED_COLUMNS):
+    """ writes the index files of the columns of a token store """
+    for column in columns:
+        offsets = array(_U64, [0])
+        counts = array(_U32)
+        with io.open(join(store.path, column + ".postings"), mode="wb") as f_out:
+            for positions in _postings_by_id(store.columns[column], len(store.vocabulary(column))):
+                data = encode_postings(positions)
+                f_out.write(data)
+                offsets.append(offsets[-1] + len(data))
+                counts.append(len(positions))
+        with io.open(join(store.path, column + ".postings.u64"), mode="wb") as f_out:
+            offsets.tofile(f_out)
+        with io.open(join(store.path, column + ".df.u32"), mode="wb") as f_out:
+            counts.tofile(f_out)
+    with io.open(join(store.path, "index.json"), mode="w", encoding="utf-8") as f_out:
+        json.dump({"version": INDEX_VERSION, "columns": list(columns), "tokens": len(store)}, f_out, indent=2)
+
+
+def parse_pattern(text):
+    """ parses a token pattern such as "lemma=slow & pos=VBD" into a dictionary of conditions; "*" is a
+    pattern without conditions """
+    conditions = {}
+    text = text.strip()
+    if text == "*":
+        return conditions
+    for condition in text.split("&"):
+        column, sep, value = condition.strip().partition("=")
+        if not sep or column.strip() not in INDEXED_COLUMNS + ("token",):
+            raise ValueError("bad condition %r, expected <column>=<value>" % condition)
+        conditions[column.strip()] = value.strip()
+    return conditions
+
+
+class Concordance(object):
+    """ searches a token store through its inverted index """
+
+    def __init__(self, store):
+        self.store = store
+        with io.open(join(store.path, "index.json"), mode="r", encoding="utf-8") as f_in:
+            info = json.load(f_in)
+        if info["version"] != INDEX_VERSION or info["tokens"] != len(store):
+            raise ValueError("the index of %s is out of date, build it again" % store.path)
+        self.columns = info["columns"]
+        self.postings = {}
+        self.offsets = {}
+        self.counts = {}
+        for column in self.columns:
+            filename = join(store.path, column + ".postings")
+            if getsize(filename):
+                with io.open(filename, mode="rb") as f_in:
+                    self.postings[column] = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.postings[column] = b""
+            self.offsets[column] = self._read_array(column + ".postings.u64", _U64)
+            self.counts[column] = self._read_array(column + ".df.u32", _U32)
+
+    def _read_array(self, filename, typecode):
+        values = array(typecode)
+        with io.open(join(self.store.path, filename), mode="rb") as f_in:
+            values.frombytes(f_in.read())
+        return values
+
+    def count(self, column, value):
+        """ number of tokens with a value in a column """
+        i = self.store.encode(column, value)
+        return 0 if i is None else self.counts[column][i]
+
+    def positions(self, column, value):
+        """ sorted positions of the tokens with a value in a column """
+        i = self.store.encode(column, value)
+        if i is None:
+            return []
+        offsets = self.offsets[column]
+        return decode_postings(self.postings[column][offsets[i]:offsets[i + 1]])
+
+    def search(self, patterns, limit=None):
+        """ returns the start positions of the sequences of tokens matching a list of patterns (dictionaries
+        of conditions), all in the same sentence """
+        store = self.store
+        # the condition with the fewest postings gives the candidates
+        candidates = [(self.count(column, value) if column in self.counts else len(store), k, column, value)
+                      for k, conditions in enumerate(patterns) for column, value in conditions.items()]
+        if not candidates:
+            raise ValueError("the query has no conditions")
+        n, k, column, value = min(candidates)
+        if n == 0 or column not in self.counts:
+            return [] if n == 0 else self._scan(patterns, limit)
+        checks = []
+        for j, conditions in enumerate(patterns):
+            for c, v in conditions.items():
+                i = store.encode(c, v)
+                if i is None:
+                    return []
+                if (j, c) != (k, column):
+                    checks.append((j, store.columns[c], i))
+        starts = store.sentence_starts
+        results = []
+        for position in self.positions(column, value):
+            start = position - k
+            if start < 0:
+                continue
+            end = start + len(patterns)
+            s = bisect_right(starts, start) - 1
+            if end > starts[s + 1]:
+                continue
+            if all(values[start + j] == i for j, values, i in checks):
+                results.append(start)
+                if limit and len(results) >= limit:
+                    break
+        return results
+
+    def _scan(self, patterns, limit):
+        """ search without usable postings (conditions on unindexed columns only): checks every position """
+        store = self.store
+        checks = [(j, store.columns[c], store.encode(c, v)) for j, conditions in enumerate(patterns)
+                  for c, v in conditions.items()]
+        if any(i is None for _, _, i in checks):
+            return []
+        results = []
+        starts = store.sentence_starts
+        for s in range(len(starts) - 1):
+            for start in range(int(starts[s]), int(starts[s + 1]) - len(patterns) + 1):
+                if all(values[start + j] == i for j, values, i in checks):
+                    results.append(start)
+                    if limit and len(results) >= limit:
+                        return results
+        return results
+
+    def kwic(self, start, length, context=5, column="word"):
+        """ returns (doc_id, sentence, left, match, right) for a match, with up to `context` tokens of
+        the same sentence on each side """
+        store = self.store
+        s = store.sentence_of(start)
+        words = store.sentence(s, column)
+        offset = start - int(store.sentence_starts[s])
+        return (store.document_of(s), s, " ".join(words[max(0, offset - context):offset]),
+                " ".join(words[offset:offset + length]), " ".join(words[offset + length:offset + length + context]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the inverted index of a token store and searches it')
+    parser.add_argument("--store", required=True, help="token store folder written by vertical2all.py --tokens_dir")
+    parser.add_argument("--build", action="store_true", help="build the inverted index")
+    parser.add_argument("--query", nargs="+", metavar="PATTERN", help='token patterns, e.g. "lemma=slow & pos=VBD" "pos=RB"')
+    parser.add_argument("--context", type=int, default=5, help="tokens of context on each side")
+    parser.add_argument("--limit", type=int, default=50, help="maximum number of lines printed")
+    args = parser.parse_args()
+
+    store = TokenStore(args.store)
+    if args.build or not isfile(join(args.store, "index.json")):
+        started = time.perf_counter()
+        build_index(store)
+        print("Indexed %d tokens in %.2f s" % (len(store), time.perf_counter() - started))
+    if args.query:
+        concordance = Concordance(store)
+        patterns = [parse_pattern(pattern) for pattern in args.query]
+        started = time.perf_counter()
+        matches = concordance.search(patterns)
+        elapsed = time.perf_counter() - started
+        for start in matches[:args.limit]:
+            doc_id, s, left, match, right = concordance.kwic(start, len(patterns), args.context)
+            print("%s\t%s\t%40s [%s] %s" % (doc_id, s, left[-40:], match, right[:40]))
+        print("%d matches in %.1f ms" % (len(matches), elapsed * 1000))
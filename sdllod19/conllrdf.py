@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Writes CoNLL-RDF Turtle files straight from the sentences of a vertical file, without the external
+CoNLL-RDF toolchain (CoNLLStreamExtractor + CoNLLRDFFormatter, see convert-conll2rdf.sh).
+
+The output follows the files in datasets/oup/conll-rdf, one file per document:
+```
+# <doc title="..." ... primary_doc_id="...">
+@prefix : <https://github.com/txellgb/sdllod19/datasets/oup/conll-rdf/<doc_id>#> .
+@prefix ...
+:s1_0 a nif:Sentence .
+:s1_1 a nif:Word; conll:WORD "..."; conll:TOKEN "..."; conll:LEMMA "..."; conll:LEMPOS "..."; conll:HEAD :s1_0; conll:POS "..."; nif:nextWord :s1_2 .
+...
+
+@prefix ...
+:s1_0 nif:nextSentence :s2_0 .
+:s2_0 a nif:Sentence .
+...
+```
+The columns of the vertical file are WORD TOKEN LEMMA POS LEMPOS. The conventions of the toolchain
+are kept so that the triples are the same:
+* "_", "-", "--" and "O" are empty values and no triple is written for them.
+* a "#" starts a comment that runs until the end of the line; comments are written before the
+  sentence they belong to, with runs of white space collapsed.
+* literals are xml escaped (&amp; &quot; &lt; &gt;). This can be switched off with xml_escape=False,
+  the values are then written as they are. In both cases they are escaped as Turtle strings.
+
+With an OLiA index (see olia_index.py) the OLiA classes of the conll:POS tag of every word are added to
+its rdf:type, and the OLiA relations of the tag to its predicates, as the OLiA INSERT query of
+"project notes.txt" does once the files are loaded into a triple store.
+
+How to run it:
+python -m sdllod19.conllrdf --compare <folder> <folder>
+compares the triples of the .ttl files with the same name found in both folders, e.g. the output of
+python -m sdllod19.vertical2all --conllrdf_dir and datasets/oup/conll-rdf.
+"""
+
+import io
+import os
+import re
+from os import listdir
+from os.path import join, isfile
+import argparse
+
+BASE_URI = "https://github.com/txellgb/sdllod19/datasets/oup/conll-rdf/"
+COLUMNS = ("WORD", "TOKEN", "LEMMA", "POS", "LEMPOS")
+EMPTY_VALUES = frozenset(["_", "-", "--", "O"])
+
+PREFIXES = """@prefix : <%s%s#> .
+@prefix terms: <http://purl.org/acoli/open-ie/> .
+@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
+@prefix conll: <http://ufal.mff.cuni.cz/conll2009-st/task-description.html#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> ."""
+
+# prefixes added to the prefix block when the OLiA annotations are written
+OLIA_PREFIXES = (
+    ("olia", "http://purl.org/olia/olia.owl#"),
+    ("penn", "http://purl.org/olia/penn.owl#"),
+    ("olia_system", "http://purl.org/olia/system.owl#"),
+)
+_LOCAL_NAME = re.compile(r'^[A-Za-z_][\w-]*$')
+
+_TURTLE_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_XML_ESCAPES = {"&": "&amp;", '"': "&quot;", "<": "&lt;", ">": "&gt;"}
+_LITERAL = str.maketrans(_TURTLE_ESCAPES)
+_XML_LITERAL = str.maketrans(dict(_TURTLE_ESCAPES, **_XML_ESCAPES))
+
+# size of the write buffer of the output files
+BUFFER_SIZE = 1 << 20
+
+
+def _comment(text):
+    """ comments are written in one line, with runs of white space replaced by a single space """
+    return " ".join(text.split())
+
+
+def turtle_literal(value, xml_escape=True):
+    """ returns a value as a quoted Turtle string """
+    return '"' + value.translate(_XML_LITERAL if xml_escape else _LITERAL) + '"'
+
+
+def turtle_uri(uri):
+    """ returns a uri as a prefixed name when it is in one of the OLiA namespaces """
+    for prefix, namespace in OLIA_PREFIXES:
+        if uri.startswith(namespace) and _LOCAL_NAME.match(uri[len(namespace):]):
+            return prefix + ":" + uri[len(namespace):]
+    return "<" + uri + ">"
+
+
+class ConllRdfWriter(object):
+    """ writes the CoNLL-RDF triples of a document, one sentence at a time. When an OliaIndex is given,
+    the OLiA annotations of the POS tags are written too; olia_cache is a dictionary that keeps the
+    Turtle of the tags already seen and can be shared by the writers of several documents """
+
+    def __init__(self, f_out, doc_id, header_line=None, base_uri=BASE_URI, xml_escape=True, olia=None, olia_cache=None):
+        self.f_out = f_out
+        self.prefixes = PREFIXES % (base_uri, doc_id)
+        if olia is not None:
+            self.prefixes += "".join("\n@prefix %s: <%s> ." % prefix for prefix in OLIA_PREFIXES)
+        self.xml_escape = xml_escape
+        self.olia = olia
+        self.olia_cache = {} if olia_cache is None else olia_cache
+        self.sentence_idx = 0
+        self.comments = [_comment("# " + header_line)] if header_line else []
+
+    def olia_turtle(self, tag):
+        """ returns the Turtle of the OLiA annotations of a tag: the classes to add to the rdf:type of the
+        word (starting with a comma) and its relations (starting with a semicolon) """
+        turtle = self.olia_cache.get(tag)
+        if turtle is None:
+            types, relations = self.olia.lookup(tag)
+            turtle = self.olia_cache[tag] = (
+                "".join(", " + turtle_uri(c) for c in types),
+                "".join("; %s %s" % (turtle_uri(p), turtle_literal(o[1:], self.xml_escape) if o.startswith('"') else turtle_uri(o))
+                        for p, o in relations))
+        return turtle
+
+    def word_triples(self, s_id, w_idx, values, last):
+        """ returns the Turtle line of a word """
+        literals = dict((column, turtle_literal(value, self.xml_escape))
+                        for column, value in zip(COLUMNS, values) if value and value not in EMPTY_VALUES)
+        olia_types = olia_relations = ""
+        if self.olia is not None and "POS" in literals:
+            olia_types, olia_relations = self.olia_turtle(values[3])
+        predicates = ["a nif:Word" + olia_types]
+        for column in ("WORD", "TOKEN", "LEMMA", "LEMPOS"):
+            if column in literals:
+                predicates.append("conll:" + column + " " + literals[column])
+        predicates.append("conll:HEAD :" + s_id + "_0")
+        if "POS" in literals:
+            predicates.append("conll:POS " + literals["POS"])
+        if not last:
+            predicates.append("nif:nextWord :%s_%d" % (s_id, w_idx + 1))
+        return ":%s_%d %s%s ." % (s_id, w_idx, "; ".join(predicates), olia_relations)
+
+    def write_sentence(self, lines):
+        """ converts the lines of a sentence of the vertical file and writes its triples """
+        words = []
+        for line in lines:
+            line = line.rstrip("\r\n")
+            comment = line.find("#")
+            if comment >= 0:
+                self.comments.append(_comment(line[comment:]))
+                line = line[:comment]
+            if line.strip():
+                words.append(line.split("\t"))
+
+        self.sentence_idx += 1
+        s_id = "s%d" % self.sentence_idx
+        out = []
+        if self.comments:
+            out.append("\t".join(self.comments))
+            self.comments = []
+        out.append(self.prefixes)
+        if self.sentence_idx > 1:
+            out.append(":s%d_0 nif:nextSentence :%s_0 ." % (self.sentence_idx - 1, s_id))
+        out.append(":%s_0 a nif:Sentence ." % s_id)
+        for w_idx, values in enumerate(words, 1):
+            out.append(self.word_triples(s_id, w_idx, values, w_idx == len(words)))
+        out.append("\n")
+        self.f_out.write("\n".join(out))
+
+
+class ConllRdfSink(object):
+    """ vertical2all.py sink that writes a <doc_id>.ttl CoNLL-RDF file for every document """
+    reads_sentences = True
+
+    def __init__(self, out_dir, base_uri=BASE_URI, xml_escape=True, olia=None):
+        self.out_dir = out_dir
+        self.base_uri = base_uri
+        self.xml_escape = xml_escape
+        self.olia = olia
+        self.olia_cache = {}
+        self.writer = None
+
+    def start_document(self, source, doc_id, header_line, header):
+        f_out = io.open(join(self.out_dir, doc_id + ".ttl"), mode="w", encoding="utf-8", buffering=BUFFER_SIZE)
+        self.writer = ConllRdfWriter(f_out, doc_id, header_line, self.base_uri, self.xml_escape,
+                                     self.olia, self.olia_cache)
+
+    def write_sentence(self, lines, rows):
+        self.writer.write_sentence(lines)
+
+    def end_document(self):
+        self.writer.f_out.close()
+        self.writer = None
+
+    def abort_document(self):
+        self.writer.f_out.close()
+        os.remove(self.writer.f_out.name)
+        self.writer = None
+
+    def close(self):
+        pass
+
+
+_TOKEN = re.compile(r'\s*(<[^>]*>|"(?:[^"\\]|\\.)*"|[;,]|\.(?=\s|$)|[^\s;,"<>]+?(?=[;,]|\.?(?:\s|$)))')
+_UNESCAPE = re.compile(r'\\(.)')
+_UNESCAPES = {"n": "\n", "r": "\r", "t": "\t"}
+
+
+def _expand(term, prefixes):
+    """ returns a term of a triple with the prefixed names expanded to full uris """
+    if term.startswith('"'):
+        return _UNESCAPE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), term)
+    if term.startswith("<"):
+        return term
+    if term == "a":
+        return "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+    prefix, _, local = term.partition(":")
+    return "<" + prefixes[prefix] + local + ">"
+
+
+def read_triples(f_in):
+    """ reads the triples of a Turtle file written as CoNLL-RDF files are: one subject per line with
+    predicate lists, @prefix lines and comments. It returns them as a set of (s, p, o) tuples with
+    full uris """
+    prefixes = {}
+    triples = set()
+    for line in f_in:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("@prefix"):
+            _, prefix, uri = line.rstrip(" .").split(None, 2)
+            prefixes[prefix[:-1]] = uri[1:-1]
+            continue
+        terms = _TOKEN.findall(line)
+        subject = _expand(terms[0], prefixes)
+        predicate = None
+        for term in terms[1:]:
+            if term in (";", "."):
+                predicate = None
+            elif term == ",":
+                continue
+            elif predicate is None:
+                predicate = _expand(term, prefixes)
+            else:
+                triples.add((subject, predicate, _expand(term, prefixes)))
+    return triples
+
+
+def compare_dirs(dir_a, dir_b):
+    """ compares the triples of the .ttl files found in both folders. It prints the differences and
+    returns the number of files that are not equivalent """
+    names = sorted(f for f in listdir(dir_a) if f.endswith(".ttl") and isfile(join(dir_b, f)))
+    different = 0
+    for name in names:
+        with io.open(join(dir_a, name), mode="r", encoding="utf-8") as f_a:
+            triples_a = read_triples(f_a)
+        with io.open(join(dir_b, name), mode="r", encoding="utf-8") as f_b:
+            triples_b = read_triples(f_b)
+        if triples_a != triples_b:
+            different += 1
+            print(name, ":", len(triples_a - triples_b), "triples only in", dir_a, ",",
+                  len(triples_b - triples_a), "only in", dir_b)
+            for triple in sorted(triples_a ^ triples_b)[:10]:
+                print("   ", " ".join(triple))
+    print("Compared", len(names), "files,", different, "with different triples")
+    return different
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the triples of the CoNLL-RDF files of two folders')
+    parser.add_argument("--compare", nargs=2, metavar="FOLDER", required=True, help="folders with .ttl files")
+    args = parser.parse_args()
+    exit(1 if compare_dirs(*args.compare) else 0)
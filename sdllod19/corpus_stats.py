@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Computes the statistics of the Komodo vertical files: word, lemma and POS frequencies, n-gram counts and
+the number of documents and tokens by document_source, country and month of publication. It replaces
+re-parsing the .conll outputs with ad-hoc scripts, and reads the vertical files with read_vertical of
+vertical2all.py (StatsSink is a sink of vertical2all.py).
+
+The statistics are computed as a map-reduce:
+* map: every input file is split in byte ranges (a compressed file is a single range, see
+  vertical2json.py split_file) and every range is read by a worker process, which returns a Partial with
+  the statistics of its documents.
+* reduce: partials are merged by adding them up. The words, lemmas, POS tags and breakdowns are exact
+  counters. The n-grams (of 2 to --max_n words, within a sentence) are counted in a count-min sketch, a
+  table of depth rows of width counters, one counter per row incremented for every n-gram: the sketches
+  of two partials are merged by adding their tables, and the count of an n-gram is estimated as the
+  minimum of its counters, which is above the real count by at most e / width * (number of n-grams) with
+  a probability of 1 - e^-depth. The n-grams reported are chosen among candidates: the most frequent
+  n-grams of every partial, kept exactly up to --candidates n-grams per size and pruned to the most
+  frequent ones beyond that. The sketch is computed with numpy when it is installed (in pure python
+  otherwise, much slower).
+* cache: the partial of every input file is saved in the cache folder (<input filename>.stats.json with
+  the counters and <input filename>.stats.cms with the table of the sketch), with the size and the
+  modification time of the file. On the next run the files that have not changed are not read again:
+  adding a new daily file to the input folder only reads that file. A cached partial computed with other
+  sketch parameters is computed again.
+
+The results are written to the output folder:
+* stats.json: the number of files, documents, sentences and tokens, the POS distribution, the breakdowns
+  and the --top most frequent n-grams of every size with their estimated counts.
+* words.tsv and lemmas.tsv: the frequency lists, "<word>\\t<count>" by decreasing count.
+
+How to run it:
+python -m sdllod19.corpus_stats --input <input folder|input file> --out <folder> [--cache_dir <folder>] [--workers N]
+                                [--max_n N] [--sketch_width N] [--sketch_depth N] [--candidates N] [--top N]
+"""
+
+import io
+import os
+import json
+import time
+import zlib
+import random
+import argparse
+from array import array
+from collections import Counter
+from multiprocessing import Pool
+from os import makedirs
+from os.path import isfile, join, basename, getsize
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .compressed_input import open_vertical, detect_compression, source_name
+from .vertical2json import split_file, read_range
+from .vertical2all import read_vertical
+from .pipeline import input_files
+
+CACHE_VERSION = 1
+MAX_N = 3
+SKETCH_WIDTH = 1 << 18
+SKETCH_DEPTH = 4
+CANDIDATES = 10000
+TOP = 50
+SEED = 1
+# header attributes of the breakdowns, the month falls back to the first 7 characters of time_of_publication
+BREAKDOWNS = ("document_source", "country", "month_of_publication")
+MISSING = "N/A"
+# the candidates of an n-gram size are pruned when there are PRUNE times more than --candidates
+PRUNE = 4
+# n-gram hashes kept before they are added to the numpy table
+FLUSH = 1 << 20
+_MASK64 = (1 << 64) - 1
+_U32 = "I" if array("I").itemsize == 4 else "L"
+
+
+def ngram_hash(ngram):
+    return zlib.crc32(ngram.encode("utf-8"))
+
+
+class CountMinSketch(object):
+    """ depth rows of width uint32 counters, with the multiply-shift hash functions
+    ((a * crc32 + b) mod 2^64) >> 32 mod width of a seed """
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, seed=SEED):
+        generator = random.Random(seed)
+        # the high bits of the products depend on all the bits of the hashes, for every odd a
+        self.a = [generator.randrange(0, 1 << 64) | 1 for _ in range(depth)]
+        self.b = [generator.randrange(0, 1 << 64) for _ in range(depth)]
+        self.width, self.depth, self.seed = width, depth, seed
+        self.total = 0
+        self.pending = []
+        if numpy is not None:
+            self.np_a = numpy.array(self.a, dtype=numpy.uint64)[:, None]
+            self.np_b = numpy.array(self.b, dtype=numpy.uint64)[:, None]
+            self.offsets = (numpy.arange(depth, dtype=numpy.uint64) * width)[:, None]
+            self.table = numpy.zeros(depth * width, dtype=numpy.uint32)
+        else:
+            self.table = array(_U32, bytes(4 * depth * width))
+
+    def _columns(self, hashes):
+        """ the positions in the table of the counters of a list of hashes, a depth x len(hashes) array """
+        values = numpy.array(hashes, dtype=numpy.uint64)[None, :]
+        # the products and the sums wrap around at 2^64
+        return (values * self.np_a + self.np_b >> numpy.uint64(32)) % numpy.uint64(self.width) + self.offsets
+
+    def add(self, hashes):
+        """ counts the n-grams of a list of hashes once each """
+        self.total += len(hashes)
+        if numpy is not None:
+            self.pending.extend(hashes)
+            if len(self.pending) >= FLUSH:
+                self.flush()
+            return
+        table, width = self.table, self.width
+        for row, (a, b) in enumerate(zip(self.a, self.b)):
+            offset = row * width
+            for h in hashes:
+                table[offset + (((a * h + b) & _MASK64) >> 32) % width] += 1
+
+    def flush(self):
+        """ adds the pending hashes to the numpy table """
+        if not self.pending:
+            return
+        counts = numpy.bincount(self._columns(self.pending).ravel().astype(numpy.int64), minlength=len(self.table))
+        self.table += counts.astype(numpy.uint32)
+        self.pending = []
+
+    def estimates(self, hashes):
+        """ the estimated counts of a list of hashes """
+        self.flush()
+        if not hashes:
+            return []
+        if numpy is not None:
+            return self.table[self._columns(hashes).astype(numpy.int64)].min(axis=0).tolist()
+        table, width = self.table, self.width
+        return [min(table[row * width + (((a * h + b) & _MASK64) >> 32) % width]
+                    for row, (a, b) in enumerate(zip(self.a, self.b))) for h in hashes]
+
+    def error(self):
+        """ the bound of the overestimate of a count, with a probability of 1 - e^-depth """
+        return 2.718281828 / self.width * self.total
+
+    def merge(self, other):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("the sketches do not have the same width, depth and seed")
+        self.flush()
+        other.flush()
+        if numpy is not None:
+            self.table += other.table
+        else:
+            self.table = array(_U32, map(sum, zip(self.table, other.table)))
+        self.total += other.total
+
+    def tobytes(self):
+        self.flush()
+        return self.table.tobytes()
+
+    def frombytes(self, data, total):
+        if len(data) != 4 * self.depth * self.width:
+            raise ValueError("the sketch has %d bytes instead of %d" % (len(data), 4 * self.depth * self.width))
+        if numpy is not None:
+            self.table = numpy.frombuffer(data, dtype=numpy.uint32).copy()
+        else:
+            self.table = array(_U32, data)
+        self.total = total
+        self.pending = []
+
+    def __getstate__(self):
+        # the numpy arrays are built again from the seed, only the table is sent to the main process
+        return {"width": self.width, "depth": self.depth, "seed": self.seed, "total": self.total, "table": self.tobytes()}
+
+    def __setstate__(self, state):
+        self.__init__(state["width"], state["depth"], state["seed"])
+        self.frombytes(state["table"], state["total"])
+
+
+class Partial(object):
+    """ the statistics of a part of the corpus; two partials are merged by adding them up """
+
+    def __init__(self, max_n=MAX_N, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, candidates=CANDIDATES):
+        self.max_n = max_n
+        self.candidates_size = candidates
+        self.counts = Counter()
+        self.words = Counter()
+        self.lemmas = Counter()
+        self.pos = Counter()
+        # attribute -> value -> [documents, tokens]
+        self.breakdowns = dict((field, {}) for field in BREAKDOWNS)
+        # n-gram size -> most frequent n-grams, with their counts in this partial
+        self.candidates = dict((n, Counter()) for n in range(2, max_n + 1))
+        self.sketch = CountMinSketch(width, depth)
+
+    def params(self):
+        """ the parameters that must be the same to merge two partials """
+        return {"max_n": self.max_n, "width": self.sketch.width, "depth": self.sketch.depth,
+                "seed": self.sketch.seed, "candidates": self.candidates_size}
+
+    def add_document(self, header, sentences):
+        """ adds a complete document, given as its header and the rows of its sentences """
+        n_tokens = 0
+        for rows in sentences:
+            n_tokens += len(rows)
+            self.words.update(row[0] for row in rows)
+            self.lemmas.update(row[2] for row in rows)
+            self.pos.update(row[3] for row in rows)
+            words = [row[0] for row in rows]
+            for n, candidates in self.candidates.items():
+                ngrams = [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+                candidates.update(ngrams)
+                self.sketch.add([ngram_hash(ngram) for ngram in ngrams])
+        self.counts["documents"] += 1
+        self.counts["sentences"] += len(sentences)
+        self.counts["tokens"] += n_tokens
+        for field in BREAKDOWNS:
+            value = header.get(field)
+            if not value and field == "month_of_publication":
+                value = header.get("time_of_publication", "")[:7]
+            counts = self.breakdowns[field].setdefault(value or MISSING, [0, 0])
+            counts[0] += 1
+            counts[1] += n_tokens
+        self.prune(PRUNE * self.candidates_size)
+
+    def prune(self, limit):
+        """ keeps the candidates_size most frequent candidates of the n-gram sizes with more than limit """
+        for n, candidates in self.candidates.items():
+            if len(candidates) > limit:
+                self.candidates[n] = Counter(dict(candidates.most_common(self.candidates_size)))
+
+    def merge(self, other):
+        if other.params() != self.params():
+            raise ValueError("the partials do not have the same parameters")
+        self.counts.update(other.counts)
+        self.words.update(other.words)
+        self.lemmas.update(other.lemmas)
+        self.pos.update(other.pos)
+        for field, values in other.breakdowns.items():
+            for value, (documents, tokens) in values.items():
+                counts = self.breakdowns[field].setdefault(value, [0, 0])
+                counts[0] += documents
+                counts[1] += tokens
+        for n, candidates in other.candidates.items():
+            self.candidates[n].update(candidates)
+        self.prune(PRUNE * self.candidates_size)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def top_ngrams(self, n, top=TOP):
+        """ the top most frequent n-grams of a size among the candidates, as (n-gram, estimated count) """
+        ngrams = list(self.candidates[n])
+        estimates = self.sketch.estimates([ngram_hash(ngram) for ngram in ngrams])
+        return sorted(zip(ngrams, estimates), key=lambda item: (-item[1], item[0]))[:top]
+
+    def to_json(self):
+        """ the counters as a json object; the table of the sketch is saved apart, see tobytes """
+        return {"params": self.params(), "counts": self.counts, "words": self.words, "lemmas": self.lemmas,
+                "pos": self.pos, "breakdowns": self.breakdowns, "ngrams_total": self.sketch.total,
+                "candidates": dict((str(n), candidates) for n, candidates in self.candidates.items())}
+
+    @classmethod
+    def from_json(cls, data, sketch):
+        """ the partial saved by to_json, with the bytes of the table of its sketch """
+        params = data["params"]
+        partial = cls(params["max_n"], params["width"], params["depth"], params["candidates"])
+        if params["seed"] != partial.sketch.seed:
+            raise ValueError("the sketch has the seed %d instead of %d" % (params["seed"], partial.sketch.seed))
+        partial.counts = Counter(data["counts"])
+        partial.words = Counter(data["words"])
+        partial.lemmas = Counter(data["lemmas"])
+        partial.pos = Counter(data["pos"])
+        partial.breakdowns = data["breakdowns"]
+        partial.candidates = dict((int(n), Counter(candidates)) for n, candidates in data["candidates"].items())
+        partial.sketch.frombytes(sketch, data["ngrams_total"])
+        return partial
+
+
+class StatsSink(object):
+    """ adds every complete document to a Partial, a sink of vertical2all.py read_vertical """
+    reads_sentences = True
+
+    def __init__(self, partial):
+        self.partial = partial
+        self.header = None
+        self.sentences = []
+
+    def start_document(self, source, doc_id, header_line, header):
+        self.header = header
+        self.sentences = []
+
+    def write_sentence(self, lines, rows):
+        self.sentences.append(rows)
+
+    def end_document(self):
+        self.partial.add_document(self.header, self.sentences)
+        self.header, self.sentences = None, []
+
+    def abort_document(self):
+        self.header, self.sentences = None, []
+
+    def close(self):
+        pass
+
+
+def read_partial(job):
+    """ worker function: the Partial of a byte range of a vertical file, or of a whole compressed file """
+    filename, start, end, params = job
+    partial = Partial(params["max_n"], params["width"], params["depth"], params["candidates"])
+    compression = detect_compression(filename)
+    f_input = open_vertical(filename) if compression else read_range(filename, start, end)
+    try:
+        for _ in read_vertical(f_input, source_name(basename(filename), compression), [StatsSink(partial)]):
+            pass
+    finally:
+        f_input.close()
+    partial.sketch.flush()
+    return filename, partial
+
+
+def file_key(filename):
+    status = os.stat(filename)
+    return {"size": status.st_size, "mtime_ns": status.st_mtime_ns}
+
+
+class StatsCache(object):
+    """ the partials of the input files, in a folder: <input filename>.stats.json and .stats.cms """
+
+    def __init__(self, folder):
+        self.folder = folder
+        makedirs(folder, exist_ok=True)
+
+    def _paths(self, filename):
+        prefix = join(self.folder, basename(filename) + ".stats")
+        return prefix + ".json", prefix + ".cms"
+
+    def load(self, filename, params):
+        """ the cached partial of a file, or None when the file or the parameters have changed """
+        json_path, cms_path = self._paths(filename)
+        if not isfile(json_path) or not isfile(cms_path):
+            return None
+        try:
+            with io.open(json_path, mode="r", encoding="utf-8") as f_in:
+                data = json.load(f_in)
+            if (data.get("version") != CACHE_VERSION or data["file"] != file_key(filename)
+                    or data["partial"]["params"] != params):
+                return None
+            with io.open(cms_path, mode="rb") as f_in:
+                return Partial.from_json(data["partial"], f_in.read())
+        except (ValueError, KeyError) as ex:
+            print("Error in the following file: ", json_path, ex)
+            return None
+
+    def save(self, filename, key, partial):
+        """ saves the partial of a file. The sketch is written first: the json file, written last, is the
+        one that makes the entry valid """
+        json_path, cms_path = self._paths(filename)
+        with io.open(cms_path + ".tmp", mode="wb") as f_out:
+            f_out.write(partial.sketch.tobytes())
+        os.replace(cms_path + ".tmp", cms_path)
+        with io.open(json_path + ".tmp", mode="w", encoding="utf-8") as f_out:
+            json.dump({"version": CACHE_VERSION, "file": key, "partial": partial.to_json()}, f_out)
+        os.replace(json_path + ".tmp", json_path)
+
+
+def compute(filenames, params, cache=None, workers=1):
+    """ the map-reduce: returns the Partial of all the files and the number of files read from the cache.
+    The files that are not in the cache are split in ranges read by a pool of workers; the partials of the
+    ranges of a file are merged and saved to the cache, then the partials of all the files are merged """
+    total = Partial(params["max_n"], params["width"], params["depth"], params["candidates"])
+    jobs = []
+    keys = {}
+    cached = 0
+    for filename in filenames:
+        partial = cache.load(filename, params) if cache is not None else None
+        if partial is not None:
+            total.merge(partial)
+            cached += 1
+            continue
+        # the key is taken before the file is read: a file changed while it is read is read again next time
+        keys[filename] = file_key(filename)
+        if workers > 1 and not detect_compression(filename):
+            jobs.extend((filename, start, end, params) for start, end in split_file(filename, workers * 4))
+        else:
+            jobs.append((filename, 0, getsize(filename), params))
+
+    remaining = Counter(job[0] for job in jobs)
+    partials = {}
+
+    def reduce_range(filename, partial):
+        if filename in partials:
+            partials[filename].merge(partial)
+        else:
+            partials[filename] = partial
+        remaining[filename] -= 1
+        if remaining[filename] == 0:
+            if cache is not None:
+                cache.save(filename, keys[filename], partials[filename])
+            total.merge(partials.pop(filename))
+
+    if workers > 1 and len(jobs) > 1:
+        with Pool(workers) as pool:
+            for filename, partial in pool.imap_unordered(read_partial, jobs):
+                reduce_range(filename, partial)
+    else:
+        for job in jobs:
+            reduce_range(*read_partial(job))
+    return total, cached
+
+
+def write_frequencies(filename, counter):
+    with io.open(filename, mode="w", encoding="utf-8") as f_out:
+        for word, count in sorted(counter.items(), key=lambda item: (-item[1], item[0])):
+            f_out.write("%s\t%d\n" % (word, count))
+
+
+def write_results(out_dir, partial, n_files, top=TOP):
+    """ writes stats.json, words.tsv and lemmas.tsv to the output folder, and returns the summary """
+    makedirs(out_dir, exist_ok=True)
+    summary = {
+        "files": n_files,
+        "documents": partial.counts["documents"],
+        "sentences": partial.counts["sentences"],
+        "tokens": partial.counts["tokens"],
+        "words": len(partial.words),
+        "lemmas": len(partial.lemmas),
+        "pos": dict(partial.pos.most_common()),
+        "breakdowns": dict((field, dict(sorted(values.items(), key=lambda item: (-item[1][0], item[0]))))
+                           for field, values in partial.breakdowns.items()),
+        "ngrams": dict((str(n), partial.top_ngrams(n, top)) for n in sorted(partial.candidates)),
+        "ngram_error": round(partial.sketch.error(), 2)
+    }
+    with io.open(join(out_dir, "stats.json"), mode="w", encoding="utf-8") as f_out:
+        json.dump(summary, f_out, ensure_ascii=False, indent=2)
+    write_frequencies(join(out_dir, "words.tsv"), partial.words)
+    write_frequencies(join(out_dir, "lemmas.tsv"), partial.lemmas)
+    return summary
+
+
+if __name__ == '__main__':
+    """ if the input parameter is a folder, reads all the files in the folder """
+    parser = argparse.ArgumentParser(description='Computes word, lemma, POS, n-gram and metadata statistics of vertical files')
+    parser.add_argument("--input", required=True, help="input filename or folder")
+    parser.add_argument("--out", required=True, help="output folder")
+    parser.add_argument("--cache_dir", help="folder of the partials of the input files, by default <out>/cache")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--max_n", type=int, default=MAX_N, help="largest n-gram size")
+    parser.add_argument("--sketch_width", type=int, default=SKETCH_WIDTH, help="counters per row of the count-min sketch")
+    parser.add_argument("--sketch_depth", type=int, default=SKETCH_DEPTH, help="rows of the count-min sketch")
+    parser.add_argument("--candidates", type=int, default=CANDIDATES, help="n-grams of every size kept as candidates")
+    parser.add_argument("--top", type=int, default=TOP, help="number of n-grams of every size reported")
+    args = parser.parse_args()
+    if args.max_n < 2:
+        parser.error("--max_n must be at least 2")
+
+    filenames = [join(d, f) for d, f in input_files(args.input)]
+
+    params = {"max_n": args.max_n, "width": args.sketch_width, "depth": args.sketch_depth, "seed": SEED,
+              "candidates": args.candidates}
+    started = time.perf_counter()
+    cache = StatsCache(args.cache_dir or join(args.out, "cache"))
+    partial, cached = compute(filenames, params, cache, args.workers)
+    summary = write_results(args.out, partial, len(filenames), args.top)
+    print("Read %d files (%d from the cache) in %.2f s: %d documents, %d sentences, %d tokens" % (
+        len(filenames), cached, time.perf_counter() - started, summary["documents"], summary["sentences"], summary["tokens"]))
+    for n, ngrams in sorted(summary["ngrams"].items()):
+        print("Top %s-grams (overestimated by at most %.0f):" % (n, summary["ngram_error"]), ", ".join("%s (%d)" % item for item in ngrams[:10]))
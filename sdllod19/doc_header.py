@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Parser for the <doc ...> header lines of Komodo vertical files, shared by vertical2json.py,
+vertical2conll.py and metadata2rdf.py.
+
+A header line looks like:
+```
+<doc title="..." url="..." genre="..." ... primary_doc_id="...">
+```
+Instead of turning the line into an xml document and parsing it with ElementTree, the attributes are
+scanned directly. Komodo headers only use double quoted values, so the line is split on the quote
+character: odd items are the values and even items hold the attribute names. The names are parsed once
+for every list of attributes and cached, since all the headers of a file usually have the same ones.
+Headers that do not fit that shape (e.g. single quoted values) go through a precompiled regular
+expression instead.
+
+Attribute values are unescaped following the xml rules (&amp; &lt; &gt; &quot; &apos; and numeric
+character references). An ampersand that does not start one of those references is kept as it is,
+because vertical files contain raw urls such as "...?id=1&ref=rss".
+"""
+
+import re
+
+_HEADER = re.compile(r'\s*<doc(\s.*?)/?>\s*$', re.DOTALL)
+_ATTRIBUTE = re.compile(r'([A-Za-z_][\w.:-]*)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_ENTITY = re.compile(r'&(amp|lt|gt|quot|apos|#[0-9]+|#x[0-9a-fA-F]+);')
+_ENTITIES = {"amp": "&", "lt": "<", "gt": ">", "quot": '"', "apos": "'"}
+_HEADER_END = (">", "/>")
+# attribute names of the headers already seen, see parse_header
+_NAMES = {}
+_NAMES_SIZE = 1024
+
+
+class HeaderError(ValueError):
+    """ raised when a line is not a well formed <doc ...> header """
+
+
+def _replace_entity(match):
+    name = match.group(1)
+    if name[0] != "#":
+        return _ENTITIES[name]
+    code = int(name[2:], 16) if name[1] == "x" else int(name[1:])
+    try:
+        return chr(code)
+    except (ValueError, OverflowError):
+        return match.group(0)
+
+
+def unescape(value):
+    """ replaces the xml entities and character references found in an attribute value """
+    if "&" not in value:
+        return value
+    return _ENTITY.sub(_replace_entity, value)
+
+
+def _parse_header_regex(line):
+    """ slow path of parse_header, for headers that are not simple double quoted attribute lists """
+    header = _HEADER.match(line)
+    if header is None:
+        raise HeaderError("not a <doc> header: %r" % line[:80])
+    return {name: unescape(double_quoted or single_quoted)
+            for name, double_quoted, single_quoted in _ATTRIBUTE.findall(header.group(1))}
+
+
+def _attribute_names(text):
+    """ returns the attribute names of the text around the values of a header, the items between the
+    values joined with quotes ('<doc a="" b="">'), or None when it is not a double quoted attribute list """
+    items = text.split('"')
+    names = "".join(items[:-1]).replace("=", " ").split()
+    if names and names[0] == "<doc" and len(names) == len(items) and items[-1].strip() in _HEADER_END:
+        return names[1:]
+    return None
+
+
+def parse_header(line):
+    """ takes a <doc ...> line of a vertical file and returns a dictionary with its attributes """
+    parts = line.split('"')
+    # the headers of a corpus have the same attributes in the same order: the names are looked up by the
+    # text around the values, which is the same for all of them
+    text = '"'.join(parts[0::2])
+    names = _NAMES.get(text, False)
+    if names is False:
+        if len(_NAMES) >= _NAMES_SIZE:
+            _NAMES.clear()
+        names = _NAMES[text] = _attribute_names(text)
+    if names is None:
+        return _parse_header_regex(line)
+    attributes = dict(zip(names, parts[1::2]))
+    if "&" in line:
+        for name, value in attributes.items():
+            if "&" in value:
+                attributes[name] = _ENTITY.sub(_replace_entity, value)
+    return attributes
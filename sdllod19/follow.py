@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Follows a vertical file that is being appended to, like tail -f, so that the documents written by the
+crawler during the day are converted a few seconds after their </doc> line instead of by the next batch
+run over the whole file (vertical2all.py --follow).
+
+* the file is read from the offset of the checkpoint and polled for new data every --poll_interval
+  seconds. Only the lines up to the last complete </doc> line are passed on: a document that is still
+  being written at the end of the file is kept back until its </doc> line is complete.
+* the checkpoint is a json file with the path and the inode of the file, and the byte offset after the
+  last </doc> line passed on. It is saved (written to a temporary file and renamed) when the reader asks
+  for the next documents, that is after the documents before it have been converted, so a restart
+  continues after the last documents converted. A process killed between the conversion of documents and
+  the checkpoint converts them again when it is restarted: the outputs of a document are written again,
+  and its metadata triples are written twice (the same triples).
+* when the file is replaced by another one (a new inode) or truncated below the offset read, it is read
+  again from the start, and the checkpoint is reset. A file truncated while the follower is not running
+  cannot be told apart from the same file, and it is read from the offset of the checkpoint if it is long
+  enough.
+Compressed files cannot be followed.
+
+How to run it:
+python -m sdllod19.follow --input <file> [--checkpoint <file>] [--poll_interval S] [--idle_timeout S]
+    prints the doc_id of every new document of a vertical file as it is completed.
+"""
+
+import io
+import os
+import json
+import time
+import argparse
+from os.path import isfile, abspath
+
+from .doc_header import parse_header, HeaderError
+
+POLL_INTERVAL = 1.0
+READ_SIZE = 1 << 20
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+
+
+def checkpoint_filename(filename):
+    """ the default checkpoint of a followed file, next to it """
+    return filename + CHECKPOINT_SUFFIX
+
+
+class Checkpoint(object):
+    """ the position in a followed file after the last complete document passed on """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = self.inode = None
+        self.offset = 0
+        if isfile(filename):
+            with io.open(filename, mode="r", encoding="utf-8") as f_in:
+                data = json.load(f_in)
+            self.path, self.inode, self.offset = data["path"], data["inode"], data["offset"]
+
+    def resumes(self, path, inode, size):
+        """ true when the checkpoint is a position in this file """
+        return self.path == abspath(path) and self.inode == inode and self.offset <= size
+
+    def save(self, path, inode, offset):
+        self.path, self.inode, self.offset = abspath(path), inode, offset
+        with io.open(self.filename + ".tmp", mode="w", encoding="utf-8") as f_out:
+            json.dump({"path": self.path, "inode": inode, "offset": offset}, f_out)
+        os.replace(self.filename + ".tmp", self.filename)
+
+
+def complete_end(buffer):
+    """ the position after the last complete </doc> line of a buffer, 0 when there is none. The last
+    line of the buffer is not complete unless the buffer ends with a newline """
+    last = buffer.rfind(b"\n")
+    if last == -1:
+        return 0
+    start = buffer.rfind(b"\n</doc>", 0, last) + 1
+    if start == 0 and not buffer.startswith(b"</doc>"):
+        return 0
+    return buffer.find(b"\n", start) + 1
+
+
+def follow_documents(filename, checkpoint, poll_interval=POLL_INTERVAL, idle_timeout=None):
+    """ yields the lines of the documents completed in a vertical file, from the offset of the checkpoint,
+    as lists of lines ending with a </doc> line. The checkpoint is saved when the next lines are asked for.
+    It stops after idle_timeout seconds without new documents, or never when it is None """
+    f_in = None
+    buffer = bytearray()
+    inode = offset = position = 0
+    idle_since = time.monotonic()
+    try:
+        while True:
+            try:
+                status = os.stat(filename)
+            except FileNotFoundError:
+                # the file is being replaced
+                status = None
+            if status is not None and (f_in is None or status.st_ino != inode or status.st_size < position):
+                truncated = f_in is not None and status.st_ino == inode
+                if f_in is not None:
+                    print("%s was replaced or truncated, reading it from the start" % filename)
+                    f_in.close()
+                f_in = io.open(filename, mode="rb")
+                status = os.fstat(f_in.fileno())
+                if truncated and status.st_ino == inode:
+                    # truncated in place (copytruncate): the offset of the checkpoint can be below the new
+                    # size, but the data after it is not the data that was read
+                    checkpoint.save(filename, inode, 0)
+                inode = status.st_ino
+                offset = checkpoint.offset if checkpoint.resumes(filename, inode, status.st_size) else 0
+                f_in.seek(offset)
+                position = offset
+                buffer = bytearray()
+            data = f_in.read(READ_SIZE) if f_in is not None else b""
+            if data:
+                position += len(data)
+                buffer += data
+                end = complete_end(buffer)
+                if end:
+                    # decoded as by open_vertical, with universal newlines, so that the lines are the same
+                    # as the ones of a converter reading the whole file
+                    lines = list(io.TextIOWrapper(io.BytesIO(bytes(buffer[:end])), encoding="utf-8"))
+                    del buffer[:end]
+                    offset += end
+                    yield lines
+                    checkpoint.save(filename, inode, offset)
+                    idle_since = time.monotonic()
+                continue
+            if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                return
+            time.sleep(poll_interval)
+    finally:
+        if f_in is not None:
+            f_in.close()
+
+
+def add_arguments(parser):
+    """ adds --follow, --checkpoint, --poll_interval and --idle_timeout to an argparse parser """
+    parser.add_argument("--follow", action="store_true", help="convert the documents appended to the input file as they are completed")
+    parser.add_argument("--checkpoint", help="checkpoint file of --follow, by default <input file>" + CHECKPOINT_SUFFIX)
+    parser.add_argument("--poll_interval", type=float, default=POLL_INTERVAL, help="seconds between two reads of the followed file")
+    parser.add_argument("--idle_timeout", type=float, help="stop following after S seconds without new documents")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prints the documents appended to a vertical file as they are completed')
+    parser.add_argument("--input", required=True, help="input filename")
+    parser.add_argument("--checkpoint", help="checkpoint file, by default <input file>" + CHECKPOINT_SUFFIX)
+    parser.add_argument("--poll_interval", type=float, default=POLL_INTERVAL, help="seconds between two reads of the file")
+    parser.add_argument("--idle_timeout", type=float, help="stop after S seconds without new documents")
+    args = parser.parse_args()
+
+    checkpoint = Checkpoint(args.checkpoint or checkpoint_filename(args.input))
+    try:
+        for lines in follow_documents(args.input, checkpoint, args.poll_interval, args.idle_timeout):
+            for line in lines:
+                if line.startswith("<doc "):
+                    try:
+                        print(parse_header(line)["primary_doc_id"])
+                    except (HeaderError, KeyError) as ex:
+                        print("Error in the following document: ", line, ex)
+    except KeyboardInterrupt:
+        pass
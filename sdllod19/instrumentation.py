@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Counters and timers shared by vertical2json.py, vertical2conll.py and metadata2rdf.py.
+
+The scripts update the module level `stats` object while they convert:
+* counters: documents, sentences, tokens, bytes_read, bytes_written and parse_errors.
+* timers: cumulative seconds spent in header_parse, layer_building and serialization (serialization
+  includes writing to the output files, which are buffered).
+The timers are plain time.perf_counter() differences added to a dictionary, a few hundred nanoseconds per
+call, so they are always on. The report is printed at the end of the run with --stats text|json. With
+vertical2json.py --workers the counters and timers of the workers are added up, so the timers can add up
+to more than the elapsed time.
+
+With --profile <file> a cProfile profiler is enabled for one document out of every --profile_every
+documents, and the profile of those documents is saved in <file> (readable with pstats or snakeviz).
+Sampling keeps the overhead of the profiler on a small part of the run. Only the documents converted by
+the main process are profiled, not the ones of the worker processes of vertical2json.py --workers.
+
+The command line parameters are added to the scripts with add_arguments, and the report is printed by
+finish.
+"""
+
+import sys
+import json
+import time
+import cProfile
+
+COUNTERS = ("documents", "sentences", "tokens", "bytes_read", "bytes_written", "parse_errors")
+TIMERS = ("header_parse", "layer_building", "serialization")
+
+
+class Stats(object):
+    """ counters and timers of a conversion run """
+
+    def __init__(self):
+        self.profiler = None
+        self.profile_every = 0
+        self.profiling = False
+        self.reset()
+
+    def reset(self):
+        """ sets the counters and timers back to zero, the profiler is kept """
+        self.counts = dict((name, 0) for name in COUNTERS)
+        self.times = dict((name, 0.0) for name in TIMERS)
+        self.started = time.perf_counter()
+        self.seen = 0
+
+    def enable_profile(self, every):
+        """ profiles one document out of every `every` documents """
+        self.profiler = cProfile.Profile()
+        self.profile_every = max(1, every)
+
+    def start_document(self):
+        """ called when a document starts, it turns on the profiler for the sampled documents """
+        if self.profiler is not None:
+            if self.profiling:
+                self.profiler.disable()
+            self.profiling = self.seen % self.profile_every == 0
+            if self.profiling:
+                self.profiler.enable()
+        self.seen += 1
+
+    def end_document(self):
+        """ called when a document is complete """
+        self.counts["documents"] += 1
+        if self.profiling:
+            self.profiler.disable()
+            self.profiling = False
+
+    def merge(self, other):
+        """ adds the counters and timers of a dictionary returned by as_dict, e.g. from a worker process """
+        for name, value in other["counts"].items():
+            self.counts[name] = self.counts.get(name, 0) + value
+        for name, value in other["times"].items():
+            self.times[name] = self.times.get(name, 0.0) + value
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "counts": dict(self.counts),
+            "times": dict(self.times),
+            "elapsed": elapsed,
+            "tokens_per_sec": self.counts["tokens"] / elapsed if elapsed else None,
+        }
+
+    def report(self, kind, f_out=sys.stdout):
+        """ prints the counters and timers, kind is "text" or "json" """
+        data = self.as_dict()
+        if kind == "json":
+            f_out.write(json.dumps(data, indent=2) + "\n")
+            return
+        for name in COUNTERS:
+            f_out.write("%-16s %d\n" % (name, data["counts"][name]))
+        for name in TIMERS:
+            f_out.write("%-16s %.3f s\n" % (name, data["times"][name]))
+        f_out.write("%-16s %.3f s (%.0f tokens/s)\n" % ("elapsed", data["elapsed"], data["tokens_per_sec"] or 0))
+
+    def dump_profile(self, filename):
+        if self.profiling:
+            self.profiler.disable()
+            self.profiling = False
+        self.profiler.dump_stats(filename)
+
+
+stats = Stats()
+
+
+def add_arguments(parser):
+    """ adds --quiet, --stats, --profile and --profile_every to an argparse parser """
+    parser.add_argument("--quiet", action="store_true", help="do not print a line per input file and per document")
+    parser.add_argument("--stats", choices=["text", "json"], help="print the counters and timers of the run at the end")
+    parser.add_argument("--profile", help="file where the cProfile statistics of the sampled documents are saved")
+    parser.add_argument("--profile_every", type=int, default=100, help="profile one document out of every N")
+
+
+def start(args):
+    """ sets the counters and timers back to zero and sets up the profiler requested with the parameters of
+    add_arguments, so that a script run several times in the same process reports every run apart """
+    stats.reset()
+    if args.profile:
+        stats.enable_profile(args.profile_every)
+
+
+def finish(args):
+    """ prints the report and saves the profile requested with the parameters of add_arguments """
+    if args.profile:
+        stats.dump_profile(args.profile)
+    if args.stats:
+        stats.report(args.stats)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Manifest of a conversion run, used to make reruns of vertical2json.py incremental (--incremental).
+
+For every document converted the manifest records the input file it comes from, a hash of the bytes of
+the document (from its <doc ...> line to its </doc> line), the output options it was converted with
+(e.g. the indentation of the json files) and the output files written for it. When the conversion is run
+again over the same input:
+* documents whose hash and output options are unchanged and whose output files all exist are skipped.
+* new and modified documents, documents converted with other output options (e.g. a rerun with or without
+  --compact), and documents whose outputs are missing or were left half written by an interrupted run,
+  are converted again.
+* documents recorded for an input file that are no longer in it are orphans: their output files are
+  removed. When the input is a folder, the documents of the input files that are no longer in the folder
+  are orphans too; when it is a single file, the documents of the other input files are kept.
+
+The manifest is a json lines file, by default manifest.jsonl in the output folder. Every converted
+document appends one line, flushed right away, so a run that dies partway keeps the documents already
+done. Later lines replace earlier lines of the same document, and the file is rewritten without the
+replaced lines at the end of every run.
+"""
+
+import io
+import os
+import json
+import mmap
+import hashlib
+from os.path import isfile
+
+from .vertical_index import scan_documents
+
+MANIFEST = "manifest.jsonl"
+
+
+def document_digests(filename):
+    """ yields (doc_id, start, end, digest) for every complete document of a vertical file. The digest
+    is the sha1 of the bytes of the document, read from a memory map without copying them """
+    with io.open(filename, mode="rb") as f_in:
+        if os.fstat(f_in.fileno()).st_size == 0:
+            return
+        data = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(data)
+        try:
+            for entry in scan_documents(f_in):
+                yield entry.doc_id, entry.start, entry.end, hashlib.sha1(view[entry.start:entry.end]).hexdigest()
+        finally:
+            view.release()
+            data.close()
+
+
+class Manifest(object):
+    """ the documents converted so far, by (input file, doc_id) """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        if isfile(filename):
+            with io.open(filename, mode="r", encoding="utf-8") as f_in:
+                for line in f_in:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # last line of a run that was killed while writing it
+                        continue
+                    key = (entry["source"], entry["doc_id"])
+                    if entry.get("removed"):
+                        self.entries.pop(key, None)
+                    else:
+                        self.entries[key] = entry
+        self.f_out = io.open(filename, mode="a", encoding="utf-8")
+
+    def _append(self, entry):
+        self.f_out.write(json.dumps(entry, sort_keys=True) + "\n")
+        self.f_out.flush()
+
+    def up_to_date(self, source, doc_id, digest, options=None):
+        """ true when the document was converted with the same content and output options and its outputs
+        are all there """
+        entry = self.entries.get((source, doc_id))
+        return (entry is not None and entry["hash"] == digest and entry.get("options") == options
+                and all(isfile(o) for o in entry["outputs"]))
+
+    def record(self, source, doc_id, digest, outputs, options=None):
+        """ records a document whose output files have been completely written with the given output options """
+        entry = {"source": source, "doc_id": doc_id, "hash": digest, "outputs": outputs, "options": options}
+        self.entries[(source, doc_id)] = entry
+        self._append(entry)
+
+    def documents(self, source):
+        return [doc_id for s, doc_id in self.entries if s == source]
+
+    def sources(self):
+        """ the input files of the documents recorded """
+        return set(s for s, _ in self.entries)
+
+    def remove(self, source, doc_id):
+        """ removes the output files of a document and forgets it. It returns the number of files removed """
+        entry = self.entries.pop((source, doc_id))
+        removed = 0
+        for output in entry["outputs"]:
+            if isfile(output):
+                os.remove(output)
+                removed += 1
+        self._append({"source": source, "doc_id": doc_id, "removed": True})
+        return removed
+
+    def close(self):
+        """ rewrites the manifest with one line per document """
+        self.f_out.close()
+        with io.open(self.filename + ".tmp", mode="w", encoding="utf-8") as f_out:
+            for entry in self.entries.values():
+                f_out.write(json.dumps(entry, sort_keys=True) + "\n")
+        os.replace(self.filename + ".tmp", self.filename)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Writes the metadata of the documents of Komodo vertical files as an RDF graph (Dublin Core / DCAT).
+
+How to run it:
+python -m sdllod19.metadata2rdf --input <input folder|input file> --out_dir <output_folder> [--format turtle|ntriples] [--gzip]
+                                [--decompress_threads N] [--quiet] [--stats text|json] [--profile <file> [--profile_every N]]
+
+It takes the following parameters:
+* input: it can be either a file or a folder. If it is a folder the script will read all files in the folder.
+  Files compressed with gzip, xz or zstd are decompressed while they are read (see compressed_input.py).
+* decompress_threads: optional number of threads decompressing a multi member gzip input file.
+* out_dir: the output folder. A single graph is written for all the input files: metadata.ttl, or
+  metadata.nt with --format ntriples, with .gz added with --gzip.
+* quiet, stats, profile, profile_every: see instrumentation.py.
+
+Every document is written once: a document whose primary_doc_id has already been written (in the same
+or in another input file) is skipped. The ids are kept as 64 bit hashes, so millions of documents fit
+in a few tens of MB. The triples are written while the input is read, one document at a time; in Turtle
+every document is a subject with a predicate list. Literals are escaped as Turtle/N-Triples strings.
+The command line reads the documents with the stages of pipeline.py (read_documents and write_metadata).
+"""
+
+import io
+import re
+import gzip
+from os import makedirs
+from os.path import isfile, join, getsize
+from array import array
+from hashlib import blake2b
+from urllib.parse import quote
+import argparse
+import json
+
+from .doc_header import parse_header, HeaderError
+from .conllrdf import turtle_literal
+from . import compressed_input
+from . import instrumentation
+from .instrumentation import stats
+from .pipeline import input_files, parse_documents, read_documents, write_metadata, run
+
+
+def document_metadata(header):
+    """ converts the attributes of a <doc ...> line to the dublin core / dcat metadata written to the rdf graph """
+    return {
+        "dc:title": header.get("title", ""),
+        "dcat:downloadURL": header.get("url", ""),
+        "dcterms:type": header.get("genre", ""),
+        "dcterms:subject": header.get("domain", ""),
+        "rdau:P60163": header["city"] + ", " + header["country"] if header.get("country") and header.get("city") else "",
+        "dc:publisher": header.get("document_source", ""),
+        "dc:source": header.get("content_source", ""),
+        "dcterms:language": "en",
+        "dcterms:issued": header.get("time_of_publication", ""),
+        "dc:identifier": header["primary_doc_id"]
+    }
+
+
+def process_document(document):
+    """ takes the <doc ...> line with document information and converts it to the json
+    metadata structure defined for the corpus data model. It also returns the doc_id """
+
+    try:
+        header = parse_header(document)
+        doc_id = header["primary_doc_id"]
+    except (HeaderError, KeyError) as ex:
+        print("Error in the following document: ", document, ex)
+        return None, None
+    return doc_id, document_metadata(header)
+
+
+def read_document(f_in):
+    """ yields the doc_id and the metadata of every document of a vertical file """
+    for document in parse_documents(f_in, sentences=False):
+        yield document.doc_id, document_metadata(document.header)
+
+
+BASE_URI = "https://github.com/txellgb/sdllod19/datasets/oup/conll-rdf/"
+PREFIXES = (
+    ("rdau", "http://rdaregistry.info/Elements/u/"),
+    ("dc", "http://purl.org/dc/elements/1.1/"),
+    ("dcat", "http://www.w3.org/ns/dcat#"),
+    ("dcterms", "http://purl.org/dc/terms/"),
+    ("nif", "http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#"),
+    ("", BASE_URI),
+)
+_NAMESPACES = dict(PREFIXES)
+_LOCAL_NAME = re.compile(r'^[A-Za-z0-9_][\w-]*$')
+
+
+def write_document_header(f_conll):
+    f_conll.write("".join("@prefix %s: <%s> .\n" % prefix for prefix in PREFIXES))
+
+
+def _subject(doc_id):
+    """ doc ids are written as prefixed names when they are valid local names, as full uris otherwise """
+    if _LOCAL_NAME.match(doc_id):
+        return ":" + doc_id
+    return "<" + BASE_URI + quote(doc_id, safe="") + ">"
+
+
+def write_document_triples(doc_id, metadata, f_out):
+    """ writes the triples of a document in Turtle, as a single subject with a predicate list """
+    subject = _subject(doc_id)
+    predicates = ["a :Document"]
+    predicates.extend(key + " " + turtle_literal(value, xml_escape=False) for key, value in metadata.items())
+    predicates.append("nif:nextSentence " + subject[:-1] + "#s1_0>" if subject.startswith("<")
+                      else "nif:nextSentence " + subject + "\\#s1_0")
+    f_out.write("\n" + subject + " " + " ;\n    ".join(predicates) + " .\n")
+
+
+def _uri(name):
+    prefix, _, local = name.partition(":")
+    return "<" + _NAMESPACES[prefix] + local + ">"
+
+
+def document_uri(doc_id):
+    """ the full uri of a document, between angle brackets """
+    return "<" + BASE_URI + quote(doc_id, safe="") + ">"
+
+
+def document_statements(doc_id, metadata):
+    """ the triples of a document as N-Triples statements without the final " .": subject, predicate and
+    object with full uris. N-Quads lines are made by adding the graph """
+    subject = document_uri(doc_id)
+    statements = [subject + " <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <" + BASE_URI + "Document>"]
+    statements.extend(subject + " " + _uri(key) + " " + turtle_literal(value, xml_escape=False)
+                      for key, value in metadata.items())
+    statements.append(subject + " " + _uri("nif:nextSentence") + " " + subject[:-1] + "#s1_0>")
+    return statements
+
+
+def link_statement(doc_id, canonical_id):
+    """ the triple saying that a document is a version of another one, as in document_statements """
+    return document_uri(doc_id) + " " + _uri("dcterms:isVersionOf") + " " + document_uri(canonical_id)
+
+
+def write_document_ntriples(doc_id, metadata, f_out):
+    """ writes the triples of a document in N-Triples, one triple per line with full uris """
+    f_out.write("".join(statement + " .\n" for statement in document_statements(doc_id, metadata)))
+
+
+class IdSet(object):
+    """ set of doc ids stored as 64 bit hashes in an open addressing table (array of unsigned 64 bit
+    integers), 16 to 32 bytes per id instead of about 100 for a set of strings. Two different ids are
+    taken as the same one only if their 64 bit blake2b hashes collide, which has a probability of about
+    3e-6 for ten million ids """
+
+    def __init__(self, capacity=1 << 16):
+        self.table = array("Q", bytes(8 * capacity))
+        self.mask = capacity - 1
+        self.size = 0
+
+    def add(self, doc_id):
+        """ adds an id and returns False if it was already in the set """
+        key = int.from_bytes(blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little") or 1
+        table, mask = self.table, self.mask
+        i = key & mask
+        while table[i]:
+            if table[i] == key:
+                return False
+            i = (i + 1) & mask
+        table[i] = key
+        self.size += 1
+        if self.size * 2 > len(table):
+            self._grow()
+        return True
+
+    def _grow(self):
+        old = self.table
+        self.table = array("Q", bytes(16 * len(old)))
+        self.mask = len(self.table) - 1
+        for key in old:
+            if key:
+                i = key & self.mask
+                while self.table[i]:
+                    i = (i + 1) & self.mask
+                self.table[i] = key
+
+
+class MetadataWriter(object):
+    """ writes the metadata of any number of input files to a single graph, in Turtle or N-Triples,
+    optionally compressed with gzip. A document whose primary_doc_id was already written is skipped:
+    the first one wins. With append the triples are added to the end of an existing file, whose prefixes
+    are not written again """
+
+    def __init__(self, filename, rdf_format="turtle", compress=False, append=False):
+        self.filename = filename
+        appending = append and isfile(filename) and getsize(filename) > 0
+        if compress:
+            self.f_out = gzip.open(filename, mode="at" if append else "wt", encoding="utf-8", compresslevel=6)
+        else:
+            self.f_out = io.open(filename, mode="a" if append else "w", encoding="utf-8", buffering=1 << 20)
+        self.write_triples = write_document_ntriples if rdf_format == "ntriples" else write_document_triples
+        if rdf_format != "ntriples" and not appending:
+            write_document_header(self.f_out)
+        self.seen = IdSet()
+        self.duplicates = 0
+
+    def write(self, doc_id, metadata):
+        """ writes the triples of a document and returns False if it is a duplicate """
+        if not self.seen.add(doc_id):
+            self.duplicates += 1
+            return False
+        self.write_triples(doc_id, metadata, self.f_out)
+        return True
+
+    def write_link(self, doc_id, canonical_id):
+        """ writes that a document is a version of another one, e.g. a near duplicate of it """
+        if self.write_triples is write_document_ntriples:
+            self.f_out.write(link_statement(doc_id, canonical_id) + " .\n")
+        else:
+            self.f_out.write(_subject(doc_id) + " dcterms:isVersionOf " + _subject(canonical_id) + " .\n")
+
+    def flush(self):
+        self.f_out.flush()
+
+    def close(self):
+        self.f_out.close()
+
+
+def output_filename(out_dir, rdf_format="turtle", compress=False):
+    return join(out_dir, "metadata" + (".nt" if rdf_format == "ntriples" else ".ttl") + (".gz" if compress else ""))
+
+
+def main(argv=None):
+    """ if the input parameter is a folder, reads all the files in the folder and writes the metadata of
+    every document found in the vertical files to a single graph """
+    parser = argparse.ArgumentParser(description='Reads input file in vertical format and outputs the metadata of the documents as rdf')
+    parser.add_argument("--input", help="input filename")
+    parser.add_argument("--out_dir", help="output folder")
+    parser.add_argument("--format", choices=["turtle", "ntriples"], default="turtle", help="rdf syntax of the output")
+    parser.add_argument("--gzip", action="store_true", help="compress the output with gzip")
+    compressed_input.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not args.quiet:
+        print('Reading from:', args.input)
+        print('Writing to:', args.out_dir)
+    makedirs(args.out_dir, exist_ok=True)
+
+    instrumentation.start(args)
+    # open output file, one graph for all the input files
+    writer = MetadataWriter(output_filename(args.out_dir, args.format, args.gzip), args.format, args.gzip)
+    for d, f in input_files(args.input):
+        if not args.quiet:
+            print('Reading :', join(d, f))
+        run(write_metadata(read_documents(join(d, f), args.decompress_threads, sentences=False), writer))
+    # close all files
+    writer.close()
+    stats.counts["bytes_written"] += getsize(writer.filename)
+    if not args.quiet:
+        print("Wrote", writer.seen.size, "documents to", writer.filename, "-", writer.duplicates, "duplicates skipped")
+    instrumentation.finish(args)
+
+
+if __name__ == '__main__':
+    main()
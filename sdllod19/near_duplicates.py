@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Finds the near duplicate documents of vertical files (the same wire story published by several sources)
+so that they are not converted, stored and loaded again, with MinHash signatures and an LSH index that
+is kept from one run to the next.
+
+* every document is a set of shingles, the sequences of --shingle consecutive tokens (lowercased).
+* its MinHash signature is the minimum of num_perm hash functions over the hashes of its shingles: the
+  fraction of equal values of two signatures estimates the Jaccard similarity of the two documents.
+  The signatures are computed with numpy when it is installed (in pure python otherwise, much slower).
+* the signatures are split in bands of rows values, chosen from the threshold so that two documents
+  with a similarity above it share at least one band with a high probability. The documents sharing a
+  band with a new document are its candidates, and the first one whose estimated similarity is at least
+  the threshold is its canonical document. Documents that are not duplicates are added to the index.
+* a document with the primary_doc_id of a document of the index (the same document read again) is not a
+  duplicate, and it is not added again.
+
+The index is a folder:
+* params.json: the number of hash functions, the shingle size and the seed of the hash functions, which
+  must not change once documents have been added.
+* signatures.u32: the signatures of the documents, num_perm uint32 each, and documents.jsonl their
+  primary_doc_id, one json string per line in the same order. Both are appended to; the bands are built
+  again from the signatures when the index is opened (sorted numpy arrays, or dictionaries without numpy).
+* duplicates.jsonl: one line per duplicate found: source, doc_id, canonical doc_id and similarity.
+
+DuplicateFilter is put between pipeline.read_events and the writers (see vertical2all.py --dedup_index):
+it keeps the sentences of a document until its end, and passes them on unless it is a duplicate.
+
+How to run it:
+python -m sdllod19.near_duplicates --input <input folder|input file> --index <folder> [--threshold T] [--num_perm N]
+                                   [--shingle N] [--dry_run]
+    prints the duplicates of the input files and adds the other documents to the index (unless --dry_run).
+"""
+
+import io
+import json
+import time
+import zlib
+import random
+import argparse
+from array import array
+from os import makedirs
+from os.path import isfile, isdir, join
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .compressed_input import open_vertical, detect_compression, source_name
+from .pipeline import input_files, read_events, DOCUMENT_START, SENTENCE, DOCUMENT_END, DOCUMENT_ABORT
+
+INDEX_VERSION = 1
+NUM_PERM = 128
+SHINGLE = 5
+THRESHOLD = 0.8
+SEED = 1
+MERSENNE_PRIME = (1 << 61) - 1
+_MASK32 = (1 << 32) - 1
+_MASK64 = (1 << 64) - 1
+_U32 = "I" if array("I").itemsize == 4 else "L"
+
+
+def shingle_hashes(tokens, shingle=SHINGLE):
+    """ the distinct crc32 hashes of the shingles of a list of tokens. A document shorter than a shingle
+    is a single shingle """
+    n = max(len(tokens) - shingle + 1, 1)
+    return set(zlib.crc32(" ".join(tokens[i:i + shingle]).encode("utf-8")) for i in range(n))
+
+
+def lsh_parameters(threshold, num_perm):
+    """ returns the (bands, rows) with bands * rows <= num_perm that minimize the sum of the probabilities
+    of a false positive (a pair below the threshold sharing a band) and of a false negative """
+    def integrate(f, a, b, steps=100):
+        width = (b - a) / steps
+        return sum(f(a + (i + 0.5) * width) for i in range(steps)) * width
+
+    best = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive = integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+            false_negative = integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+            error = false_positive + false_negative
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHash(object):
+    """ the num_perm hash functions (a * x + b) mod 2^61-1, truncated to 32 bits, of a seed """
+
+    def __init__(self, num_perm=NUM_PERM, seed=SEED):
+        generator = random.Random(seed)
+        # a and b below 2^32: a * x + b stays below 2^64 for 32 bit shingle hashes
+        self.a = [generator.randrange(1, 1 << 32) for _ in range(num_perm)]
+        self.b = [generator.randrange(0, 1 << 32) for _ in range(num_perm)]
+        self.num_perm = num_perm
+        if numpy is not None:
+            self.np_a = numpy.array(self.a, dtype=numpy.uint64)
+            self.np_b = numpy.array(self.b, dtype=numpy.uint64)
+
+    def signature(self, hashes):
+        """ returns the signature of a set of shingle hashes as the bytes of num_perm uint32 """
+        if numpy is not None:
+            values = numpy.fromiter(hashes, dtype=numpy.uint64, count=len(hashes))
+            permuted = (values[:, None] * self.np_a + self.np_b) % MERSENNE_PRIME & _MASK32
+            return permuted.min(axis=0).astype(numpy.uint32).tobytes()
+        return array(_U32, [min(((h * a + b) % MERSENNE_PRIME) & _MASK32 for h in hashes)
+                            for a, b in zip(self.a, self.b)]).tobytes()
+
+
+class _Bands(object):
+    """ the LSH bands of the signatures of an index: for every band, the key of the band of every document.
+    The documents of the index when it is opened are in sorted numpy arrays, the documents added after
+    in dictionaries key -> document number (or list of numbers) """
+
+    def __init__(self, bands, rows, seed=SEED):
+        generator = random.Random(seed)
+        self.bands = bands
+        self.rows = rows
+        self.multipliers = [generator.randrange(1, 1 << 64) | 1 for _ in range(rows)]
+        self.sorted_keys = self.sorted_ids = None
+        self.recent = [{} for _ in range(bands)]
+
+    def keys(self, signature):
+        """ the key of every band of a signature (bytes of uint32) """
+        values = array(_U32, signature)
+        rows, multipliers = self.rows, self.multipliers
+        return [sum(values[band * rows + i] * multipliers[i] for i in range(rows)) & _MASK64
+                for band in range(self.bands)]
+
+    def build(self, signatures, n_documents, num_perm):
+        """ adds the documents of the index to the bands, from the bytes of all their signatures """
+        if numpy is None:
+            for i in range(n_documents):
+                self.add(self.keys(signatures[i * 4 * num_perm:(i + 1) * 4 * num_perm]), i)
+            return
+        matrix = numpy.frombuffer(signatures, dtype=numpy.uint32, count=n_documents * num_perm).reshape(n_documents, num_perm)
+        multipliers = numpy.array(self.multipliers, dtype=numpy.uint64)
+        used = matrix[:, :self.bands * self.rows].reshape(n_documents, self.bands, self.rows).astype(numpy.uint64)
+        # the products and the sum wrap around at 2^64, as the & _MASK64 of keys()
+        keys = (used * multipliers).sum(axis=2, dtype=numpy.uint64).T
+        self.sorted_ids = numpy.argsort(keys, axis=1, kind="stable").astype(numpy.uint32)
+        self.sorted_keys = numpy.take_along_axis(keys, self.sorted_ids.astype(numpy.int64), axis=1)
+
+    def candidates(self, keys):
+        """ the document numbers that have at least one band with the same key, in increasing order """
+        found = set()
+        for band, key in enumerate(keys):
+            if self.sorted_keys is not None:
+                band_keys = self.sorted_keys[band]
+                start = band_keys.searchsorted(numpy.uint64(key), "left")
+                end = band_keys.searchsorted(numpy.uint64(key), "right")
+                found.update(self.sorted_ids[band][start:end].tolist())
+            value = self.recent[band].get(key)
+            if value is not None:
+                found.update(value if isinstance(value, list) else (value,))
+        return sorted(found)
+
+    def add(self, keys, i):
+        for band, key in enumerate(keys):
+            recent = self.recent[band]
+            value = recent.get(key)
+            if value is None:
+                recent[key] = i
+            elif isinstance(value, list):
+                value.append(i)
+            else:
+                recent[key] = [value, i]
+
+
+class NearDuplicateIndex(object):
+    """ persistent LSH index of the MinHash signatures of documents. Without a path it is kept in memory,
+    with read_only the documents added are not written to the index folder """
+
+    def __init__(self, path=None, threshold=THRESHOLD, num_perm=NUM_PERM, shingle=SHINGLE, seed=SEED, read_only=False):
+        self.path = path
+        self.threshold = threshold
+        self.read_only = read_only
+        params = {"version": INDEX_VERSION, "num_perm": num_perm, "shingle": shingle, "seed": seed}
+        self.signatures = bytearray()
+        self.doc_ids = []
+        if path is not None and isfile(join(path, "params.json")):
+            with io.open(join(path, "params.json"), mode="r", encoding="utf-8") as f_in:
+                params = json.load(f_in)
+            if params["version"] != INDEX_VERSION:
+                raise ValueError("%s: index version %s, expected %s" % (path, params["version"], INDEX_VERSION))
+        elif path is not None and not read_only:
+            makedirs(path, exist_ok=True)
+            with io.open(join(path, "params.json"), mode="w", encoding="utf-8") as f_out:
+                json.dump(params, f_out, indent=2)
+        self.num_perm, self.shingle, self.seed = params["num_perm"], params["shingle"], params["seed"]
+        self.minhash = MinHash(self.num_perm, self.seed)
+        if path is not None and isdir(path):
+            self._load()
+        self.positions = dict((doc_id, i) for i, doc_id in enumerate(self.doc_ids))
+        bands, rows = lsh_parameters(threshold, self.num_perm)
+        self.bands = _Bands(bands, rows, self.seed)
+        self.bands.build(self.signatures, len(self.doc_ids), self.num_perm)
+        self.duplicates = 0
+        self.f_signatures = self.f_doc_ids = self.f_duplicates = None
+        if path is not None and not read_only:
+            self.f_signatures = io.open(join(path, "signatures.u32"), mode="ab")
+            self.f_doc_ids = io.open(join(path, "documents.jsonl"), mode="a", encoding="utf-8")
+            self.f_duplicates = io.open(join(path, "duplicates.jsonl"), mode="a", encoding="utf-8")
+
+    def _load(self):
+        """ reads the documents of the index. A run that was killed can leave one file longer than the
+        other: both are cut to the documents found in both """
+        size = 4 * self.num_perm
+        signatures_file, doc_ids_file = join(self.path, "signatures.u32"), join(self.path, "documents.jsonl")
+        if isfile(signatures_file):
+            with io.open(signatures_file, mode="rb") as f_in:
+                self.signatures = bytearray(f_in.read())
+        if isfile(doc_ids_file):
+            with io.open(doc_ids_file, mode="r", encoding="utf-8") as f_in:
+                for line in f_in:
+                    try:
+                        self.doc_ids.append(json.loads(line))
+                    except ValueError:
+                        break
+        n_documents = min(len(self.signatures) // size, len(self.doc_ids))
+        if self.read_only:
+            del self.signatures[n_documents * size:]
+            del self.doc_ids[n_documents:]
+            return
+        if len(self.signatures) != n_documents * size:
+            del self.signatures[n_documents * size:]
+            with io.open(signatures_file, mode="r+b") as f_out:
+                f_out.truncate(n_documents * size)
+        if len(self.doc_ids) != n_documents:
+            del self.doc_ids[n_documents:]
+            with io.open(doc_ids_file, mode="w", encoding="utf-8") as f_out:
+                f_out.writelines(json.dumps(doc_id) + "\n" for doc_id in self.doc_ids)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def signature(self, tokens):
+        return self.minhash.signature(shingle_hashes(tokens, self.shingle))
+
+    def similarity(self, signature, i):
+        """ estimated Jaccard similarity of a signature and of the signature of the i-th document """
+        size = 4 * self.num_perm
+        other = bytes(self.signatures[i * size:(i + 1) * size])
+        if numpy is not None:
+            return int(numpy.count_nonzero(numpy.frombuffer(signature, dtype=numpy.uint32) ==
+                                           numpy.frombuffer(other, dtype=numpy.uint32))) / self.num_perm
+        return sum(x == y for x, y in zip(array(_U32, signature), array(_U32, other))) / self.num_perm
+
+    def check(self, doc_id, tokens, source=""):
+        """ returns (canonical doc_id, similarity) when a document is a near duplicate of a document of the
+        index, otherwise adds it to the index and returns None """
+        if not tokens or doc_id in self.positions:
+            return None
+        signature = self.signature(tokens)
+        keys = self.bands.keys(signature)
+        for i in self.bands.candidates(keys):
+            similarity = self.similarity(signature, i)
+            if similarity >= self.threshold:
+                self.duplicates += 1
+                if self.f_duplicates is not None:
+                    self.f_duplicates.write(json.dumps({"source": source, "doc_id": doc_id, "canonical": self.doc_ids[i],
+                                                        "similarity": similarity}, sort_keys=True) + "\n")
+                return self.doc_ids[i], similarity
+        self.add(doc_id, signature, keys)
+        return None
+
+    def add(self, doc_id, signature, keys=None):
+        i = len(self.doc_ids)
+        self.signatures.extend(signature)
+        self.doc_ids.append(doc_id)
+        self.positions[doc_id] = i
+        self.bands.add(keys if keys is not None else self.bands.keys(signature), i)
+        if self.f_signatures is not None:
+            self.f_signatures.write(signature)
+            self.f_doc_ids.write(json.dumps(doc_id) + "\n")
+
+    def flush(self):
+        for f_out in (self.f_signatures, self.f_doc_ids, self.f_duplicates):
+            if f_out is not None:
+                f_out.flush()
+
+    def close(self):
+        for f_out in (self.f_signatures, self.f_doc_ids, self.f_duplicates):
+            if f_out is not None:
+                f_out.close()
+        self.f_signatures = self.f_doc_ids = self.f_duplicates = None
+
+
+class DuplicateFilter(object):
+    """ filters the events of pipeline.read_events: the events of the near duplicate documents are removed,
+    the others are passed on unchanged. on_duplicate(source, doc_id, header_line, header, canonical_id,
+    similarity) is called for every duplicate """
+
+    def __init__(self, index, on_duplicate=None):
+        self.index = index
+        self.on_duplicate = on_duplicate
+
+    def filter(self, events):
+        held = []
+        for event in events:
+            kind, document, _, rows = event
+            if kind == DOCUMENT_START:
+                held = [event]
+            elif kind == SENTENCE:
+                held.append(event)
+            elif kind == DOCUMENT_ABORT:
+                # a document without </doc> is never written, its events are dropped
+                held = []
+            else:
+                tokens = [row[0].lower() for _, _, _, sentence_rows in held[1:] for row in sentence_rows]
+                duplicate = self.index.check(document.doc_id, tokens, document.source)
+                if duplicate is None:
+                    yield from held
+                    yield event
+                elif self.on_duplicate is not None:
+                    self.on_duplicate(document.source, document.doc_id, document.header_line, document.header,
+                                      duplicate[0], duplicate[1])
+                held = []
+
+
+def add_arguments(parser):
+    """ adds --dedup_index, --dedup_threshold and --dedup_mode to an argparse parser """
+    parser.add_argument("--dedup_index", help="folder of the near duplicate index, enables the detection of near duplicates")
+    parser.add_argument("--dedup_threshold", type=float, default=THRESHOLD, help="estimated Jaccard similarity of a near duplicate")
+    parser.add_argument("--dedup_mode", choices=["skip", "link"], default="skip",
+                        help="skip the near duplicates, or only write their metadata with a link to the canonical document")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Finds the near duplicate documents of vertical files')
+    parser.add_argument("--input", required=True, help="input filename or folder")
+    parser.add_argument("--index", required=True, help="index folder, created if needed")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="estimated Jaccard similarity of a near duplicate")
+    parser.add_argument("--num_perm", type=int, default=NUM_PERM, help="hash functions of a new index")
+    parser.add_argument("--shingle", type=int, default=SHINGLE, help="tokens per shingle of a new index")
+    parser.add_argument("--dry_run", action="store_true", help="do not add the documents to the index")
+    args = parser.parse_args()
+
+    filenames_list = input_files(args.input)
+
+    started = time.perf_counter()
+    index = NearDuplicateIndex(args.index, args.threshold, args.num_perm, args.shingle, read_only=args.dry_run)
+    print("Index:", len(index), "documents, loaded in %.2f s" % (time.perf_counter() - started))
+
+    n_documents = 0
+
+    def report(source, doc_id, header_line, header, canonical_id, similarity):
+        print("%s\t%s\t%.2f" % (doc_id, canonical_id, similarity))
+
+    duplicates = DuplicateFilter(index, report)
+    started = time.perf_counter()
+    for d, f in filenames_list:
+        f_input = open_vertical(join(d, f))
+        for kind, _, _, _ in duplicates.filter(read_events(f_input, source_name(f, detect_compression(join(d, f))))):
+            if kind == DOCUMENT_END:
+                n_documents += 1
+        f_input.close()
+    index.close()
+    print("Read %d documents in %.2f s: %d near duplicates" % (n_documents + index.duplicates, time.perf_counter() - started,
+                                                               index.duplicates))
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Writes the CoNLL-RDF triples and the metadata of the documents as gzip compressed N-Quads shards, ready
+for the offline bulk loaders of the triple stores (e.g. tdb2.tdbloader / tdb2.xloader of Jena, the bulk
+loader of Virtuoso or of GraphDB), instead of a .ttl file per document and a metadata.ttl file
+(vertical2all.py --nquads_dir).
+
+* the CoNLL-RDF triples of a document (the same triples as conllrdf.py, with the OLiA annotations when an
+  index is given) are in its own named graph, the uri of the document: <BASE_URI><primary_doc_id>.
+* the metadata triples of all the documents (the same triples as metadata2rdf.py, with the
+  dcterms:isVersionOf links of --dedup_mode link) are in the graph <BASE_URI>metadata.
+* N-Quads has no prefixes and no comments: every line is a complete quad that is parsed on its own, so
+  the shards can be loaded in parallel, and split or concatenated between two lines.
+* the quads of the documents are written to documents.00000.nq.gz, documents.00001.nq.gz ... and the
+  metadata quads to metadata.00000.nq.gz ... A shard is written once it has at least --shard_quads quads
+  (the quads of a document are never split between two shards), to a temporary file renamed once it is
+  complete, so a loader never sees a partial shard. The lines of a shard are sorted (by subject,
+  predicate and object, as bytes): the loaders build their indexes faster from sorted input, and the
+  quads of a graph are consecutive because all the subjects of a document start with its uri.
+* graphs.tsv lists the graph of every document with the shard it is in, and drop_graphs.ru is a SPARQL
+  update that removes the documents of the export from a store: it drops their graphs and deletes their
+  triples from the metadata graph. Regenerating some documents (e.g. exporting a vertical file with only
+  the corrected documents) and running the drop_graphs.ru of the new export before loading its shards
+  replaces only the graphs of those documents.
+A document whose primary_doc_id has already been exported in the same run is skipped: the first one
+wins, as in metadata2rdf.py. An export removes the shards of a previous export in the same folder; with
+--follow they are kept, and every part of the followed file read is written to new shards.
+
+How to run it:
+python -m sdllod19.nquads_export --check <folder>
+checks the shards of an export before they are loaded: every line is a quad, the lines of every shard are
+sorted and the quads of a document graph are all in the same shard. It prints the number of quads and
+graphs of every shard.
+"""
+
+import io
+import os
+import re
+import sys
+import gzip
+from os import listdir
+from os.path import join, isfile
+import argparse
+
+from .conllrdf import COLUMNS, EMPTY_VALUES, turtle_literal
+from .metadata2rdf import (BASE_URI, IdSet, document_metadata, document_uri, document_statements,
+                          link_statement)
+
+# number of quads of a shard, about 100 MB of N-Quads and 5 to 10 MB compressed
+SHARD_QUADS = 1000000
+COMPRESS_LEVEL = 6
+METADATA_GRAPH = "<" + BASE_URI + "metadata>"
+GRAPHS_FILE = "graphs.tsv"
+DROP_FILE = "drop_graphs.ru"
+
+RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+NIF = "http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#"
+CONLL = "http://ufal.mff.cuni.cz/conll2009-st/task-description.html#"
+_PREDICATES = dict((column, "<" + CONLL + column + ">") for column in COLUMNS + ("HEAD",))
+_SENTENCE = RDF_TYPE + " <" + NIF + "Sentence>"
+_WORD = RDF_TYPE + " <" + NIF + "Word>"
+_NEXT_SENTENCE = "<" + NIF + "nextSentence>"
+_NEXT_WORD = "<" + NIF + "nextWord>"
+_SHARD = re.compile(r'^(documents|metadata)\.(\d{5,})\.nq\.gz$')
+
+
+def shard_name(name, number):
+    return "%s.%05d.nq.gz" % (name, number)
+
+
+def shard_files(out_dir, name=None):
+    """ the sorted filenames of the shards of an export, of one kind (documents or metadata) or of both """
+    matches = (_SHARD.match(f) for f in listdir(out_dir))
+    return sorted(m.group(0) for m in matches if m and (name is None or m.group(1) == name))
+
+
+class ConllRdfQuads(object):
+    """ returns the CoNLL-RDF triples of a document, one sentence at a time, as N-Quads lines in the graph
+    of the document. The triples and their conventions are the ones of conllrdf.ConllRdfWriter, except the
+    comments, which N-Quads cannot keep. olia_cache keeps the statements of the OLiA annotations of the
+    tags already seen and can be shared by several documents """
+
+    def __init__(self, doc_id, xml_escape=True, olia=None, olia_cache=None):
+        self.graph = document_uri(doc_id)
+        # the doc id is percent encoded in the uri, the nodes are not formatted with %
+        self.node = self.graph[:-1] + "#s"
+        self.xml_escape = xml_escape
+        self.olia = olia
+        self.olia_cache = {} if olia_cache is None else olia_cache
+        self.sentence_idx = 0
+
+    def olia_statements(self, tag):
+        """ the predicates and objects of the OLiA annotations of a tag: its classes as rdf:type and its relations """
+        statements = self.olia_cache.get(tag)
+        if statements is None:
+            types, relations = self.olia.lookup(tag)
+            statements = self.olia_cache[tag] = (
+                [RDF_TYPE + " <" + c + ">" for c in types] +
+                ["<%s> %s" % (p, turtle_literal(o[1:], self.xml_escape) if o.startswith('"') else "<" + o + ">")
+                 for p, o in relations])
+        return statements
+
+    def sentence_quads(self, lines):
+        """ converts the lines of a sentence of the vertical file and returns its quads """
+        words = []
+        for line in lines:
+            line = line.rstrip("\r\n")
+            comment = line.find("#")
+            if comment >= 0:
+                line = line[:comment]
+            if line.strip():
+                words.append(line.split("\t"))
+
+        self.sentence_idx += 1
+        s_idx = self.sentence_idx
+        end = " " + self.graph + " .\n"
+        sentence = self.node + "%d_0>" % s_idx
+        quads = [sentence + " " + _SENTENCE + end]
+        if s_idx > 1:
+            quads.append(self.node + "%d_0> " % (s_idx - 1) + _NEXT_SENTENCE + " " + sentence + end)
+        for w_idx, values in enumerate(words, 1):
+            word = self.node + "%d_%d>" % (s_idx, w_idx)
+            statements = [_WORD]
+            for column, value in zip(COLUMNS, values):
+                if value and value not in EMPTY_VALUES:
+                    statements.append(_PREDICATES[column] + " " + turtle_literal(value, self.xml_escape))
+            statements.append(_PREDICATES["HEAD"] + " " + sentence)
+            if w_idx < len(words):
+                statements.append(_NEXT_WORD + " " + self.node + "%d_%d>" % (s_idx, w_idx + 1))
+            if self.olia is not None and len(values) > 3 and values[3] and values[3] not in EMPTY_VALUES:
+                statements.extend(self.olia_statements(values[3]))
+            quads.extend(word + " " + statement + end for statement in statements)
+        return quads
+
+
+class ShardWriter(object):
+    """ writes quads to the sorted and compressed shards <name>.00000.nq.gz, <name>.00001.nq.gz ... of about
+    shard_quads quads. With append the numbering continues after the shards already in the folder,
+    otherwise they are removed """
+
+    def __init__(self, out_dir, name, shard_quads=SHARD_QUADS, append=False):
+        self.out_dir = out_dir
+        self.name = name
+        self.shard_quads = shard_quads
+        existing = shard_files(out_dir, name)
+        if not append:
+            for f in existing:
+                os.remove(join(out_dir, f))
+        self.number = max(int(_SHARD.match(f).group(2)) + 1 for f in existing) if append and existing else 0
+        self.quads = []
+
+    def current(self):
+        """ the filename of the shard the next quads are written to """
+        return shard_name(self.name, self.number)
+
+    def add(self, quads):
+        """ adds the quads of a document, and writes the shard once it is full """
+        self.quads.extend(quads)
+        if len(self.quads) >= self.shard_quads:
+            self.flush()
+
+    def flush(self):
+        """ writes the quads added since the last shard to a new shard """
+        if not self.quads:
+            return
+        self.quads.sort()
+        filename = join(self.out_dir, self.current())
+        with gzip.open(filename + ".tmp", mode="wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL) as f_out:
+            f_out.writelines(self.quads)
+        os.replace(filename + ".tmp", filename)
+        self.number += 1
+        self.quads = []
+
+    def close(self):
+        self.flush()
+
+
+class NQuadsSink(object):
+    """ vertical2all.py sink that writes the CoNLL-RDF triples and the metadata of the documents as N-Quads
+    shards, with a named graph per document. With append (--follow) the shards, graphs.tsv and
+    drop_graphs.ru of the previous run are kept and added to """
+    reads_sentences = True
+
+    def __init__(self, out_dir, shard_quads=SHARD_QUADS, xml_escape=True, olia=None, append=False):
+        self.documents = ShardWriter(out_dir, "documents", shard_quads, append)
+        self.metadata = ShardWriter(out_dir, "metadata", shard_quads, append)
+        mode = "a" if append else "w"
+        self.f_graphs = io.open(join(out_dir, GRAPHS_FILE), mode=mode, encoding="utf-8")
+        self.f_drop = io.open(join(out_dir, DROP_FILE), mode=mode, encoding="utf-8")
+        self.xml_escape = xml_escape
+        self.olia = olia
+        self.olia_cache = {}
+        self.seen = IdSet()
+        self.duplicates = 0
+        self.doc_id = self.header = self.converter = None
+        self.quads = []
+
+    def start_document(self, source, doc_id, header_line, header):
+        self.doc_id = doc_id
+        self.header = header
+        self.converter = ConllRdfQuads(doc_id, self.xml_escape, self.olia, self.olia_cache)
+        self.quads = []
+
+    def write_sentence(self, lines, rows):
+        self.quads.extend(self.converter.sentence_quads(lines))
+
+    def write_metadata(self, doc_id, statements):
+        """ writes the metadata statements of a document, and how to remove the document to drop_graphs.ru """
+        self.metadata.add(statement + " " + METADATA_GRAPH + " .\n" for statement in statements)
+        self.f_drop.write("DROP SILENT GRAPH %s ;\nDELETE WHERE { GRAPH %s { %s ?p ?o } } ;\n"
+                          % (document_uri(doc_id), METADATA_GRAPH, document_uri(doc_id)))
+
+    def end_document(self):
+        if self.seen.add(self.doc_id):
+            self.f_graphs.write(self.converter.graph + "\t" + self.documents.current() + "\n")
+            self.documents.add(self.quads)
+            self.write_metadata(self.doc_id, document_statements(self.doc_id, document_metadata(self.header)))
+        else:
+            self.duplicates += 1
+        self.abort_document()
+
+    def link_document(self, source, doc_id, header_line, header, canonical_id):
+        if self.seen.add(doc_id):
+            self.write_metadata(doc_id, document_statements(doc_id, document_metadata(header)) +
+                                [link_statement(doc_id, canonical_id)])
+
+    def abort_document(self):
+        self.doc_id = self.header = self.converter = None
+        self.quads = []
+
+    def flush(self):
+        self.documents.flush()
+        self.metadata.flush()
+        self.f_graphs.flush()
+        self.f_drop.flush()
+
+    def close(self):
+        self.flush()
+        self.f_graphs.close()
+        self.f_drop.close()
+
+
+def quad_graph(line):
+    """ the graph of an N-Quads line written by an export, None if the line is not a quad with a graph """
+    if not line.endswith("> .\n"):
+        return None
+    graph = line[:-3].rsplit(" ", 1)[-1]
+    return graph if graph.startswith("<") else None
+
+
+def check_export(out_dir):
+    """ checks the shards of an export and prints their numbers of quads and graphs. It returns the number
+    of errors found """
+    errors = 0
+    graph_shards = {}
+    for f in shard_files(out_dir):
+        quads = 0
+        graphs = set()
+        previous = ""
+        with gzip.open(join(out_dir, f), mode="rt", encoding="utf-8") as f_in:
+            for line in f_in:
+                graph = quad_graph(line)
+                if graph is None:
+                    print("Error in the following file: ", f, "line", quads + 1, "is not a quad:", line.rstrip("\n"))
+                    errors += 1
+                elif line < previous:
+                    print("Error in the following file: ", f, "line", quads + 1, "is not sorted")
+                    errors += 1
+                graphs.add(graph)
+                previous = line
+                quads += 1
+        for graph in graphs:
+            if graph != METADATA_GRAPH:
+                if graph in graph_shards:
+                    print("Error in the following file: ", f, "graph", graph, "is also in", graph_shards[graph])
+                    errors += 1
+                graph_shards[graph] = f
+        print("%-24s %10d quads %8d graphs" % (f, quads, len(graphs)))
+    if isfile(join(out_dir, GRAPHS_FILE)):
+        with io.open(join(out_dir, GRAPHS_FILE), mode="r", encoding="utf-8") as f_in:
+            for line in f_in:
+                graph, f = line.rstrip("\n").split("\t")
+                if graph_shards.get(graph) != f:
+                    print("Error in the following file: ", GRAPHS_FILE, "graph", graph, "is not in", f)
+                    errors += 1
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks the N-Quads shards of an export before they are bulk loaded')
+    parser.add_argument("--check", required=True, help="folder of the export")
+    args = parser.parse_args()
+
+    errors = check_export(args.check)
+    print(errors, "errors")
+    sys.exit(1 if errors else 0)
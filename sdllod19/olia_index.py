@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local index of an OLiA annotation model and its linking model (e.g. penn.owl and penn-link.rdf), used to
+add OLiA concepts to the tokens while they are converted, instead of loading the models into Fuseki and
+running the INSERT query of "project notes.txt" over the CoNLL-RDF data.
+
+The index is built once from the local RDF/XML files and saved as a json file. For every tag it holds
+what the INSERT query adds to a token whose conll:POS is that tag:
+* types: the classes reached from the individual that has the tag through
+  rdf:type/(owl:equivalentClass|rdfs:subClassOf|((owl:unionOf|owl:intersectionOf)/rdf:first))*
+  (the heuristic disambiguation of the query: only the first member of a union is taken), restricted
+  to the OLiA namespaces.
+* relations: the OLiA properties of that individual, with their values, the classes of their values
+  and their OLiA super properties.
+Individuals are found through olia_system:hasTag, and the pattern properties hasTagStartingWith,
+hasTagEndingWith, hasTagContaining and hasTagMatching are kept as rules that are applied to the tags
+when they are looked up.
+
+How to run it:
+python -m sdllod19.olia_index --models penn.owl penn-link.rdf --out penn.olia.json
+
+The index is rebuilt by load_index when the models have changed since it was saved.
+"""
+
+import io
+import re
+import itertools
+import json
+import argparse
+from os.path import getmtime, getsize, isfile, abspath
+import xml.etree.ElementTree as ET
+
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+RDFS = "http://www.w3.org/2000/01/rdf-schema#"
+OWL = "http://www.w3.org/2002/07/owl#"
+XML = "http://www.w3.org/XML/1998/namespace"
+OLIA = "http://purl.org/olia/"
+OLIA_OWL = "http://purl.org/olia/olia.owl"
+OLIA_SYSTEM = "http://purl.org/olia/system.owl#"
+
+TAG_PROPERTIES = {
+    OLIA_SYSTEM + "hasTag": "equals",
+    OLIA_SYSTEM + "hasTagStartingWith": "startswith",
+    OLIA_SYSTEM + "hasTagEndingWith": "endswith",
+    OLIA_SYSTEM + "hasTagContaining": "contains",
+    OLIA_SYSTEM + "hasTagMatching": "matches",
+}
+# steps of the property path used to find the super classes of a class
+CLASS_STEPS = (RDFS + "subClassOf", OWL + "equivalentClass")
+LIST_STEPS = (OWL + "unionOf", OWL + "intersectionOf")
+
+INDEX_VERSION = 1
+
+
+# blank node labels are unique across files, so the triples of several files can be merged
+_bnode_ids = itertools.count(1)
+
+
+def literal(value):
+    """ literals are kept as strings starting with a quote, uris and blank nodes never start with one """
+    return '"' + value
+
+
+def is_literal(term):
+    return term.startswith('"')
+
+
+def _resolve(uri, base):
+    if uri.startswith("#"):
+        return base + uri
+    return uri
+
+
+def read_rdfxml(filename):
+    """ reads the triples of an RDF/XML file. It supports the syntax used by the OLiA models: node
+    elements with rdf:about/rdf:ID/rdf:nodeID, typed nodes, property elements with rdf:resource,
+    nested nodes, literals and rdf:parseType="Collection"/"Resource" """
+    triples = []
+
+    def new_bnode():
+        return "_:b%d" % next(_bnode_ids)
+
+    def node(element, base):
+        base = element.get("{%s}base" % XML, base)
+        if "{%s}about" % RDF in element.attrib:
+            subject = _resolve(element.get("{%s}about" % RDF), base)
+        elif "{%s}ID" % RDF in element.attrib:
+            subject = base + "#" + element.get("{%s}ID" % RDF)
+        elif "{%s}nodeID" % RDF in element.attrib:
+            subject = "_:" + element.get("{%s}nodeID" % RDF)
+        else:
+            subject = new_bnode()
+        if element.tag != "{%s}Description" % RDF:
+            triples.append((subject, RDF + "type", element.tag[1:].replace("}", "")))
+        for name, value in element.attrib.items():
+            if not name.startswith("{%s}" % RDF) and not name.startswith("{%s}" % XML):
+                triples.append((subject, name[1:].replace("}", ""), literal(value)))
+        for child in element:
+            property_element(subject, child, base)
+        return subject
+
+    def property_element(subject, element, base):
+        predicate = element.tag[1:].replace("}", "")
+        parse_type = element.get("{%s}parseType" % RDF)
+        if "{%s}resource" % RDF in element.attrib:
+            triples.append((subject, predicate, _resolve(element.get("{%s}resource" % RDF), base)))
+        elif parse_type == "Collection":
+            items = [node(child, base) for child in element]
+            head = RDF + "nil"
+            for item in reversed(items):
+                cell = new_bnode()
+                triples.append((cell, RDF + "first", item))
+                triples.append((cell, RDF + "rest", head))
+                head = cell
+            triples.append((subject, predicate, head))
+        elif parse_type == "Resource":
+            resource = new_bnode()
+            for child in element:
+                property_element(resource, child, base)
+            triples.append((subject, predicate, resource))
+        elif len(element):
+            triples.append((subject, predicate, node(element[0], base)))
+        else:
+            triples.append((subject, predicate, literal(element.text or "")))
+
+    root = ET.parse(filename).getroot()
+    base = root.get("{%s}base" % XML, "")
+    for child in root:
+        node(child, base)
+    return triples
+
+
+class Graph(object):
+    """ in-memory graph with the indexes needed to evaluate the property paths of the query """
+
+    def __init__(self, triples):
+        self.objects = {}
+        for s, p, o in triples:
+            self.objects.setdefault((s, p), []).append(o)
+        self.by_subject = {}
+        for s, p, o in triples:
+            self.by_subject.setdefault(s, []).append((p, o))
+
+    def values(self, subject, predicate):
+        return self.objects.get((subject, predicate), [])
+
+    def super_classes(self, start):
+        """ classes reached from the classes in start with (owl:equivalentClass|rdfs:subClassOf|
+        ((owl:unionOf|owl:intersectionOf)/rdf:first))*, the classes in start included """
+        seen = set()
+        todo = list(start)
+        while todo:
+            c = todo.pop()
+            if c in seen:
+                continue
+            seen.add(c)
+            for step in CLASS_STEPS:
+                todo.extend(self.values(c, step))
+            for step in LIST_STEPS:
+                for head in self.values(c, step):
+                    todo.extend(self.values(head, RDF + "first"))
+        return seen
+
+    def super_properties(self, prop):
+        """ properties reached with rdfs:subPropertyOf*, the property included """
+        seen = set()
+        todo = [prop]
+        while todo:
+            p = todo.pop()
+            if p not in seen:
+                seen.add(p)
+                todo.extend(self.values(p, RDFS + "subPropertyOf"))
+        return seen
+
+    def annotations(self, individual):
+        """ types and relations that the INSERT query adds to a token annotated with the individual """
+        types = set(c for c in self.super_classes(self.values(individual, RDF + "type"))
+                    if OLIA in c and not c.startswith("_:"))
+        relations = set()
+        for rel, o in self.by_subject.get(individual, []):
+            if OLIA not in rel:
+                continue
+            values = [o]
+            if not is_literal(o):
+                values.extend(c for c in self.super_classes(self.values(o, RDF + "type"))
+                              if OLIA in c and not c.startswith("_:"))
+            for prop in set([rel]) | set(p for p in self.super_properties(rel) if OLIA_OWL in p):
+                relations.update((prop, value) for value in values)
+        return {"types": sorted(types), "relations": sorted(relations)}
+
+
+def fingerprint(models):
+    """ identifies the version of the model files the index is built from """
+    return [[abspath(model), getsize(model), getmtime(model)] for model in models]
+
+
+def build_index(models):
+    """ reads the model files and builds the index as a json serializable dictionary """
+    triples = []
+    for model in models:
+        triples.extend(read_rdfxml(model))
+    graph = Graph(triples)
+    tags = {}
+    patterns = []
+    for s, p, o in triples:
+        kind = TAG_PROPERTIES.get(p)
+        if kind is None or not is_literal(o):
+            continue
+        if kind == "equals":
+            entry = tags.setdefault(o[1:], {"types": [], "relations": []})
+            annotations = graph.annotations(s)
+            entry["types"] = sorted(set(entry["types"]) | set(annotations["types"]))
+            entry["relations"] = sorted(set(map(tuple, entry["relations"])) | set(annotations["relations"]))
+        else:
+            patterns.append([kind, o[1:], graph.annotations(s)])
+    return {"version": INDEX_VERSION, "models": fingerprint(models), "tags": tags, "patterns": patterns}
+
+
+class OliaIndex(object):
+    """ looks up the OLiA annotations of a tag. Lookups are memoized, so the pattern rules are only
+    evaluated once per distinct tag """
+
+    def __init__(self, index):
+        self.tags = index["tags"]
+        self.patterns = [(kind, re.compile(value) if kind == "matches" else value, annotations)
+                         for kind, value, annotations in index["patterns"]]
+        self.cache = {}
+
+    def _match(self, kind, value, tag):
+        if kind == "startswith":
+            return tag.startswith(value)
+        if kind == "endswith":
+            return tag.endswith(value)
+        if kind == "contains":
+            return value in tag
+        return value.search(tag) is not None
+
+    def lookup(self, tag):
+        """ returns the (types, relations) of a tag: the sorted OLiA classes and the sorted
+        (property, value) pairs, with literal values starting with a quote """
+        result = self.cache.get(tag)
+        if result is None:
+            entries = [self.tags[tag]] if tag in self.tags else []
+            entries.extend(annotations for kind, value, annotations in self.patterns
+                           if self._match(kind, value, tag))
+            types = sorted(set(c for entry in entries for c in entry["types"]))
+            relations = sorted(set(tuple(r) for entry in entries for r in entry["relations"]))
+            result = self.cache[tag] = (types, relations)
+        return result
+
+
+def save_index(index, filename):
+    with io.open(filename, mode="w", encoding="utf-8") as f_out:
+        json.dump(index, f_out, indent=1)
+
+
+def load_index(filename, models=None):
+    """ loads an index saved with save_index. When the model files are given and the index is missing
+    or was built from other versions of them, it is rebuilt and saved again """
+    index = None
+    if isfile(filename):
+        with io.open(filename, mode="r", encoding="utf-8") as f_in:
+            index = json.load(f_in)
+        if index.get("version") != INDEX_VERSION or (models and index["models"] != fingerprint(models)):
+            index = None
+    if index is None:
+        if not models:
+            raise IOError("no usable OLiA index in %s and no model files to build it" % filename)
+        index = build_index(models)
+        save_index(index, filename)
+    return OliaIndex(index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the local index of an OLiA annotation model and its linking model')
+    parser.add_argument("--models", nargs="+", required=True, help="RDF/XML files of the annotation and linking models")
+    parser.add_argument("--out", required=True, help="json file where the index is saved")
+    parser.add_argument("--show", nargs="*", metavar="TAG", help="print the annotations of some tags")
+    args = parser.parse_args()
+
+    index = build_index(args.models)
+    save_index(index, args.out)
+    print("Indexed", len(index["tags"]), "tags and", len(index["patterns"]), "tag patterns into", args.out)
+    for tag in args.show or []:
+        types, relations = OliaIndex(index).lookup(tag)
+        print(tag, types, relations)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Packed output of vertical2json.py: a single file per input file instead of 5 json files per document.
+
+A pack file holds the same json texts as the individual files, one after the other, followed by an
+offset table and a trailer:
+```
+<document json of doc 1><datalayer json of doc 1><terminals ...><tokens ...><sentences ...>
+<document json of doc 2>...
+<offset table: json object with the byte offset and length of every layer of every document>
+<trailer: 8 bytes magic "VPACK001" and the byte offset of the offset table (uint64, little endian)>
+```
+The file is only appended to while it is written. The layers of a document are kept in spooled
+temporary files (in memory, on disk for large documents) until the document is complete, and are then
+appended to the pack, so a document that is not complete is never written.
+
+The offset table is only written when the pack is closed. While it is written, the offsets of every
+document appended are also written to a journal next to it, <pack file>.journal, flushed after the
+document; the journal is removed once the trailer is written. A pack whose writer crashed has no trailer
+and cannot be read, but it can be completed with --recover: the documents of the journal whose bytes are
+all in the pack are kept, the rest of the file is cut off and the offset table and the trailer are
+written.
+
+The reader seeks to the layer asked for and reads only its bytes, so any layer of any document can be
+read without unpacking the rest.
+
+How to run it:
+python -m sdllod19.packed_corpus --pack <pack file> --list
+    prints the documents of the pack and the size of their layers.
+python -m sdllod19.packed_corpus --pack <pack file> --doc <doc_id> --layer <layer>
+    prints a layer of a document (document, datalayer, terminals, tokens or sentences).
+python -m sdllod19.packed_corpus --pack <pack file> --unpack <folder>
+    writes the 5 json files of every document, as vertical2json.py does without --pack.
+python -m sdllod19.packed_corpus --pack <pack file> --recover
+    completes a pack whose writer crashed, with the documents of its journal.
+"""
+
+import io
+import os
+import sys
+import json
+import struct
+import tempfile
+import argparse
+from os import makedirs
+from os.path import basename, join, getsize, isfile
+
+from .vertical2json import JsonDocumentWriter, stream_documents
+
+MAGIC = b"VPACK001"
+_TRAILER = struct.Struct("<8sQ")
+LAYERS = ("document", "datalayer", "terminals", "tokens", "sentences")
+PACK_VERSION = 1
+JOURNAL_SUFFIX = ".journal"
+
+# size above which the layers of a document being written are moved from memory to a temporary file
+SPOOL_SIZE = 16 << 20
+
+
+class LayerBuffer(object):
+    """ file like object given to the json writers in place of an output file. The text written is kept
+    until the document is complete; close() does not discard it """
+
+    def __init__(self):
+        self.f = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode="w+b")
+
+    def write(self, text):
+        self.f.write(text.encode("utf-8"))
+
+    def tell(self):
+        return self.f.tell()
+
+    def close(self):
+        pass
+
+    def copy_to(self, f_out):
+        """ appends the buffered text to a binary file and returns the number of bytes written """
+        size = self.f.tell()
+        self.f.seek(0)
+        while True:
+            chunk = self.f.read(1 << 20)
+            if not chunk:
+                break
+            f_out.write(chunk)
+        self.f.close()
+        return size
+
+
+class PackedDocumentWriter(JsonDocumentWriter):
+    """ JsonDocumentWriter that writes the layers of a document to a PackWriter """
+
+    def __init__(self, pack, doc_id, doc, indent=2, batch_tokens=0):
+        self.pack = pack
+        self.doc_id = doc_id
+        self.buffers = {}
+        JsonDocumentWriter.__init__(self, pack.filename + "#" + doc_id, doc_id, doc, indent, batch_tokens)
+
+    def open_file(self, file_type):
+        buffer = self.buffers[file_type] = LayerBuffer()
+        return buffer
+
+    def close(self):
+        JsonDocumentWriter.close(self)
+        self.pack.add_document(self.doc_id, [self.buffers[layer] for layer in LAYERS])
+
+    def abort(self):
+        for buffer in self.buffers.values():
+            buffer.f.close()
+
+
+def write_table(f_out, source, documents):
+    """ writes the offset table and the trailer at the current position of a pack file """
+    table_offset = f_out.tell()
+    table = {"version": PACK_VERSION, "source": source, "layers": LAYERS, "documents": documents}
+    f_out.write(json.dumps(table, separators=(",", ":")).encode("utf-8"))
+    f_out.write(_TRAILER.pack(MAGIC, table_offset))
+
+
+class PackWriter(object):
+    """ appends documents to a pack file, and their offsets to its journal. close() writes the offset table
+    and the trailer and removes the journal """
+
+    def __init__(self, filename, source):
+        self.filename = filename
+        self.source = source
+        self.f_out = io.open(filename, mode="wb")
+        self.f_journal = io.open(filename + JOURNAL_SUFFIX, mode="w", encoding="utf-8")
+        self.f_journal.write(json.dumps({"version": PACK_VERSION, "source": source}) + "\n")
+        self.documents = []
+
+    def add_document(self, doc_id, buffers):
+        offsets = []
+        for buffer in buffers:
+            start = self.f_out.tell()
+            offsets.append([start, buffer.copy_to(self.f_out)])
+        self.documents.append([doc_id, offsets])
+        # the bytes of the document are in the file before its offsets are in the journal
+        self.f_out.flush()
+        self.f_journal.write(json.dumps([doc_id, offsets]) + "\n")
+        self.f_journal.flush()
+
+    def close(self):
+        write_table(self.f_out, self.source, self.documents)
+        self.f_out.close()
+        self.f_journal.close()
+        os.remove(self.filename + JOURNAL_SUFFIX)
+
+
+def recover_pack(filename):
+    """ completes a pack file whose writer did not close it, with the documents of its journal whose bytes
+    are all in the file. It returns the number of documents of the pack """
+    size = getsize(filename)
+    documents = []
+    end = 0
+    with io.open(filename + JOURNAL_SUFFIX, mode="r", encoding="utf-8") as f_journal:
+        source = json.loads(f_journal.readline())["source"]
+        for line in f_journal:
+            try:
+                doc_id, offsets = json.loads(line)
+            except ValueError:
+                # last line of a writer that was killed while writing it
+                break
+            document_end = offsets[-1][0] + offsets[-1][1]
+            if document_end > size:
+                break
+            documents.append([doc_id, offsets])
+            end = document_end
+    with io.open(filename, mode="r+b") as f_out:
+        f_out.truncate(end)
+        f_out.seek(end)
+        write_table(f_out, source, documents)
+    os.remove(filename + JOURNAL_SUFFIX)
+    return len(documents)
+
+
+def stream_to_pack(f_in, pack, indent=2, batch_tokens=0):
+    """ reads a vertical file like vertical2json.stream_documents and appends its documents to a pack.
+    It yields <pack file>#<doc_id> for every document written """
+    return stream_documents(f_in, new_writer=lambda doc_id, doc: PackedDocumentWriter(pack, doc_id, doc, indent, batch_tokens))
+
+
+class PackReader(object):
+    """ random access to the layers of the documents of a pack file """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.f_in = io.open(filename, mode="rb")
+        self.f_in.seek(-_TRAILER.size, io.SEEK_END)
+        trailer_offset = self.f_in.tell()
+        magic, table_offset = _TRAILER.unpack(self.f_in.read(_TRAILER.size))
+        if magic != MAGIC:
+            raise ValueError("%s is not a complete pack file%s" % (filename, ", see --recover"
+                                                                    if isfile(filename + JOURNAL_SUFFIX) else ""))
+        self.f_in.seek(table_offset)
+        table = json.loads(self.f_in.read(trailer_offset - table_offset).decode("utf-8"))
+        self.source = table["source"]
+        self.layers = table["layers"]
+        self.documents = table["documents"]
+        self.by_id = dict((doc_id, offsets) for doc_id, offsets in self.documents)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.by_id
+
+    def doc_ids(self):
+        return [doc_id for doc_id, _ in self.documents]
+
+    def layer_bytes(self, doc_id, layer):
+        """ returns the json text of a layer of a document, encoded in utf-8 """
+        start, length = self.by_id[doc_id][self.layers.index(layer)]
+        self.f_in.seek(start)
+        return self.f_in.read(length)
+
+    def layer(self, doc_id, layer):
+        """ returns a layer of a document as json data """
+        return json.loads(self.layer_bytes(doc_id, layer).decode("utf-8"))
+
+    def iter_layer(self, layer):
+        """ yields (doc_id, json data) for one layer of every document, in the order they were written """
+        for doc_id, _ in self.documents:
+            yield doc_id, self.layer(doc_id, layer)
+
+    def unpack(self, out_dir):
+        """ writes the files of every document as vertical2json.py does """
+        for doc_id, _ in self.documents:
+            for layer in self.layers:
+                with io.open(join(out_dir, "%s.%s.%s.json" % (self.source, doc_id, layer)), mode="wb") as f_out:
+                    f_out.write(self.layer_bytes(doc_id, layer))
+
+    def close(self):
+        self.f_in.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reads the pack files written by vertical2json.py --pack')
+    parser.add_argument("--pack", required=True, help="pack file")
+    parser.add_argument("--list", action="store_true", help="print the documents of the pack")
+    parser.add_argument("--doc", help="doc_id of the document to print")
+    parser.add_argument("--layer", choices=LAYERS, default="document", help="layer to print")
+    parser.add_argument("--unpack", help="output folder where the json files of every document are written")
+    parser.add_argument("--recover", action="store_true", help="complete a pack whose writer crashed with its journal")
+    args = parser.parse_args()
+
+    if args.recover:
+        if not isfile(args.pack + JOURNAL_SUFFIX):
+            parser.error("%s has no journal to recover from" % args.pack)
+        print("Recovered", recover_pack(args.pack), "documents of", args.pack)
+    reader = PackReader(args.pack)
+    if args.list:
+        for doc_id, offsets in reader.documents:
+            print(doc_id, " ".join("%s=%d" % (layer, length) for layer, (_, length) in zip(reader.layers, offsets)))
+    if args.doc:
+        if args.doc in reader:
+            sys.stdout.write(reader.layer_bytes(args.doc, args.layer).decode("utf-8") + "\n")
+        else:
+            print("Document not found:", args.doc)
+    if args.unpack:
+        makedirs(args.unpack, exist_ok=True)
+        reader.unpack(args.unpack)
+        print("Unpacked", len(reader), "documents of", basename(args.pack), "into", args.unpack)
+    reader.close()
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Library interface of the conversion scripts: the vertical files are read, transformed and written by
+stages that are lazy generators of Document objects, chained in a single process, e.g.
+
+    from sdllod19.pipeline import read_documents, filter_documents, write_json, write_conll, write_metadata, run
+    from sdllod19.metadata2rdf import MetadataWriter
+    writer = MetadataWriter("out/metadata.ttl")
+    documents = read_documents(["datasets/oup"])
+    documents = filter_documents(documents, lambda document: document.header.get("country") == "India")
+    run(write_metadata(write_conll(write_json(documents, "out/json"), "out/conll"), writer))
+    writer.close()
+
+Every document is read once and goes through all the stages before the next one is read, so many small
+files can be converted in one batch without starting a new interpreter for every file and script.
+* readers: read_documents(paths) reads input files and folders, compressed or not (see
+  compressed_input.py), and parse_documents(lines, source) the lines of a vertical file. They yield the
+  complete documents: a document without </doc> line is dropped, and a document whose header cannot be
+  parsed is skipped with an error message.
+  Both are built on read_events(lines, source), the reader of the vertical format shared by all the
+  scripts. It yields the start of every document, its sentences and its end as they are read, so that
+  the converters that write a document while it is read (vertical2json.py, the sinks of vertical2all.py)
+  do not keep it in memory.
+* transforms: filter_documents(documents, predicate) and skip_duplicates(documents, index), which drops the
+  near duplicates of the documents of a near_duplicates.py index.
+* sinks: write_json, write_conll and write_metadata write the same outputs as vertical2json.py,
+  vertical2conll.py and metadata2rdf.py, and to_sinks sends the documents to sinks of vertical2all.py.
+  They yield every document once it is written, so that sinks can be chained.
+run(documents) pulls the documents through the stages and returns their number.
+
+The module only imports the standard library and the modules that read the vertical files, so that it
+imports fast; the modules of the sinks (vertical2json.py imports numpy when it is installed) are imported
+the first time a sink is used. The counters and timers of instrumentation.py are updated as by the
+scripts.
+
+The sdllod19 package, and the command lines vertical2json, vertical2conll, metadata2rdf and vertical2all,
+are installed with "pip install ." from the root of the repository (see pyproject.toml). The optional
+dependencies are the extras numpy, zstd and validation.
+"""
+
+import io
+from os import listdir
+from os.path import isfile, isdir, join, basename, dirname, getsize
+from time import perf_counter
+
+from .doc_header import parse_header, HeaderError
+from .compressed_input import open_vertical, detect_compression, source_name, DECOMPRESS_THREADS
+from .instrumentation import stats
+
+
+class Document(object):
+    """ a complete document of a vertical file: the name of the input file it comes from, its primary_doc_id,
+    its <doc ...> line and the dictionary of its attributes, and its sentences as (lines, rows) pairs: the
+    lines of the vertical file and the same lines split in columns """
+    __slots__ = ("source", "doc_id", "header_line", "header", "sentences")
+
+    def __init__(self, source, doc_id, header_line, header, sentences=None):
+        self.source = source
+        self.doc_id = doc_id
+        self.header_line = header_line
+        self.header = header
+        self.sentences = sentences if sentences is not None else []
+
+    def tokens(self, column=0):
+        """ the values of a column of all the tokens of the document, by default the words """
+        return [row[column] for _, rows in self.sentences for row in rows]
+
+
+def input_files(path):
+    """ the [folder, filename] of the files of an --input parameter: all the files of a folder, in the order
+    of their names, or a file """
+    if isdir(path):
+        return [[path, f] for f in sorted(listdir(path)) if isfile(join(path, f))]
+    if isfile(path):
+        return [[dirname(path), basename(path)]]
+    return []
+
+
+# kinds of the events of read_events
+DOCUMENT_START, SENTENCE, DOCUMENT_END, DOCUMENT_ABORT = "start", "sentence", "end", "abort"
+
+
+def read_events(lines, source="", sentences=True):
+    """ reads the lines of a vertical file and yields (kind, document, lines, rows) events:
+    * (DOCUMENT_START, document, None, None) for every <doc ...> line whose header can be parsed; the
+      Document has no sentences.
+    * (SENTENCE, document, lines, rows) for every sentence of the document: the lines of the vertical file
+      and the same lines split in columns. Without sentences the token lines are skipped and there are no
+      SENTENCE events.
+    * (DOCUMENT_END, document, None, None) at its </doc> line.
+    * (DOCUMENT_ABORT, document, None, None) when the document has no </doc> line, before the next <doc ...>
+      line or at the end of the input. A reader that stops early must abort the document itself.
+    A document whose header cannot be parsed is skipped with an error message. The counters and timers of
+    instrumentation.py are updated """
+    counts = stats.counts
+    document = None
+    sentence = []
+    for line in lines:
+        if line.startswith("<doc "):
+            if document is not None:
+                yield DOCUMENT_ABORT, document, None, None
+            stats.start_document()
+            started = perf_counter()
+            try:
+                header = parse_header(line)
+                document = Document(source, header["primary_doc_id"], line, header)
+            except (HeaderError, KeyError) as ex:
+                print("Error in the following document: ", line, ex)
+                counts["parse_errors"] += 1
+                document = None
+            stats.times["header_parse"] += perf_counter() - started
+            sentence = []
+            if document is not None:
+                yield DOCUMENT_START, document, None, None
+        elif document is None or line.startswith("<s>"):
+            continue
+        elif line.startswith("</s>"):
+            counts["sentences"] += 1
+            if sentences:
+                counts["tokens"] += len(sentence)
+                yield SENTENCE, document, sentence, [l.strip().split("\t") for l in sentence]
+                sentence = []
+        elif line.startswith("</doc>"):
+            ended, document = document, None
+            yield DOCUMENT_END, ended, None, None
+            # after the reader is done with the document, so that a profiled document includes its writing
+            stats.end_document()
+        elif sentences:
+            sentence.append(line)
+        else:
+            counts["tokens"] += 1
+    if document is not None:
+        yield DOCUMENT_ABORT, document, None, None
+
+
+def parse_documents(lines, source="", sentences=True):
+    """ yields a Document for every complete document of the lines of a vertical file. Without sentences
+    the token lines are skipped and the documents have no sentences """
+    for kind, document, sentence_lines, rows in read_events(lines, source, sentences):
+        if kind == SENTENCE:
+            document.sentences.append((sentence_lines, rows))
+        elif kind == DOCUMENT_END:
+            yield document
+
+
+def read_documents(paths, decompress_threads=DECOMPRESS_THREADS, sentences=True):
+    """ yields the documents of input files and folders (see input_files), one file after the other. The
+    source of the documents is the name of their file, without the extension of a compressed file """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        for d, f in input_files(path):
+            filename = join(d, f)
+            stats.counts["bytes_read"] += getsize(filename)
+            f_input = open_vertical(filename, decompress_threads)
+            try:
+                for document in parse_documents(f_input, source_name(f, detect_compression(filename)), sentences):
+                    yield document
+            finally:
+                f_input.close()
+
+
+def filter_documents(documents, predicate):
+    """ passes on the documents for which predicate(document) is true """
+    for document in documents:
+        if predicate(document):
+            yield document
+
+
+def skip_duplicates(documents, index, on_duplicate=None):
+    """ passes on the documents that are not near duplicates of a document of a NearDuplicateIndex (see
+    near_duplicates.py), and adds them to the index. on_duplicate(document, canonical_id, similarity) is
+    called for every duplicate """
+    for document in documents:
+        duplicate = index.check(document.doc_id, [token.lower() for token in document.tokens()], document.source)
+        if duplicate is None:
+            yield document
+        elif on_duplicate is not None:
+            on_duplicate(document, duplicate[0], duplicate[1])
+
+
+def write_json(documents, out_dir, indent=2, batch_tokens=0):
+    """ writes the 5 json files of every document to a folder, as vertical2json.py does """
+    from . import vertical2json
+    for document in documents:
+        writer = vertical2json.JsonDocumentWriter(join(out_dir, document.source + "." + document.doc_id), document.doc_id,
+                                                  vertical2json.document_metadata(document.header), indent, batch_tokens)
+        for _, rows in document.sentences:
+            writer.write_sentence(vertical2json.rows_segment(rows))
+        writer.close()
+        yield document
+
+
+def conll_lines(document):
+    """ the lines of the .conll file of a document: its <doc ...> line as a comment, and its sentences
+    separated by empty lines """
+    lines = ["# " + document.header_line]
+    for sentence, _ in document.sentences:
+        lines.extend(sentence)
+        lines.append("\n")
+    return lines
+
+
+def write_conll(documents, out_dir):
+    """ writes a <doc_id>.conll file for every document to a folder, as vertical2conll.py does """
+    for document in documents:
+        filename = join(out_dir, document.doc_id + ".conll")
+        started = perf_counter()
+        with io.open(filename, mode="w", encoding="utf-8") as f_conll:
+            f_conll.writelines(conll_lines(document))
+            stats.counts["bytes_written"] += f_conll.tell()
+        stats.times["serialization"] += perf_counter() - started
+        yield document
+
+
+def write_metadata(documents, writer):
+    """ writes the metadata triples of every document with a MetadataWriter of metadata2rdf.py, as
+    metadata2rdf.py does. The writer is given, not created, because the metadata of all the documents of
+    a run go to a single graph: it is closed by the caller """
+    from .metadata2rdf import document_metadata
+    for document in documents:
+        started = perf_counter()
+        writer.write(document.doc_id, document_metadata(document.header))
+        stats.times["serialization"] += perf_counter() - started
+        yield document
+
+
+def to_sinks(documents, sinks):
+    """ sends every document to sinks of vertical2all.py and passes it on. The sinks are closed once there
+    are no more documents """
+    try:
+        for document in documents:
+            for sink in sinks:
+                sink.start_document(document.source, document.doc_id, document.header_line, document.header)
+            for lines, rows in document.sentences:
+                for sink in sinks:
+                    if sink.reads_sentences:
+                        sink.write_sentence(lines, rows)
+            for sink in sinks:
+                sink.end_document()
+            yield document
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+def run(documents):
+    """ pulls the documents through the stages of a pipeline, and returns their number """
+    n_documents = 0
+    for _ in documents:
+        n_documents += 1
+    return n_documents
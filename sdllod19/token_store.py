@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Columnar store of the tokens of a corpus, written by vertical2all.py --tokens_dir.
+
+Instead of keeping every token as python strings, every column of the vertical file (word, token,
+lemma, pos, lempos) is dictionary encoded: each distinct string gets an integer id and the column is
+saved as a flat array of ids. word and token share the same vocabulary. A store is a folder with:
+* <column>.u32: the ids of the column for every token of the corpus, uint32.
+* <vocabulary>.vocab: the strings of a vocabulary (word, lemma, pos, lempos), one per line, in id order.
+* sentences.u64: offset of the first token of every sentence, plus the total number of tokens at the end.
+* documents.u64: offset of the first sentence of every document, plus the number of sentences at the end.
+* documents.txt: the doc_id of every document, one per line.
+* store.json: number of tokens, sentences and documents and the byte order of the arrays.
+
+The arrays are read through memory maps, so opening a store does not load the columns. When NumPy is
+installed they are numpy arrays and counts and filters are vectorized (bincount, boolean masks);
+otherwise they are memoryviews and the same operations run through the C loops of collections.Counter
+and of the array module.
+
+How to run it:
+python -m sdllod19.token_store --store <folder> --counts <column> [--top N]
+    prints the most frequent values of a column, e.g. --counts pos for the POS distribution.
+python -m sdllod19.token_store --store <folder> --select <column>=<value> ... [--top N]
+    prints the number of tokens matching all the conditions and the first sentences they appear in.
+"""
+
+import io
+import sys
+import json
+import mmap
+import argparse
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from os import makedirs
+from os.path import join, getsize
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+COLUMNS = ("word", "token", "lemma", "pos", "lempos")
+# vocabulary used to encode every column
+VOCABULARIES = {"word": "word", "token": "word", "lemma": "lemma", "pos": "pos", "lempos": "lempos"}
+STORE_VERSION = 1
+
+_U32 = "I" if array("I").itemsize == 4 else "L"
+_U64 = "Q"
+
+
+class Vocabulary(object):
+    """ assigns consecutive integer ids to strings """
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def encode(self, string):
+        i = self.ids.get(string)
+        if i is None:
+            i = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return i
+
+
+class TokenStoreWriter(object):
+    """ writes a token store. The ids of a document are kept in memory until the document is complete,
+    so the arrays on disk never hold part of a document """
+
+    def __init__(self, path):
+        self.path = path
+        makedirs(path, exist_ok=True)
+        self.vocabularies = dict((name, Vocabulary()) for name in set(VOCABULARIES.values()))
+        self.encoders = [self.vocabularies[VOCABULARIES[column]].encode for column in COLUMNS]
+        self.f_columns = [io.open(join(path, column + ".u32"), mode="wb") for column in COLUMNS]
+        self.f_sentences = io.open(join(path, "sentences.u64"), mode="wb")
+        self.doc_ids = []
+        self.doc_starts = array(_U64)
+        self.n_tokens = self.n_sentences = 0
+        self.doc_id = None
+
+    def start_document(self, doc_id):
+        self.doc_id = doc_id
+        self.columns = [array(_U32) for _ in COLUMNS]
+        self.sentence_starts = array(_U64)
+        self.doc_tokens = 0
+
+    def add_sentence(self, rows):
+        """ adds the tokens of a sentence, given as the rows of the vertical file split in columns """
+        self.sentence_starts.append(self.n_tokens + self.doc_tokens)
+        for i, (encode, column) in enumerate(zip(self.encoders, self.columns)):
+            column.extend(encode(row[i] if i < len(row) else "") for row in rows)
+        self.doc_tokens += len(rows)
+
+    def end_document(self):
+        for f_column, column in zip(self.f_columns, self.columns):
+            column.tofile(f_column)
+        self.sentence_starts.tofile(self.f_sentences)
+        self.doc_ids.append(self.doc_id)
+        self.doc_starts.append(self.n_sentences)
+        self.n_tokens += self.doc_tokens
+        self.n_sentences += len(self.sentence_starts)
+        self.doc_id = None
+
+    def abort_document(self):
+        self.doc_id = None
+
+    def close(self):
+        array(_U64, [self.n_tokens]).tofile(self.f_sentences)
+        self.f_sentences.close()
+        for f_column in self.f_columns:
+            f_column.close()
+        with io.open(join(self.path, "documents.u64"), mode="wb") as f_out:
+            self.doc_starts.append(self.n_sentences)
+            self.doc_starts.tofile(f_out)
+        with io.open(join(self.path, "documents.txt"), mode="w", encoding="utf-8") as f_out:
+            f_out.writelines(doc_id + "\n" for doc_id in self.doc_ids)
+        for name, vocabulary in self.vocabularies.items():
+            with io.open(join(self.path, name + ".vocab"), mode="w", encoding="utf-8") as f_out:
+                f_out.writelines(string + "\n" for string in vocabulary.strings)
+        with io.open(join(self.path, "store.json"), mode="w", encoding="utf-8") as f_out:
+            json.dump({"version": STORE_VERSION, "byteorder": sys.byteorder, "tokens": self.n_tokens,
+                       "sentences": self.n_sentences, "documents": len(self.doc_ids)}, f_out, indent=2)
+
+
+class TokenStoreSink(object):
+    """ vertical2all.py sink that writes the tokens of all the documents to a token store, and builds its
+    inverted index (see concordance.py) when index is set """
+    reads_sentences = True
+
+    def __init__(self, out_dir, index=False):
+        self.writer = TokenStoreWriter(out_dir)
+        self.index = index
+
+    def start_document(self, source, doc_id, header_line, header):
+        self.writer.start_document(doc_id)
+
+    def write_sentence(self, lines, rows):
+        self.writer.add_sentence(rows)
+
+    def end_document(self):
+        self.writer.end_document()
+
+    def abort_document(self):
+        self.writer.abort_document()
+
+    def close(self):
+        self.writer.close()
+        if self.index:
+            from .concordance import build_index
+            store = TokenStore(self.writer.path)
+            build_index(store)
+            store.close()
+
+
+def _read_lines(filename):
+    with io.open(filename, mode="r", encoding="utf-8", newline="\n") as f_in:
+        return [line[:-1] for line in f_in]
+
+
+class TokenStore(object):
+    """ read access to a token store """
+
+    def __init__(self, path):
+        self.path = path
+        with io.open(join(path, "store.json"), mode="r", encoding="utf-8") as f_in:
+            self.info = json.load(f_in)
+        if self.info["byteorder"] != sys.byteorder:
+            raise ValueError("%s was written on a %s endian machine" % (path, self.info["byteorder"]))
+        self.vocabularies = dict((name, _read_lines(join(path, name + ".vocab"))) for name in set(VOCABULARIES.values()))
+        self.doc_ids = _read_lines(join(path, "documents.txt"))
+        self.maps = []
+        self.columns = dict((column, self._array(column + ".u32", _U32)) for column in COLUMNS)
+        self.sentence_starts = self._array("sentences.u64", _U64)
+        self.doc_starts = self._array("documents.u64", _U64)
+        self.ids = {}
+
+    def _array(self, filename, typecode):
+        """ maps an array file: a numpy array when numpy is available, a memoryview otherwise """
+        filename = join(self.path, filename)
+        if getsize(filename) == 0:
+            return numpy.zeros(0, dtype=typecode) if numpy is not None else memoryview(array(typecode))
+        with io.open(filename, mode="rb") as f_in:
+            data = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(data)
+        if numpy is not None:
+            return numpy.frombuffer(data, dtype=typecode)
+        return memoryview(data).cast(typecode)
+
+    def __len__(self):
+        return self.info["tokens"]
+
+    def vocabulary(self, column):
+        return self.vocabularies[VOCABULARIES[column]]
+
+    def encode(self, column, string):
+        """ returns the id of a string in the vocabulary of a column, or None when it is not in the corpus """
+        name = VOCABULARIES[column]
+        if name not in self.ids:
+            self.ids[name] = dict((s, i) for i, s in enumerate(self.vocabularies[name]))
+        return self.ids[name].get(string)
+
+    def counts(self, column):
+        """ returns the number of tokens of every id of a column, as a list indexed by id """
+        size = len(self.vocabulary(column))
+        if numpy is not None:
+            return numpy.bincount(self.columns[column], minlength=size).tolist()
+        counts = [0] * size
+        for i, n in Counter(self.columns[column]).items():
+            counts[i] = n
+        return counts
+
+    def most_common(self, column, n=None):
+        """ returns the n most frequent (string, count) of a column, e.g. the POS distribution """
+        vocabulary = self.vocabulary(column)
+        frequencies = sorted(((count, i) for i, count in enumerate(self.counts(column)) if count), reverse=True)
+        return [(vocabulary[i], count) for count, i in frequencies[:n]]
+
+    def select(self, **conditions):
+        """ returns the positions of the tokens whose columns have the given string values, e.g.
+        select(lemma="be", pos="VBZ") """
+        ids = dict((column, self.encode(column, value)) for column, value in conditions.items())
+        if any(i is None for i in ids.values()):
+            return []
+        if numpy is not None:
+            mask = numpy.ones(len(self), dtype=bool)
+            for column, i in ids.items():
+                mask &= self.columns[column] == i
+            return numpy.flatnonzero(mask).tolist()
+        columns = [(self.columns[column], i) for column, i in ids.items()]
+        first, first_id = columns[0]
+        return [p for p, value in enumerate(first)
+                if value == first_id and all(c[p] == i for c, i in columns[1:])]
+
+    def sentence_of(self, position):
+        """ returns the index of the sentence a token belongs to """
+        return bisect_right(self.sentence_starts, position) - 1
+
+    def sentence(self, index, column="word"):
+        """ returns the strings of a column for the tokens of a sentence """
+        vocabulary = self.vocabulary(column)
+        start, end = int(self.sentence_starts[index]), int(self.sentence_starts[index + 1])
+        return [vocabulary[i] for i in self.columns[column][start:end].tolist()]
+
+    def document_of(self, sentence):
+        """ returns the doc_id of the document a sentence belongs to """
+        return self.doc_ids[bisect_right(self.doc_starts, sentence) - 1]
+
+    def close(self):
+        self.columns = self.sentence_starts = self.doc_starts = None
+        for data in self.maps:
+            try:
+                data.close()
+            except BufferError:
+                # a numpy array or a memoryview returned to the caller still uses the map
+                pass
+        self.maps = []
+
+
+def condition(text):
+    """ argparse type of --select: a (column, value) pair, with the column one of COLUMNS """
+    column, equals, value = text.partition("=")
+    if not equals:
+        raise argparse.ArgumentTypeError("%r is not COLUMN=VALUE" % text)
+    if column not in COLUMNS:
+        raise argparse.ArgumentTypeError("invalid column: %r (choose from %s)" % (column, ", ".join(COLUMNS)))
+    return column, value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Counts and filters the tokens of a token store written by vertical2all.py')
+    parser.add_argument("--store", required=True, help="token store folder")
+    parser.add_argument("--counts", choices=COLUMNS, help="print the most frequent values of a column")
+    parser.add_argument("--select", nargs="+", type=condition, metavar="COLUMN=VALUE",
+                        help="print the tokens matching all the conditions, COLUMN is one of " + ", ".join(COLUMNS))
+    parser.add_argument("--top", type=int, default=20, help="number of values or sentences printed")
+    args = parser.parse_args()
+
+    store = TokenStore(args.store)
+    print(args.store, ":", store.info["tokens"], "tokens,", store.info["sentences"], "sentences,", store.info["documents"], "documents")
+    if args.counts:
+        for value, count in store.most_common(args.counts, args.top):
+            print("%s\t%d\t%.4f" % (value, count, count / float(len(store))))
+    if args.select:
+        positions = store.select(**dict(args.select))
+        print(len(positions), "matching tokens")
+        sentences = sorted(set(store.sentence_of(p) for p in positions))
+        for s in sentences[:args.top]:
+            print(store.document_of(s), s, " ".join(store.sentence(s)))
+    store.close()
@@ -0,0 +1,882 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Embedded triple store to run the OLiA queries of "project notes.txt" locally, without uploading the
+CoNLL-RDF files and the OLiA models to Fuseki.
+
+The store is bulk loaded from Turtle or N-Triples files (the files written by conllrdf.py, metadata2rdf.py
+and bibliography2rdf.py, or any other Turtle file) and from RDF/XML files (the OLiA models penn.owl and
+penn-link.rdf, read as in olia_index.py). The triples of all the files go to a single graph. It is saved
+in a folder:
+* terms.blob and terms.u64: the distinct terms (uris, blank nodes and literals) encoded in utf-8, one
+  after the other, sorted, with the offset of every term. The id of a term is its position, so a term is
+  found by binary search without loading the dictionary. Literals are written as in olia_index.py: a
+  quote followed by the value, then, when they have one, a NUL character and @lang or ^^datatype.
+* spo.u32, pos.u32 and osp.u32: the triples as ids, sorted in 3 orders, each triple being 3 consecutive
+  uint32. Every pattern with at least one constant is answered by a binary search in one of them.
+* store.json: number of terms and triples and the byte order of the arrays.
+All the files are memory mapped when the store is opened.
+
+Queries are written in a subset of SPARQL: PREFIX, SELECT [DISTINCT] <variables>|* WHERE { ... }
+[ORDER BY <variables>] [LIMIT n], with basic graph patterns ("." ";" "," and "a"), property paths made
+of "/", "|", "^", "*", "+", "?" and parentheses (e.g. rdfs:subClassOf*), and FILTER(strstarts(str(?v), "..."))
+contains and regex. GRAPH <uri> { ... } blocks are read as plain groups since there is a single graph.
+The patterns are joined one at a time in the order that binds the fewest triples first, and the results
+of a property path from a given node are kept for the rest of the query.
+
+How to run it:
+python -m sdllod19.triple_store --store <folder> --load <file|folder> [<file|folder> ...]
+    loads .ttl, .nt, .rdf and .owl files (optionally compressed, see compressed_input.py) into a new store.
+python -m sdllod19.triple_store --store <folder> (--query "<sparql>" | --query_file <file>) [--limit N]
+    prints the results as tab separated values.
+"""
+
+import io
+import re
+import sys
+import json
+import mmap
+import time
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from os import makedirs
+from os.path import join, isdir, isfile, getsize
+from urllib.parse import urljoin
+from xml.etree import ElementTree
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .olia_index import read_rdfxml, literal, is_literal, RDF
+from .compressed_input import open_vertical
+from .pipeline import input_files
+
+STORE_VERSION = 1
+XSD = "http://www.w3.org/2001/XMLSchema#"
+# separates the value of a literal from its language or datatype, NUL cannot be part of an XML text
+LITERAL_SUFFIX = "\0"
+_U32 = "I" if array("I").itemsize == 4 else "L"
+# the orders of the indexes, as positions in a (subject, predicate, object) triple
+ORDERS = {"spo": (0, 1, 2), "pos": (1, 2, 0), "osp": (2, 0, 1)}
+TURTLE_EXTENSIONS = (".ttl", ".nt")
+RDFXML_EXTENSIONS = (".rdf", ".owl", ".xml")
+
+_TURTLE_TOKEN = re.compile(r'''
+    (?P<ws>\s+|\#[^\n]*)
+  | (?P<iri><[^<>"{}|^`\\\s]*>)
+  | (?P<long>"""(?:[^"\\]|\\.|"(?!""))*"""|\'\'\'(?:[^'\\]|\\.|'(?!''))*\'\'\')
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<at>@[A-Za-z]+(?:-[A-Za-z0-9]+)*)
+  | (?P<datatype>\^\^)
+  | (?P<bnode>_:[\w-]+(?:\.[\w-]+)*)
+  | (?P<pname>(?:[A-Za-z][\w-]*(?:\.[\w-]+)*)?:(?:[\w:%-]|\\[^\s]|\.(?=[\w:%\\-]))*)
+  | (?P<number>[+-]?(?:\d+\.\d+|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z]+)
+  | (?P<punct>[;,.\[\]()])
+''', re.VERBOSE)
+_ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))', re.DOTALL)
+_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+
+def _unescape(text):
+    """ replaces the escape sequences of Turtle strings and local names """
+    if "\\" not in text:
+        return text
+    return _ESCAPE.sub(lambda m: chr(int(m.group(1) or m.group(2), 16)) if m.group(3) is None
+                       else _ESCAPES.get(m.group(3), m.group(3)), text)
+
+
+def typed_literal(value, lang=None, datatype=None):
+    """ returns the term of a literal with its language or datatype, xsd:string being a plain literal """
+    if lang:
+        return literal(value) + LITERAL_SUFFIX + "@" + lang.lower()
+    if datatype and datatype != XSD + "string":
+        return literal(value) + LITERAL_SUFFIX + "^^" + datatype
+    return literal(value)
+
+
+class TurtleParser(object):
+    """ reads the triples of a Turtle or N-Triples text. Blank node labels get a prefix so that the blank
+    nodes of different files are different """
+
+    def __init__(self, text, add, base="", bnode_prefix="b"):
+        self.tokens = []
+        position = 0
+        for m in _TURTLE_TOKEN.finditer(text):
+            # finditer skips the characters that are not part of a token
+            if m.start() != position:
+                break
+            position = m.end()
+            if m.lastgroup != "ws":
+                self.tokens.append((m.lastgroup, m.group()))
+        if position != len(text):
+            raise ValueError("unexpected text at character %d: %r" % (position, text[position:position + 30]))
+        self.add = add
+        self.base = base
+        self.bnode_prefix = bnode_prefix
+        self.namespaces = {}
+        self.anonymous = 0
+        self.i = 0
+
+    def _next(self):
+        token = self.tokens[self.i]
+        self.i += 1
+        return token
+
+    def _peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None)
+
+    def _expect(self, text):
+        kind, value = self._next()
+        if value != text:
+            raise ValueError("expected %r, found %r" % (text, value))
+
+    def parse(self):
+        while self.i < len(self.tokens):
+            kind, value = self._peek()
+            if value in ("@prefix", "@base") or (kind == "name" and value.upper() in ("PREFIX", "BASE")):
+                self._directive()
+            else:
+                subject = self._subject()
+                if self._peek()[1] != ".":
+                    self._predicate_objects(subject)
+                self._expect(".")
+
+    def _directive(self):
+        kind, keyword = self._next()
+        if keyword.lstrip("@").upper() == "PREFIX":
+            _, prefix = self._next()
+            _, iri = self._next()
+            self.namespaces[prefix[:-1]] = self._iri(iri)
+        else:
+            _, iri = self._next()
+            self.base = self._iri(iri)
+        if keyword.startswith("@"):
+            self._expect(".")
+
+    def _iri(self, token):
+        iri = _unescape(token[1:-1])
+        return urljoin(self.base, iri) if self.base and ":" not in iri.split("/")[0] else iri
+
+    def _bnode(self, label=None):
+        if label is None:
+            self.anonymous += 1
+            # labels cannot start with "-", so the generated ones cannot clash with the labels of the file
+            label = "-%d" % self.anonymous
+        return "_:" + self.bnode_prefix + label
+
+    def _subject(self):
+        kind, value = self._next()
+        if value == "[":
+            node = self._bnode()
+            if self._peek()[1] != "]":
+                self._predicate_objects(node)
+            self._expect("]")
+            return node
+        if value == "(":
+            return self._collection()
+        return self._term(kind, value)
+
+    def _term(self, kind, value):
+        if kind == "iri":
+            return self._iri(value)
+        if kind == "pname":
+            prefix, _, local = value.partition(":")
+            if prefix not in self.namespaces:
+                raise ValueError("unknown prefix %r" % prefix)
+            return self.namespaces[prefix] + _unescape(local)
+        if kind == "bnode":
+            return self._bnode(value[2:])
+        raise ValueError("unexpected %r" % value)
+
+    def _predicate_objects(self, subject):
+        while True:
+            kind, value = self._next()
+            predicate = RDF + "type" if value == "a" else self._term(kind, value)
+            while True:
+                self.add(subject, predicate, self._object())
+                if self._peek()[1] != ",":
+                    break
+                self._next()
+            if self._peek()[1] != ";":
+                return
+            # a ";" can be followed by another ";" or by the end of the list
+            while self._peek()[1] == ";":
+                self._next()
+            if self._peek()[1] in (".", "]", None):
+                return
+
+    def _object(self):
+        kind, value = self._next()
+        if kind in ("string", "long"):
+            text = _unescape(value[3:-3] if kind == "long" else value[1:-1])
+            next_kind, next_value = self._peek()
+            if next_kind == "at":
+                self._next()
+                return typed_literal(text, lang=next_value[1:])
+            if next_kind == "datatype":
+                self._next()
+                return typed_literal(text, datatype=self._term(*self._next()))
+            return literal(text)
+        if kind == "number":
+            datatype = "double" if "e" in value.lower() else "decimal" if "." in value else "integer"
+            return typed_literal(value, datatype=XSD + datatype)
+        if kind == "name" and value in ("true", "false"):
+            return typed_literal(value, datatype=XSD + "boolean")
+        if value == "[":
+            node = self._bnode()
+            if self._peek()[1] != "]":
+                self._predicate_objects(node)
+            self._expect("]")
+            return node
+        if value == "(":
+            return self._collection()
+        return self._term(kind, value)
+
+    def _collection(self):
+        items = []
+        while self._peek()[1] != ")":
+            items.append(self._object())
+        self._next()
+        head = RDF + "nil"
+        for item in reversed(items):
+            cell = self._bnode()
+            self.add(cell, RDF + "first", item)
+            self.add(cell, RDF + "rest", head)
+            head = cell
+        return head
+
+
+class TripleStoreWriter(object):
+    """ collects the triples of the loaded files, with dictionary encoded terms, and saves the store """
+
+    def __init__(self):
+        self.ids = {}
+        self.terms = []
+        self.triples = array(_U32)
+        self.files = 0
+
+    def encode(self, term):
+        i = self.ids.get(term)
+        if i is None:
+            i = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return i
+
+    def add(self, s, p, o):
+        encode = self.encode
+        self.triples.extend((encode(s), encode(p), encode(o)))
+
+    def load(self, filename):
+        """ loads a Turtle, N-Triples or RDF/XML file, chosen from its extension """
+        name = filename.lower()
+        for suffix in (".gz", ".xz", ".zst", ".zstd"):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+        self.files += 1
+        if name.endswith(RDFXML_EXTENSIONS):
+            for s, p, o in read_rdfxml(filename):
+                self.add(s, p, o)
+        elif name.endswith(TURTLE_EXTENSIONS):
+            with open_vertical(filename) as f_in:
+                text = f_in.read()
+            # the triples are added once the whole file is read, so a file with an error adds none
+            triples = []
+            try:
+                TurtleParser(text, lambda s, p, o: triples.append((s, p, o)), bnode_prefix="f%d_" % self.files).parse()
+            except IndexError:
+                raise ValueError("unexpected end of file")
+            for s, p, o in triples:
+                self.add(s, p, o)
+        else:
+            raise ValueError("unknown RDF syntax, expected one of %s" % (TURTLE_EXTENSIONS + RDFXML_EXTENSIONS,))
+
+    def save(self, path):
+        """ writes the store: the terms are sorted, so that ids follow the order of the terms, and the
+        duplicate triples are removed """
+        makedirs(path, exist_ok=True)
+        order = sorted(range(len(self.terms)), key=self.terms.__getitem__)
+        new_ids = array(_U32, bytes(4 * len(order)))
+        offsets = array("Q", [0])
+        with io.open(join(path, "terms.blob"), mode="wb") as f_out:
+            for new_id, old_id in enumerate(order):
+                new_ids[old_id] = new_id
+                data = self.terms[old_id].encode("utf-8")
+                f_out.write(data)
+                offsets.append(offsets[-1] + len(data))
+        with io.open(join(path, "terms.u64"), mode="wb") as f_out:
+            offsets.tofile(f_out)
+        n_triples = 0
+        for name, (a, b, c) in ORDERS.items():
+            rows = _sorted_rows(self.triples, new_ids, (a, b, c))
+            n_triples = len(rows) // 3
+            with io.open(join(path, name + ".u32"), mode="wb") as f_out:
+                rows.tofile(f_out)
+        with io.open(join(path, "store.json"), mode="w", encoding="utf-8") as f_out:
+            json.dump({"version": STORE_VERSION, "byteorder": sys.byteorder, "terms": len(self.terms),
+                       "triples": n_triples}, f_out, indent=2)
+        return n_triples
+
+
+def _sorted_rows(triples, new_ids, order):
+    """ returns the distinct triples with the new ids, with their positions in the given order, sorted """
+    if numpy is not None:
+        rows = numpy.asarray(new_ids, dtype=numpy.uint32)[numpy.frombuffer(triples, dtype=numpy.uint32)].reshape(-1, 3)
+        rows = numpy.unique(rows[:, list(order)], axis=0) if len(rows) else rows
+        return array(_U32, rows.astype(numpy.uint32).tobytes())
+    a, b, c = order
+    rows = sorted(set((new_ids[t[a]], new_ids[t[b]], new_ids[t[c]])
+                      for t in zip(triples[0::3], triples[1::3], triples[2::3])))
+    out = array(_U32)
+    for row in rows:
+        out.extend(row)
+    return out
+
+
+class _Terms(object):
+    """ sequence of the sorted terms of a store, decoded when they are accessed, for bisect """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+
+class TripleStore(object):
+    """ read access to a store saved by TripleStoreWriter """
+
+    def __init__(self, path):
+        self.path = path
+        with io.open(join(path, "store.json"), mode="r", encoding="utf-8") as f_in:
+            self.info = json.load(f_in)
+        if self.info["byteorder"] != sys.byteorder:
+            raise ValueError("%s was written on a %s endian machine" % (path, self.info["byteorder"]))
+        self.maps = []
+        blob = self._map("terms.blob")
+        self.terms = _Terms(blob if blob is not None else b"", self._array("terms.u64", "Q"))
+        self.indexes = {}
+        for name, order in ORDERS.items():
+            rows = self._array(name + ".u32", _U32)
+            self.indexes[name] = (order, rows[0::3], rows[1::3], rows[2::3])
+
+    def _map(self, filename):
+        filename = join(self.path, filename)
+        if getsize(filename) == 0:
+            return None
+        with io.open(filename, mode="rb") as f_in:
+            data = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(data)
+        return data
+
+    def _array(self, filename, typecode):
+        data = self._map(filename)
+        return memoryview(data).cast(typecode) if data is not None else memoryview(array(typecode))
+
+    def __len__(self):
+        return self.info["triples"]
+
+    def term(self, i):
+        return self.terms[i]
+
+    def id(self, term):
+        """ returns the id of a term, or None when it is not in the store """
+        i = bisect_left(self.terms, term)
+        return i if i < len(self.terms) and self.terms[i] == term else None
+
+    def _range(self, s, p, o):
+        """ chooses the index that has the constants of a pattern first and finds their rows """
+        if s is not None:
+            name, keys = ("osp", (o, s)) if p is None and o is not None else ("spo", (s, p, o))
+        elif p is not None:
+            name, keys = "pos", (p, o)
+        else:
+            name, keys = ("osp", (o,)) if o is not None else ("spo", ())
+        index = self.indexes[name]
+        lo, hi = 0, len(index[1])
+        for column, key in zip(index[1:], keys):
+            if key is None:
+                break
+            lo = bisect_left(column, key, lo, hi)
+            hi = bisect_right(column, key, lo, hi)
+        return index, lo, hi
+
+    def count(self, s=None, p=None, o=None):
+        """ number of triples matching a pattern, None being a variable """
+        _, lo, hi = self._range(s, p, o)
+        return hi - lo
+
+    def match(self, s=None, p=None, o=None):
+        """ yields the (s, p, o) ids of the triples matching a pattern, None being a variable """
+        (order, c0, c1, c2), lo, hi = self._range(s, p, o)
+        positions = [order.index(k) for k in range(3)]
+        for i in range(lo, hi):
+            row = (c0[i], c1[i], c2[i])
+            yield row[positions[0]], row[positions[1]], row[positions[2]]
+
+    def subjects(self):
+        """ distinct subjects of the store """
+        _, c0, _, _ = self.indexes["spo"]
+        i, n = 0, len(c0)
+        while i < n:
+            yield c0[i]
+            i = bisect_right(c0, c0[i], i, n)
+
+    def query(self, text):
+        """ runs a SPARQL query (see the module documentation for the supported subset). Returns the
+        selected variables and the rows of terms """
+        return Query(self, text).run()
+
+    def close(self):
+        self.terms = self.indexes = None
+        for data in self.maps:
+            try:
+                data.close()
+            except BufferError:
+                pass
+        self.maps = []
+
+
+_SPARQL_TOKEN = re.compile(r'''
+    (?P<ws>\s+|\#[^\n]*)
+  | (?P<iri><[^<>"{}|^`\\\s]*>)
+  | (?P<var>[?$][A-Za-z_]\w*)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<at>@[A-Za-z]+(?:-[A-Za-z0-9]+)*)
+  | (?P<datatype>\^\^)
+  | (?P<pname>(?:[A-Za-z][\w-]*(?:\.[\w-]+)*)?:(?:[\w%-]|\\[^\s]|\.(?=[\w%-]))*)
+  | (?P<number>\d+)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<punct>[{}()\[\].;,|/^*+?])
+''', re.VERBOSE)
+_FILTERS = {
+    "strstarts": lambda value, argument: value.startswith(argument),
+    "contains": lambda value, argument: argument in value,
+    "regex": lambda value, argument: re.search(argument, value) is not None,
+}
+
+
+def term_value(term):
+    """ the value of str(): the uri, or the text of a literal """
+    if is_literal(term):
+        return term[1:].split(LITERAL_SUFFIX, 1)[0]
+    return term
+
+
+def format_term(term):
+    """ writes a term as in N-Triples """
+    if is_literal(term):
+        value, _, suffix = term[1:].partition(LITERAL_SUFFIX)
+        text = json.dumps(value, ensure_ascii=False)
+        return text + (suffix if suffix.startswith("@") else "^^<" + suffix[2:] + ">" if suffix else "")
+    return term if term.startswith("_:") else "<" + term + ">"
+
+
+class Query(object):
+    """ a parsed SPARQL query. Variables are strings starting with "?", constants are term ids (None
+    when the term is not in the store: the query then has no results) and paths are tuples """
+
+    def __init__(self, store, text):
+        self.store = store
+        self.tokens = [(m.lastgroup, m.group()) for m in _SPARQL_TOKEN.finditer(text) if m.lastgroup != "ws"]
+        self.i = 0
+        self.namespaces = {}
+        self.patterns = []
+        self.filters = []
+        self.distinct = False
+        self.order_by = []
+        self.limit = None
+        self._parse()
+
+    # parsing
+
+    def _next(self):
+        if self.i >= len(self.tokens):
+            raise ValueError("unexpected end of the query")
+        token = self.tokens[self.i]
+        self.i += 1
+        return token
+
+    def _peek(self):
+        return self.tokens[self.i][1] if self.i < len(self.tokens) else None
+
+    def _keyword(self):
+        value = self._peek()
+        return value.upper() if value else None
+
+    def _expect(self, text):
+        kind, value = self._next()
+        if value.upper() != text.upper():
+            raise ValueError("expected %r, found %r" % (text, value))
+
+    def _parse(self):
+        while self._keyword() == "PREFIX":
+            self._next()
+            _, prefix = self._next()
+            _, iri = self._next()
+            self.namespaces[prefix[:-1]] = iri[1:-1]
+        self._expect("SELECT")
+        if self._keyword() == "DISTINCT":
+            self._next()
+            self.distinct = True
+        self.variables = []
+        while self._peek() not in ("{", None) and self._keyword() != "WHERE":
+            kind, value = self._next()
+            if value == "*":
+                self.variables = None
+            elif kind == "var":
+                self.variables.append("?" + value[1:])
+            else:
+                raise ValueError("unsupported projection %r" % value)
+        if self._keyword() == "WHERE":
+            self._next()
+        self._expect("{")
+        self._group()
+        if self._keyword() == "ORDER":
+            self._next()
+            self._expect("BY")
+            while self.i < len(self.tokens) and self.tokens[self.i][0] == "var":
+                self.order_by.append("?" + self._next()[1][1:])
+        if self._keyword() == "LIMIT":
+            self._next()
+            self.limit = int(self._next()[1])
+        if self.i < len(self.tokens):
+            raise ValueError("unsupported query text from %r" % self._peek())
+        if self.variables is None:
+            self.variables = []
+            for pattern in self.patterns:
+                for term in (pattern[0], pattern[2]) + ((pattern[1],) if isinstance(pattern[1], str) else ()):
+                    if isinstance(term, str) and term not in self.variables:
+                        self.variables.append(term)
+
+    def _group(self):
+        """ reads the patterns until the closing brace """
+        while True:
+            value = self._peek()
+            keyword = self._keyword()
+            if value is None:
+                raise ValueError("missing }")
+            if value == "}":
+                self._next()
+                return
+            if value == ".":
+                self._next()
+            elif keyword == "GRAPH":
+                self._next()
+                self._next()
+                self._expect("{")
+                self._group()
+            elif keyword == "FILTER":
+                self._next()
+                self._filter()
+            elif value == "{" or keyword in ("OPTIONAL", "UNION", "MINUS", "BIND", "VALUES", "SERVICE"):
+                raise ValueError("unsupported SPARQL: %s" % value)
+            else:
+                self._triples()
+
+    def _filter(self):
+        self._expect("(")
+        _, function = self._next()
+        function = function.lower()
+        if function not in _FILTERS:
+            raise ValueError("unsupported FILTER function %r" % function)
+        self._expect("(")
+        if self._keyword() == "STR":
+            self._next()
+            self._expect("(")
+            _, variable = self._next()
+            self._expect(")")
+        else:
+            _, variable = self._next()
+        self._expect(",")
+        kind, argument = self._next()
+        if kind != "string":
+            raise ValueError("FILTER %s needs a string argument" % function)
+        self._expect(")")
+        self._expect(")")
+        argument = _unescape(argument[1:-1])
+        if function == "regex":
+            argument = re.compile(argument)
+            self.filters.append(("?" + variable[1:], lambda value, pattern=argument: pattern.search(value) is not None))
+        else:
+            test = _FILTERS[function]
+            self.filters.append(("?" + variable[1:], lambda value, test=test, argument=argument: test(value, argument)))
+
+    def _triples(self):
+        subject = self._node()
+        while True:
+            path = self._verb()
+            while True:
+                self.patterns.append((subject, path, self._node()))
+                if self._peek() != ",":
+                    break
+                self._next()
+            if self._peek() != ";":
+                return
+            while self._peek() == ";":
+                self._next()
+            if self._peek() in (".", "}"):
+                return
+
+    def _iri(self, kind, value):
+        if kind == "iri":
+            return value[1:-1]
+        if kind == "pname":
+            prefix, _, local = value.partition(":")
+            if prefix not in self.namespaces:
+                raise ValueError("unknown prefix %r" % prefix)
+            return self.namespaces[prefix] + _unescape(local)
+        if kind == "name" and value == "a":
+            return RDF + "type"
+        raise ValueError("expected a uri, found %r" % value)
+
+    def _node(self):
+        kind, value = self._next()
+        if kind == "var":
+            return "?" + value[1:]
+        if kind == "string":
+            text = _unescape(value[1:-1])
+            if self._peek() and self._peek().startswith("@"):
+                term = typed_literal(text, lang=self._next()[1][1:])
+            elif self._peek() == "^^":
+                self._next()
+                term = typed_literal(text, datatype=self._iri(*self._next()))
+            else:
+                term = literal(text)
+        elif kind == "number":
+            term = typed_literal(value, datatype=XSD + "integer")
+        else:
+            term = self._iri(kind, value)
+        return ("id", self.store.id(term))
+
+    def _verb(self):
+        if self.tokens[self.i][0] == "var":
+            return "?" + self._next()[1][1:]
+        return self._path_alternative()
+
+    def _path_alternative(self):
+        paths = [self._path_sequence()]
+        while self._peek() == "|":
+            self._next()
+            paths.append(self._path_sequence())
+        return paths[0] if len(paths) == 1 else ("alt", tuple(paths))
+
+    def _path_sequence(self):
+        paths = [self._path_element()]
+        while self._peek() == "/":
+            self._next()
+            paths.append(self._path_element())
+        return paths[0] if len(paths) == 1 else ("seq", tuple(paths))
+
+    def _path_element(self):
+        inverse = self._peek() == "^"
+        if inverse:
+            self._next()
+        if self._peek() == "(":
+            self._next()
+            path = self._path_alternative()
+            self._expect(")")
+        else:
+            path = ("link", self.store.id(self._iri(*self._next())))
+        modifier = {"*": "star", "+": "plus", "?": "optional"}.get(self._peek())
+        if modifier:
+            self._next()
+            path = (modifier, path)
+        return ("inverse", path) if inverse else path
+
+    # evaluation
+
+    def _reach(self, path, node, forward):
+        """ set of the nodes reached from a node through a path, backwards when forward is False """
+        key = (path, node, forward)
+        result = self.reached.get(key)
+        if result is not None:
+            return result
+        kind, argument = path
+        if kind == "link":
+            if argument is None:
+                result = set()
+            elif forward:
+                result = set(o for _, _, o in self.store.match(node, argument, None))
+            else:
+                result = set(s for s, _, _ in self.store.match(None, argument, node))
+        elif kind == "inverse":
+            result = self._reach(argument, node, not forward)
+        elif kind == "alt":
+            result = set()
+            for step in argument:
+                result |= self._reach(step, node, forward)
+        elif kind == "seq":
+            result = set([node])
+            for step in (argument if forward else reversed(argument)):
+                frontier = set()
+                for n in result:
+                    frontier |= self._reach(step, n, forward)
+                result = frontier
+        elif kind == "optional":
+            result = set([node]) | self._reach(argument, node, forward)
+        else:
+            # star and plus: breadth first search, without the starting node for plus unless it is reached
+            result = set([node]) if kind == "star" else set()
+            todo = [node]
+            seen = set([node])
+            while todo:
+                n = todo.pop()
+                for m in self._reach(argument, n, forward):
+                    result.add(m)
+                    if m not in seen:
+                        seen.add(m)
+                        todo.append(m)
+        self.reached[key] = result
+        return result
+
+    def _cost(self, pattern, bound):
+        """ estimated number of results of a pattern once the variables in bound have values """
+        s, path, o = pattern
+        constant = lambda term: term[1] if isinstance(term, tuple) else None
+        s_bound = isinstance(s, tuple) or s in bound
+        o_bound = isinstance(o, tuple) or o in bound
+        if isinstance(path, str) or path[0] == "link":
+            p = None if isinstance(path, str) else path[1]
+            if isinstance(path, tuple) and p is None:
+                return 0
+            n = self.store.count(constant(s), p, constant(o))
+            # every bound variable divides the estimate
+            return n / (1 + 10 * (s in bound) + 10 * (o in bound) + 10 * (path in bound))
+        if s_bound or o_bound:
+            return len(self.store) ** 0.5
+        return len(self.store) * 10
+
+    def _plan(self):
+        """ orders the patterns: the cheapest one given the variables already bound comes first """
+        remaining = list(self.patterns)
+        plan = []
+        bound = set()
+        while remaining:
+            pattern = min(remaining, key=lambda pattern: self._cost(pattern, bound))
+            remaining.remove(pattern)
+            plan.append(pattern)
+            bound.update(term for term in pattern if isinstance(term, str))
+        return plan
+
+    def _solve(self, plan, k, binding):
+        if k == len(plan):
+            yield binding
+            return
+        s, path, o = plan[k]
+        value = lambda term: term[1] if isinstance(term, tuple) else binding.get(term)
+        s_id, o_id = value(s), value(o)
+        if isinstance(path, str) or path[0] == "link":
+            p_id = binding.get(path) if isinstance(path, str) else path[1]
+            if isinstance(path, tuple) and p_id is None:
+                return
+            matches = self.store.match(s_id, p_id, o_id)
+            for ms, mp, mo in matches:
+                new = self._bind(binding, ((s, ms), (path, mp), (o, mo)))
+                if new is not None:
+                    yield from self._solve(plan, k + 1, new)
+            return
+        if s_id is not None:
+            pairs = ((s_id, n) for n in self._reach(path, s_id, True) if o_id is None or n == o_id)
+        elif o_id is not None:
+            pairs = ((n, o_id) for n in self._reach(path, o_id, False))
+        else:
+            pairs = ((n, m) for n in self.store.subjects() for m in self._reach(path, n, True))
+        for ms, mo in pairs:
+            new = self._bind(binding, ((s, ms), (o, mo)))
+            if new is not None:
+                yield from self._solve(plan, k + 1, new)
+
+    def _bind(self, binding, values):
+        """ returns the binding extended with the values of the variables, or None when a value is not
+        the one already bound or does not pass the filters """
+        new = binding
+        for term, value in values:
+            if not isinstance(term, str):
+                continue
+            if term in new:
+                if new[term] != value:
+                    return None
+                continue
+            if new is binding:
+                new = dict(binding)
+            new[term] = value
+            for variable, test in self.filters:
+                if variable == term and not test(term_value(self.store.term(value))):
+                    return None
+        return new
+
+    def run(self):
+        """ returns the selected variables and the list of result rows, as terms """
+        self.reached = {}
+        if any(isinstance(term, tuple) and term[0] == "id" and term[1] is None
+               for pattern in self.patterns for term in (pattern[0], pattern[2])):
+            return self.variables, []
+        rows = []
+        seen = set()
+        term = self.store.term
+        for binding in self._solve(self._plan(), 0, {}):
+            row = tuple(binding.get(variable) for variable in self.variables)
+            if self.distinct:
+                if row in seen:
+                    continue
+                seen.add(row)
+            rows.append(row)
+            if self.limit is not None and not self.order_by and len(rows) >= self.limit:
+                break
+        rows = [tuple(None if i is None else term(i) for i in row) for row in rows]
+        if self.order_by:
+            keys = [self.variables.index(variable) for variable in self.order_by if variable in self.variables]
+            rows.sort(key=lambda row: tuple(row[k] or "" for k in keys))
+            if self.limit is not None:
+                rows = rows[:self.limit]
+        return self.variables, rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Loads RDF files into an embedded triple store and queries it')
+    parser.add_argument("--store", required=True, help="store folder")
+    parser.add_argument("--load", nargs="+", help="Turtle, N-Triples or RDF/XML files or folders loaded into a new store")
+    parser.add_argument("--query", help="SPARQL query")
+    parser.add_argument("--query_file", help="file with a SPARQL query")
+    parser.add_argument("--limit", type=int, default=50, help="maximum number of rows printed")
+    args = parser.parse_args()
+
+    if args.load:
+        missing = [path for path in args.load if not isdir(path) and not isfile(path)]
+        if missing:
+            parser.error("--load: no such file or folder: " + ", ".join(missing))
+        started = time.perf_counter()
+        writer = TripleStoreWriter()
+        for filename in [join(d, f) for path in args.load for d, f in input_files(path)]:
+            try:
+                writer.load(filename)
+            except (ValueError, ElementTree.ParseError) as ex:
+                print("Error in the following file: ", filename, ex)
+        n_triples = writer.save(args.store)
+        print("Loaded %d triples, %d terms from %d files in %.2f s" % (n_triples, len(writer.terms), writer.files,
+                                                                     time.perf_counter() - started))
+    text = args.query
+    if args.query_file:
+        with io.open(args.query_file, mode="r", encoding="utf-8") as f_in:
+            text = f_in.read()
+    if text:
+        store = TripleStore(args.store)
+        started = time.perf_counter()
+        try:
+            variables, rows = store.query(text)
+        except ValueError as ex:
+            parser.error("query: %s" % ex)
+        elapsed = time.perf_counter() - started
+        print("\t".join(variables))
+        for row in rows[:args.limit]:
+            print("\t".join("" if term is None else format_term(term) for term in row))
+        print("%d results in %.1f ms" % (len(rows), elapsed * 1000))
+        store.close()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Validates the json files written by vertical2json.py, also run by vertical2json.py --validate at the end
+of a conversion.
+
+The 5 files of a document (document, datalayer, terminals, tokens and sentences) are loaded together and
+checked in two ways:
+* schema: every file is validated against the schema named by its "$schema" value, corpusDocument.schema.json
+  or corpus.schema.json, read from --schema_dir. The validators are built once per process from the schema
+  files and reused for every file, instead of loading the schemas for every file as a generic validator
+  run file by file does. This needs the jsonschema module; without --schema_dir only the checks below run.
+* structure: invariants that a schema cannot express, checked in a single pass over the nodes:
+  - the layers reference each other: terminals -> datalayer, tokens -> terminals, sentences -> tokens.
+  - the terminals are contiguous: every terminal starts where the previous one ends.
+  - every token references an existing layer and an existing terminal (node).
+  - every sentence nodeRange is within the tokens and starts where the previous sentence ends.
+The documents are validated in batches by a pool of worker processes. In the exhaustive mode all the
+documents are validated; in the sampled mode only a fraction of them (--sample_rate), chosen from a hash
+of their names, so the same documents are picked on every run over the same files.
+
+How to run it:
+python -m sdllod19.validate_json --input <json folder> [--schema_dir <folder>] [--mode exhaustive|sampled [--sample_rate R]]
+                                 [--workers N] [--batch N] [--max_errors N]
+It prints the errors found and exits with status 1 when there is any.
+"""
+
+import io
+import sys
+import json
+import time
+import zlib
+import argparse
+from os import listdir
+from os.path import join, isfile, abspath
+from multiprocessing import Pool
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+FILE_TYPES = ("document", "datalayer", "terminals", "tokens", "sentences")
+SCHEMAS = ("corpusDocument.schema.json", "corpus.schema.json")
+SAMPLE_RATE = 0.05
+BATCH = 64
+
+# validators of the worker processes, built once by init_worker
+_validators = None
+
+
+def load_validators(schema_dir):
+    """ returns a dictionary schema name -> validator built from the schema files of a folder """
+    if jsonschema is None:
+        raise ImportError("the jsonschema module is needed to validate the files against the schemas")
+    validators = {}
+    for name in SCHEMAS:
+        with io.open(join(schema_dir, name), mode="r", encoding="utf-8") as f_in:
+            schema = json.load(f_in)
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        # the schemas can reference each other by file name
+        resolver = jsonschema.RefResolver(base_uri="file://" + abspath(schema_dir) + "/", referrer=schema)
+        validators[name] = cls(schema, resolver=resolver)
+    return validators
+
+
+def document_prefixes(folder):
+    """ returns the sorted output prefixes (<input_filename>.<doc_id>) of the documents of a folder of json
+    files, with the file types found for each one """
+    prefixes = {}
+    for filename in listdir(folder):
+        prefix, _, file_type = filename[:-len(".json")].rpartition(".")
+        if filename.endswith(".json") and file_type in FILE_TYPES and isfile(join(folder, filename)):
+            prefixes.setdefault(prefix, set()).add(file_type)
+    return sorted(prefixes.items())
+
+
+def sampled(prefix, rate):
+    """ True when a document is part of the sample: the choice only depends on its prefix """
+    return (zlib.crc32(prefix.encode("utf-8")) & 0xffffffff) < rate * 0x100000000
+
+
+def check_structure(layers):
+    """ returns the errors of the invariants between and within the layers of a document """
+    errors = []
+    datalayer, terminals_json, tokens_json, sentences_json = (layers["datalayer"], layers["terminals"],
+                                                              layers["tokens"], layers["sentences"])
+    if terminals_json["content"]["dataLayerRef"] != datalayer["id"]:
+        errors.append("terminals: dataLayerRef %r is not the datalayer %r" % (terminals_json["content"]["dataLayerRef"], datalayer["id"]))
+    if tokens_json["content"]["layerRefs"] != [terminals_json["id"]]:
+        errors.append("tokens: layerRefs %r are not the terminals %r" % (tokens_json["content"]["layerRefs"], terminals_json["id"]))
+    if sentences_json["content"]["layerRefs"] != [tokens_json["id"]]:
+        errors.append("sentences: layerRefs %r are not the tokens %r" % (sentences_json["content"]["layerRefs"], tokens_json["id"]))
+
+    terminals = terminals_json["content"]["terminals"]
+    end = 0
+    for i, terminal in enumerate(terminals):
+        if terminal["start"] != end or terminal["end"] < terminal["start"]:
+            errors.append("terminals: terminal %d spans %d-%d, expected to start at %d" % (i, terminal["start"], terminal["end"], end))
+            break
+        end = terminal["end"]
+
+    tokens = tokens_json["content"]["annotationNodes"]
+    n_layers, n_terminals = len(tokens_json["content"]["layerRefs"]), len(terminals)
+    bad = next(((i, reference) for i, token in enumerate(tokens) for reference in token["relation"]["references"]
+                if not 0 <= reference["layer"] < n_layers or not 0 <= reference["node"] < n_terminals), None)
+    if bad is not None:
+        i, reference = bad
+        errors.append("tokens: token %d references node %d of layer %d, there are %d terminals" % (
+            i, reference["node"], reference["layer"], n_terminals))
+
+    end = 0
+    for i, sentence in enumerate(sentences_json["content"]["annotationNodes"]):
+        node_range = sentence["relation"]["references"][0]["nodeRange"]
+        if node_range["start"] != end or not node_range["start"] <= node_range["end"] <= len(tokens):
+            errors.append("sentences: sentence %d has nodeRange %d-%d, expected to start at %d and end by %d" % (
+                i, node_range["start"], node_range["end"], end, len(tokens)))
+            break
+        end = node_range["end"]
+    return errors
+
+
+def validate_document(folder, prefix, file_types, validators=None):
+    """ returns the errors of the json files of a document, as a list of (prefix, message) """
+    missing = [file_type for file_type in FILE_TYPES if file_type not in file_types]
+    if missing:
+        return [(prefix, "missing files: " + ", ".join(missing))]
+    layers = {}
+    errors = []
+    for file_type in FILE_TYPES:
+        try:
+            with io.open(join(folder, prefix + "." + file_type + ".json"), mode="r", encoding="utf-8") as f_in:
+                data = layers[file_type] = json.load(f_in)
+        except ValueError as ex:
+            errors.append((prefix, "%s: not valid json: %s" % (file_type, ex)))
+            continue
+        if validators is not None:
+            validator = validators.get(data.get("$schema"))
+            if validator is None:
+                errors.append((prefix, "%s: unknown schema %r" % (file_type, data.get("$schema"))))
+                continue
+            for error in validator.iter_errors(data):
+                errors.append((prefix, "%s: %s at /%s" % (file_type, error.message, "/".join(str(p) for p in error.absolute_path))))
+    if errors:
+        return errors
+    try:
+        errors.extend((prefix, message) for message in check_structure(layers))
+    except (KeyError, IndexError, TypeError) as ex:
+        errors.append((prefix, "unexpected structure: %s %s" % (type(ex).__name__, ex)))
+    return errors
+
+
+def init_worker(schema_dir):
+    global _validators
+    _validators = load_validators(schema_dir) if schema_dir else None
+
+
+def validate_batch(job):
+    """ worker function: validates a batch of documents, returns the number of documents and the errors """
+    folder, batch = job
+    errors = []
+    for prefix, file_types in batch:
+        errors.extend(validate_document(folder, prefix, file_types, _validators))
+    return len(batch), errors
+
+
+def validate_folder(folder, schema_dir=None, mode="exhaustive", sample_rate=SAMPLE_RATE, workers=1, batch=BATCH):
+    """ validates the documents of a folder of json files. Returns the number of documents validated and
+    the list of (prefix, message) errors """
+    documents = document_prefixes(folder)
+    if mode == "sampled":
+        documents = [document for document in documents if sampled(document[0], sample_rate)]
+    jobs = [(folder, documents[i:i + batch]) for i in range(0, len(documents), batch)]
+    n_documents = 0
+    errors = []
+    if workers > 1:
+        with Pool(workers, initializer=init_worker, initargs=(schema_dir,)) as pool:
+            for n, batch_errors in pool.imap_unordered(validate_batch, jobs):
+                n_documents += n
+                errors.extend(batch_errors)
+    else:
+        init_worker(schema_dir)
+        for job in jobs:
+            n, batch_errors = validate_batch(job)
+            n_documents += n
+            errors.extend(batch_errors)
+    return n_documents, sorted(errors)
+
+
+def add_arguments(parser):
+    """ adds --schema_dir, --sample_rate and --batch to an argparse parser """
+    parser.add_argument("--schema_dir", help="folder with corpusDocument.schema.json and corpus.schema.json (needs jsonschema)")
+    parser.add_argument("--sample_rate", type=float, default=SAMPLE_RATE, help="fraction of the documents validated in the sampled mode")
+    parser.add_argument("--batch", type=int, default=BATCH, help="documents per batch of a worker")
+
+
+def report(n_documents, errors, seconds, max_errors=20, f_out=sys.stdout):
+    for prefix, message in errors[:max_errors]:
+        f_out.write("%s: %s\n" % (prefix, message))
+    if len(errors) > max_errors:
+        f_out.write("... %d more errors\n" % (len(errors) - max_errors))
+    f_out.write("Validated %d documents in %.2f s: %d errors\n" % (n_documents, seconds, len(errors)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validates the json files written by vertical2json.py')
+    parser.add_argument("--input", required=True, help="folder of json files")
+    parser.add_argument("--mode", choices=["exhaustive", "sampled"], default="exhaustive", help="validate all the documents or a sample")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--max_errors", type=int, default=20, help="maximum number of errors printed")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.schema_dir and jsonschema is None:
+        parser.error("--schema_dir needs the jsonschema module")
+
+    started = time.perf_counter()
+    n_documents, errors = validate_folder(args.input, args.schema_dir, args.mode, args.sample_rate, args.workers, args.batch)
+    report(n_documents, errors, time.perf_counter() - started, args.max_errors)
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Converts a vertical file taken from the Komodo corpus to several output formats reading it only once.
+It replaces running vertical2json.py, vertical2conll.py and metadata2rdf.py one after the other over the
+same input: the vertical file is read and split once, and every document is sent to the selected sinks.
+
+How to run it:
+python -m sdllod19.vertical2all --input <input folder|input file> [--json_dir <folder> [--compact] [--batch_tokens N]] [--conll_dir <folder>]
+                                [--metadata_dir <folder>] [--conllrdf_dir <folder> [--olia <index file> [--olia_models <files>]]]
+                                [--tokens_dir <folder> [--tokens_index]] [--nquads_dir <folder> [--shard_quads N]] [--decompress_threads N]
+                                [--dedup_index <folder> [--dedup_threshold T] [--dedup_mode skip|link]]
+                                [--follow [--checkpoint <file>] [--poll_interval S] [--idle_timeout S]]
+
+It takes the following parameters:
+* input: it can be either a file or a folder. If it is a folder the script will read all files in the folder.
+  Files compressed with gzip, xz or zstd are decompressed while they are read (see compressed_input.py).
+* decompress_threads: optional number of threads decompressing a multi member gzip input file.
+* json_dir: output folder for the Json files, same output as vertical2json.py.
+* compact: optional flag to write the json files without indentation.
+* batch_tokens: optional number of tokens of a document converted to json at once (see vertical2json.py).
+* conll_dir: output folder for the .conll files, same output as vertical2conll.py.
+* metadata_dir: output folder for the metadata.ttl file, same triples as metadata2rdf.py. A single file
+  is written for all the input files.
+* conllrdf_dir: output folder for the CoNLL-RDF .ttl files, written by conllrdf.py instead of running the
+  CoNLL-RDF toolchain over the .conll files.
+* olia: optional json file with the OLiA index (see olia_index.py). The OLiA annotations of the POS tags
+  are then added to the CoNLL-RDF words. The index is built, or rebuilt when the models have changed,
+  from the files given with olia_models, by default penn.owl and penn-link.rdf of the package.
+* tokens_dir: output folder for the columnar token store of all the input files (see token_store.py).
+* tokens_index: optional flag to build the inverted index of the token store for concordance.py once it is written.
+* nquads_dir: output folder for the CoNLL-RDF triples (with the OLiA annotations when olia is given) and the
+  metadata triples of all the documents as gzip compressed N-Quads shards for the bulk loaders of the
+  triple stores, with a named graph per document (see nquads_export.py).
+* shard_quads: optional number of quads of an N-Quads shard.
+* dedup_index: optional folder of the index of near_duplicates.py. The documents whose estimated similarity
+  with a document of the index (of a previous run or of this one) is at least dedup_threshold are near
+  duplicates: with dedup_mode skip they are not converted, with link only their metadata triples are
+  written, with a dcterms:isVersionOf link to the canonical document. The other documents are added to
+  the index, and the duplicates are listed in its duplicates.jsonl file.
+* follow: optional flag to keep reading the input file, which must be an uncompressed file (it can be
+  created later), as documents are appended to it (see follow.py): the new documents are converted once
+  their </doc> line is written, and the byte offset after the last document converted is saved in the
+  checkpoint file (by default <input file>.checkpoint.json) so that a restart continues from there. The
+  metadata triples are then added to the metadata.ttl file of the previous run, and the N-Quads shards to
+  the ones of the previous run. poll_interval is the number of seconds between two reads of the file, and
+  idle_timeout an optional number of seconds without new documents after which it stops; it also stops on
+  Ctrl-C or SIGTERM. A token store is written once for all the documents, so tokens_dir cannot be
+  followed.
+At least one of the output folders must be given.
+
+A sink is an object with the following methods, called by read_vertical while the input is read:
+* start_document(source, doc_id, header_line, header): a new document starts. source is the name of the
+  input file, header_line the <doc ...> line and header the dictionary of its attributes.
+* write_sentence(lines, rows): a sentence is complete. lines are the lines of the vertical file and rows
+  the same lines split in columns.
+* end_document(): the current document is complete.
+* abort_document(): the current document was not complete (no </doc> line); any output already
+  written for it must be discarded.
+* close(): there is no more input.
+* link_document(source, doc_id, header_line, header, canonical_id): optional, a near duplicate of the
+  document canonical_id was found and is not converted (--dedup_mode link).
+* flush(): optional, the output written so far must be written to the files before the checkpoint of
+  --follow is saved.
+Sinks that do not need the sentences set reads_sentences to False; when no sink needs them the token
+lines are skipped without being split.
+"""
+
+import io
+import os
+import signal
+from os import makedirs
+from os.path import isfile, isdir, join, basename, dirname, abspath
+import argparse
+
+from .conllrdf import ConllRdfSink
+from .olia_index import load_index
+from .token_store import TokenStoreSink
+from .nquads_export import NQuadsSink, SHARD_QUADS
+from . import compressed_input
+from .compressed_input import open_vertical, detect_compression, source_name
+from . import follow
+from .follow import Checkpoint, checkpoint_filename, follow_documents
+from . import metadata2rdf
+from . import vertical2json
+from . import near_duplicates
+from .near_duplicates import NearDuplicateIndex, DuplicateFilter
+from .pipeline import input_files, read_events, DOCUMENT_START, SENTENCE, DOCUMENT_END
+
+OLIA_MODELS = [join(dirname(abspath(__file__)), "penn.owl"), join(dirname(abspath(__file__)), "penn-link.rdf")]
+
+
+class JsonSink(object):
+    """ writes the 5 json files of every document, as vertical2json.py does """
+    reads_sentences = True
+
+    def __init__(self, out_dir, indent=2, batch_tokens=0):
+        self.out_dir = out_dir
+        self.indent = indent
+        self.batch_tokens = batch_tokens
+        self.writer = None
+
+    def start_document(self, source, doc_id, header_line, header):
+        self.writer = vertical2json.JsonDocumentWriter(join(self.out_dir, source + "." + doc_id), doc_id,
+                                                       vertical2json.document_metadata(header), self.indent,
+                                                       self.batch_tokens)
+
+    def write_sentence(self, lines, rows):
+        self.writer.write_sentence(vertical2json.rows_segment(rows))
+
+    def end_document(self):
+        self.writer.close()
+        self.writer = None
+
+    def abort_document(self):
+        self.writer.abort()
+        self.writer = None
+
+    def close(self):
+        pass
+
+
+class ConllSink(object):
+    """ writes a .conll file for every document, as vertical2conll.py does """
+    reads_sentences = True
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.f_conll = None
+
+    def start_document(self, source, doc_id, header_line, header):
+        self.f_conll = io.open(join(self.out_dir, doc_id + ".conll"), mode="w", encoding="utf-8")
+        self.f_conll.write("# " + header_line)
+
+    def write_sentence(self, lines, rows):
+        self.f_conll.writelines(lines)
+        self.f_conll.write("\n")
+
+    def end_document(self):
+        self.f_conll.close()
+        self.f_conll = None
+
+    def abort_document(self):
+        self.f_conll.close()
+        os.remove(self.f_conll.name)
+        self.f_conll = None
+
+    def close(self):
+        pass
+
+
+class MetadataSink(object):
+    """ writes the metadata triples of every document to a single metadata.ttl file, as metadata2rdf.py does """
+    reads_sentences = False
+
+    def __init__(self, out_dir, append=False):
+        self.writer = metadata2rdf.MetadataWriter(metadata2rdf.output_filename(out_dir), append=append)
+        self.doc_id = self.metadata = None
+
+    def start_document(self, source, doc_id, header_line, header):
+        self.doc_id = doc_id
+        self.metadata = metadata2rdf.document_metadata(header)
+
+    def write_sentence(self, lines, rows):
+        pass
+
+    def end_document(self):
+        self.writer.write(self.doc_id, self.metadata)
+
+    def link_document(self, source, doc_id, header_line, header, canonical_id):
+        if self.writer.write(doc_id, metadata2rdf.document_metadata(header)):
+            self.writer.write_link(doc_id, canonical_id)
+
+    def abort_document(self):
+        pass
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+
+def read_vertical(f_in, source, sinks, duplicates=None):
+    """ reads a vertical file with pipeline.read_events and sends every document to all the sinks.
+    It yields the doc_id of every complete document. duplicates is an optional DuplicateFilter
+    (see near_duplicates.py): the near duplicate documents are not sent to the sinks """
+    reads_sentences = any(sink.reads_sentences for sink in sinks)
+    events = read_events(f_in, source, reads_sentences or duplicates is not None)
+    if duplicates is not None:
+        events = duplicates.filter(events)
+    document = None
+    try:
+        for kind, document, lines, rows in events:
+            if kind == SENTENCE:
+                for sink in sinks:
+                    if sink.reads_sentences:
+                        sink.write_sentence(lines, rows)
+            elif kind == DOCUMENT_START:
+                for sink in sinks:
+                    sink.start_document(source, document.doc_id, document.header_line, document.header)
+            elif kind == DOCUMENT_END:
+                for sink in sinks:
+                    sink.end_document()
+                doc_id, document = document.doc_id, None
+                yield doc_id
+            else:
+                for sink in sinks:
+                    sink.abort_document()
+                document = None
+    finally:
+        if document is not None:
+            for sink in sinks:
+                sink.abort_document()
+
+
+def add_sink_arguments(parser):
+    """ adds the command line parameters that select the sinks to an argparse parser """
+    parser.add_argument("--json_dir", help="output folder for the json files")
+    parser.add_argument("--compact", action="store_true", help="write the json files without indentation")
+    parser.add_argument("--batch_tokens", type=int, default=0, help="convert the sentences of a document to json in batches of N tokens")
+    parser.add_argument("--conll_dir", help="output folder for the conll files")
+    parser.add_argument("--metadata_dir", help="output folder for the metadata.ttl file")
+    parser.add_argument("--conllrdf_dir", help="output folder for the CoNLL-RDF ttl files")
+    parser.add_argument("--olia", help="OLiA index file, to add the OLiA annotations to the CoNLL-RDF files and quads")
+    parser.add_argument("--olia_models", nargs="+", default=OLIA_MODELS, help="OLiA annotation and linking models")
+    parser.add_argument("--tokens_dir", help="output folder for the columnar token store")
+    parser.add_argument("--tokens_index", action="store_true", help="build the inverted index of the token store")
+    parser.add_argument("--nquads_dir", help="output folder for the N-Quads shards of the CoNLL-RDF and metadata triples")
+    parser.add_argument("--shard_quads", type=int, default=SHARD_QUADS, help="number of quads of an N-Quads shard")
+
+
+def make_sinks(args, append=False):
+    """ creates the sinks selected with the parameters added by add_sink_arguments, and their output folders.
+    With append the metadata triples are added to an existing metadata.ttl file, and the N-Quads shards to
+    the existing ones """
+    sinks = []
+    if args.json_dir:
+        makedirs(args.json_dir, exist_ok=True)
+        sinks.append(JsonSink(args.json_dir, None if args.compact else 2, args.batch_tokens))
+    if args.conll_dir:
+        makedirs(args.conll_dir, exist_ok=True)
+        sinks.append(ConllSink(args.conll_dir))
+    if args.metadata_dir:
+        makedirs(args.metadata_dir, exist_ok=True)
+        sinks.append(MetadataSink(args.metadata_dir, append))
+    olia = load_index(args.olia, args.olia_models) if args.olia and (args.conllrdf_dir or args.nquads_dir) else None
+    if args.conllrdf_dir:
+        makedirs(args.conllrdf_dir, exist_ok=True)
+        sinks.append(ConllRdfSink(args.conllrdf_dir, olia=olia))
+    if args.nquads_dir:
+        makedirs(args.nquads_dir, exist_ok=True)
+        sinks.append(NQuadsSink(args.nquads_dir, args.shard_quads, olia=olia, append=append))
+    if args.tokens_dir:
+        sinks.append(TokenStoreSink(args.tokens_dir, args.tokens_index))
+    return sinks
+
+
+def link_duplicates(sinks):
+    """ returns the on_duplicate function of a DuplicateFilter that sends the near duplicates to the sinks
+    that link them to their canonical document """
+    linking = [sink for sink in sinks if hasattr(sink, "link_document")]
+
+    def on_duplicate(source, doc_id, header_line, header, canonical_id, similarity):
+        for sink in linking:
+            sink.link_document(source, doc_id, header_line, header, canonical_id)
+    return on_duplicate
+
+
+def follow_vertical(filename, sinks, checkpoint, duplicates=None, poll_interval=follow.POLL_INTERVAL, idle_timeout=None):
+    """ converts the documents appended to a vertical file as they are completed (see follow.py). It yields
+    the number of documents converted from every new part of the file, once the sinks and the index of
+    duplicates have been flushed; the checkpoint is saved when the next part is asked for """
+    source = source_name(basename(filename), None)
+    for lines in follow_documents(filename, checkpoint, poll_interval, idle_timeout):
+        n_docs = sum(1 for _ in read_vertical(lines, source, sinks, duplicates))
+        for sink in sinks:
+            if hasattr(sink, "flush"):
+                sink.flush()
+        if duplicates is not None:
+            duplicates.index.flush()
+        yield n_docs
+
+
+def main(argv=None):
+    """ if the input parameter is a folder, reads all the files in the folder. Every document found in the
+    vertical files is sent to the sinks selected with the output folder parameters. """
+    parser = argparse.ArgumentParser(description='Reads input file in vertical format once and outputs json, conll, metadata rdf and conll-rdf files')
+    parser.add_argument("--input", help="input filename")
+    add_sink_arguments(parser)
+    compressed_input.add_arguments(parser)
+    near_duplicates.add_arguments(parser)
+    follow.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    checkpoint = None
+    if args.follow:
+        if not args.input or isdir(args.input) or (isfile(args.input) and detect_compression(args.input)):
+            parser.error("--follow needs an uncompressed input file")
+        if args.tokens_dir:
+            parser.error("--follow cannot be used with --tokens_dir")
+        checkpoint = Checkpoint(args.checkpoint or checkpoint_filename(args.input))
+    # a run that follows the input again continues the metadata.ttl file and the N-Quads shards of the previous one
+    sinks = make_sinks(args, append=checkpoint is not None and checkpoint.offset > 0)
+    if not sinks:
+        parser.error("at least one of --json_dir, --conll_dir, --metadata_dir, --conllrdf_dir, --tokens_dir and --nquads_dir is required")
+    duplicates = None
+    if args.dedup_index:
+        index = NearDuplicateIndex(args.dedup_index, args.dedup_threshold)
+        duplicates = DuplicateFilter(index, link_duplicates(sinks) if args.dedup_mode == "link" else None)
+
+    print('Reading from:', args.input)
+
+    filenames_list = []
+    # a followed file is read by follow_vertical
+    if args.follow:
+        # stopped as with Ctrl-C: the outputs are closed, the checkpoint is the one of the last documents converted
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            for n_docs in follow_vertical(args.input, sinks, checkpoint, duplicates, args.poll_interval, args.idle_timeout):
+                print("Converted", n_docs, "documents")
+        except KeyboardInterrupt:
+            pass
+    else:
+        filenames_list = input_files(args.input)
+
+    for d, f in filenames_list:
+        # open input file
+        f_input = open_vertical(join(d, f), args.decompress_threads)
+        print('Reading :', join(d, f))
+        n_docs = 0
+        for doc_id in read_vertical(f_input, source_name(f, detect_compression(join(d, f))), sinks, duplicates):
+            n_docs += 1
+        f_input.close()
+        print("Converted", n_docs, "documents")
+    for sink in sinks:
+        sink.close()
+    if duplicates is not None:
+        duplicates.index.close()
+        print("Found", duplicates.index.duplicates, "near duplicates,", len(duplicates.index), "documents in the index")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Converts a vertical file taken from the Komodo corpus to CoNLL. It is a command line over the stages of
+pipeline.py (read_documents and write_conll), which can also be chained with other stages in a single
+process.
+
+How to run it:
+python -m sdllod19.vertical2conll --input <input folder|input file> --out_dir <output_folder> [--decompress_threads N] [--quiet] [--stats text|json]
+                                  [--profile <file> [--profile_every N]] [--follow [--checkpoint <file>] [--poll_interval S] [--idle_timeout S]]
+
+It takes the following parameters:
+* input: it can be either a file or a folder. If it is a folder the script will read all files in the folder.
+  Files compressed with gzip, xz or zstd are decompressed while they are read (see compressed_input.py).
+* decompress_threads: optional number of threads decompressing a multi member gzip input file.
+* out_dir: the output folder where to store the .conll files.
+* quiet, stats, profile, profile_every: see instrumentation.py.
+* follow, checkpoint, poll_interval, idle_timeout: optional flag to keep reading the input file, which must
+  be an uncompressed file, as documents are appended to it (see follow.py and vertical2all.py --follow).
+  The .conll file of a new document is written once its </doc> line is written, and the byte offset after
+  the last document written is saved in the checkpoint file, by default <input file>.checkpoint.json.
+
+The script creates a <doc_id>.conll file for each document extracted from the vertical file: the <doc ...>
+line as a comment, then the token lines of every sentence followed by an empty line.
+
+Input vertical files have the format shown below. They can contain more than one document, each having several sentences.
+Every token of a sentence is in a separate line.
+Each line has 5 columns: word, token, lemma, PoS and lemma-PoS
+Note that komodo vertical files are already tokenized, hence words and tokens are the same string.
+```
+<doc
+   title="..."
+   url="..."
+   genre="..."
+   domain="..."
+   country="..."
+   city="..."
+   content_source="..."
+   document_source="...."
+   time_of_publication="..."
+   month_of_publication="..."
+   time_of_crawling="..."
+   primary_doc_id="...">
+    <s>
+        word1   token1  lemma1  pos1
+        word2   token2  lemma2  pos2
+        word3   token3  lemma3  pos3
+        ...
+    </s>
+    <s>
+        word1   token1  lemma1  pos1
+        word2   token2  lemma2  pos2
+        word3   token3  lemma3  pos3
+        ...
+    </s>
+    ...
+</doc>
+<doc ...
+    <s>
+        word1   token1  lemma1  pos1
+        word2   token2  lemma2  pos2
+        word3   token3  lemma3  pos3
+        ...
+    </s>
+    ...
+</doc>
+```
+"""
+
+import signal
+from os import makedirs
+from os.path import join, isdir, isfile, basename
+import argparse
+
+from . import compressed_input
+from .compressed_input import detect_compression, source_name
+from . import instrumentation
+from . import follow
+from .follow import Checkpoint, checkpoint_filename, follow_documents
+from .pipeline import input_files, parse_documents, read_documents, conll_lines, write_conll
+
+
+def read_document(f_in):
+    """ yields the doc_id and the lines of the .conll file of every document of a vertical file """
+    for document in parse_documents(f_in):
+        yield document.doc_id, conll_lines(document)
+
+
+def write_document(segments, f_conll):
+    f_conll.writelines(segments)
+
+
+def convert_followed(filename, out_dir, checkpoint, poll_interval=follow.POLL_INTERVAL, idle_timeout=None):
+    """ converts the documents appended to a vertical file as they are completed (see follow.py). It yields
+    the documents of every new part of the file once their .conll files are written; the checkpoint is
+    saved when the next part is asked for """
+    source = source_name(basename(filename), None)
+    for lines in follow_documents(filename, checkpoint, poll_interval, idle_timeout):
+        yield list(write_conll(parse_documents(lines, source), out_dir))
+
+
+def main(argv=None):
+    """ if the input parameter is a folder, reads all the files in the folder and writes a .conll file for
+    every document found in the vertical files """
+    parser = argparse.ArgumentParser(description='Reads input file in vertical format and outputs a conll file per document')
+    parser.add_argument("--input", help="input filename")
+    parser.add_argument("--out_dir", help="output folder")
+    compressed_input.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    follow.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.follow and (not args.input or isdir(args.input) or (isfile(args.input) and detect_compression(args.input))):
+        parser.error("--follow needs an uncompressed input file")
+
+    if not args.quiet:
+        print('Reading from:', args.input)
+        print('Writing to:', args.out_dir)
+    makedirs(args.out_dir, exist_ok=True)
+
+    instrumentation.start(args)
+    if args.follow:
+        checkpoint = Checkpoint(args.checkpoint or checkpoint_filename(args.input))
+        # stopped as with Ctrl-C: the checkpoint is the one of the last documents written
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            for documents in convert_followed(args.input, args.out_dir, checkpoint, args.poll_interval, args.idle_timeout):
+                if not args.quiet:
+                    for document in documents:
+                        print("Wrote files with prefix", join(args.out_dir, document.doc_id))
+        except KeyboardInterrupt:
+            pass
+    else:
+        for d, f in input_files(args.input):
+            if not args.quiet:
+                print('Reading :', join(d, f))
+            for document in write_conll(read_documents(join(d, f), args.decompress_threads), args.out_dir):
+                if not args.quiet:
+                    print("Wrote files with prefix", join(args.out_dir, document.doc_id))
+    instrumentation.finish(args)
+
+
+if __name__ == '__main__':
+    main()
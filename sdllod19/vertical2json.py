@@ -0,0 +1,868 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Converts a vertical file taken from the Komodo corpus to Json.
+
+How to run it:
+python -m sdllod19.vertical2json --input <input folder|input file> --out_dir <output_folder> [--workers N] [--incremental [--manifest <file>]]
+                                 [--pack] [--writer_threads N] [--batch_tokens N] [--decompress_threads N] [--validate exhaustive|sampled [--schema_dir <folder>]]
+                                 [--follow [--checkpoint <file>] [--poll_interval S] [--idle_timeout S]]
+                                 [--quiet] [--stats text|json] [--profile <file> [--profile_every N]]
+
+It takes the following parameters:
+* input: it can be either a file or a folder. If it is a folder the script will read all files in the folder.
+  Files compressed with gzip, xz or zstd are decompressed while they are read (see compressed_input.py);
+  their outputs are named after the input filename without the .gz, .xz, .zst or .zstd extension.
+* out_dir: the output folder where to store the Json files.
+* compact: optional flag to write the json files without indentation, which makes them much smaller.
+* workers: optional number of worker processes. When it is greater than 1 every input file is split into
+  byte ranges starting at a "<doc " line and the ranges are converted in parallel. The output files are the
+  same as the ones of a serial run (document ids are expected to be unique within an input file).
+  Compressed input files are not split, each one is converted by a single worker.
+* incremental: optional flag to only convert the documents that changed since the last run, using the
+  manifest of the output folder (see manifest.py). Unchanged documents are skipped, documents converted
+  with other output options (compact, batch_tokens) and missing or partial outputs are written again, and
+  the outputs of documents no longer found in an input file, or of input files no longer found in the
+  input folder, are removed. The input files must not be compressed.
+* manifest: optional manifest file for incremental runs, by default manifest.jsonl in the output folder.
+* decompress_threads: optional number of threads decompressing a multi member gzip input file.
+* writer_threads: optional number of threads that write the output files in the background while the
+  next documents are parsed (see background_writer.py). 0, the default, writes them from the parsing thread.
+* batch_tokens: optional number of tokens converted at once. By default every sentence is converted as soon
+  as it is read. With N > 0 the sentences of a document are kept until they have N tokens, or until the end
+  of the document, and the offsets of all their terminals, tokens and sentences are computed together with
+  cumulative sums (with numpy when it is installed). The json is then written from the arrays of offsets,
+  which is faster on long documents. The output files are the same.
+* validate: optional validation of the json files of the output folder once they are all written, of all the
+  documents (exhaustive) or of a sample of them (sampled, see --sample_rate), with --workers processes. See
+  validate_json.py for the checks and for --schema_dir, --sample_rate and --batch. The script exits with
+  status 1 when there are errors.
+* follow, checkpoint, poll_interval, idle_timeout: optional flag to keep reading the input file, which must
+  be an uncompressed file, as documents are appended to it (see follow.py and vertical2all.py --follow).
+  The files of a new document are written once its </doc> line is written, and the byte offset after the
+  last document written is saved in the checkpoint file, by default <input file>.checkpoint.json. It cannot
+  be used with --workers, --incremental or --pack.
+* quiet, stats, profile, profile_every: see instrumentation.py. --quiet removes the lines printed per input
+  file and per document, --stats text|json prints the counters and timers of the run at the end.
+* pack: optional flag to write a single <input_filename>.pack file per input file (one per byte range
+  with --workers, named <input_filename>.<range>.pack) instead of 5 files per document. See
+  packed_corpus.py for the format and the reader.
+
+The script creates 5 different files for each document extracted from the vertical file:
+document, datalayer, terminals, tokens and sentences.
+Each filename has the following patterns:
+```<input_filename>.<doc_id>.<file_type>.json``` where file_type is one of the above types of output files,
+and the doc_id is extracted from the vertical file (see below).
+
+Input vertical files have the format shown below. They can contain more than one document, each having several sentences.
+Every token of a sentence is in a separate line.
+Each line has 5 columns: word, token, lemma, PoS and lemma-PoS
+Note that komodo vertical files are already tokenized, hence words and tokens are the same string.
+```
+<doc
+   title="..."
+   url="..."
+   genre="..."
+   domain="..."
+   country="..."
+   city="..."
+   content_source="..."
+   document_source="...."
+   time_of_publication="..."
+   month_of_publication="..."
+   time_of_crawling="..."
+   primary_doc_id="...">
+    <s>
+        word1   token1  lemma1  pos1
+        word2   token2  lemma2  pos2
+        word3   token3  lemma3  pos3
+        ...
+    </s>
+    <s>
+        word1   token1  lemma1  pos1
+        word2   token2  lemma2  pos2
+        word3   token3  lemma3  pos3
+        ...
+    </s>
+    ...
+</doc>
+<doc ...
+    <s>
+        word1   token1  lemma1  pos1
+        word2   token2  lemma2  pos2
+        word3   token3  lemma3  pos3
+        ...
+    </s>
+    ...
+</doc>
+```
+"""
+
+import io
+import os
+import sys
+import time
+import signal
+from os import makedirs
+from os.path import join, isdir, isfile, basename, getsize
+from time import perf_counter
+import argparse
+from itertools import accumulate, chain
+from multiprocessing import Pool
+import json
+from json.encoder import encode_basestring_ascii
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .doc_header import parse_header, HeaderError
+from .manifest import Manifest, MANIFEST, document_digests
+from . import validate_json
+from . import compressed_input
+from .compressed_input import open_vertical, detect_compression, source_name
+from . import instrumentation
+from .instrumentation import stats
+from . import follow
+from .follow import Checkpoint, checkpoint_filename, follow_documents
+from .pipeline import input_files, read_events, DOCUMENT_START, SENTENCE, DOCUMENT_END, DOCUMENT_ABORT
+
+
+def document_metadata(header):
+    """ converts the attributes of a <doc ...> line to the json metadata structure defined for the corpus data model """
+    return {
+        "title": header.get("title", ""),
+        "sourceUrl": header.get("url", ""),
+        "documentSource": header.get("document_source", ""),
+        "language": "en",
+        "script": "lat",
+        "datePublished": header.get("time_of_publication", ""),
+        "monthPublished": header.get("month_of_publication", ""),
+        "labels": [],
+        "contentSource": header.get("content_source", ""),
+        "dateDownloaded": header.get("time_of_crawling", ""),
+        "dateIngested": ""
+    }
+
+
+def process_document(document):
+    """ takes the <doc ...> line with document information and converts it to the json
+    metadata structure defined for the corpus data model. It also returns the doc_id """
+
+    try:
+        header = parse_header(document)
+        doc_id = header["primary_doc_id"]
+    except (HeaderError, KeyError) as ex:
+        print("Error in the following document: ", document, ex)
+        return None, None
+    return doc_id, document_metadata(header)
+
+
+def create_terminals(list_of_words, start_idx):
+    """ from an array of words it creates the json list that contains the same array of words.
+    Note that the method adds a space " " terminal after each word. That's because we are generating
+    the json from a vertical file where we only have tokens. Due the lack of the original source text,
+    we assume each token is separated by a space, which is true in most cases but is not the case for
+    symbols, punctuation marks etc.
+    """
+    terminals = []
+    i = start_idx
+    for word in list_of_words:
+        terminals.append({"start": i, "end": i+len(word)+1, "string": word})
+        i = i+len(word)+1
+        terminals.append({"start": i, "end": i+1, "string": " "})
+        i = i+1
+    return terminals, i
+
+
+def create_tokens(sentence, token_start):
+    """ from a sentence dictionary having list of tokens, lemmas and pos, it creates a
+    json list having the same information according to the corpus data model schema """
+    tokens = []
+    i = token_start
+    for token, lemma, pos in zip(sentence["token"], sentence["lemma"], sentence["pos"]):
+        tokens.append(
+          {
+            "relation": {
+              "type": "tokenization",
+              "references": [
+                {"layer": 0, "node": i, "role": "tokenPart"}
+              ]
+            },
+            "annotations": {"pos": {"tag": pos}, "lemma": lemma}
+          },)
+        i = i+2
+    return tokens, i
+
+
+def process_sentence(sentence, token_idx, terminal_idx, char_idx):
+    """from a list of words that conforms a sentence, it creates a json dictionary having the
+    segment information and the full text of the sentence, in addition to a json list of terminals
+    and a json list of tokens according to the corpus data model schema."""
+    data = " ".join(sentence["text"])
+    terminals, char_idx = create_terminals(sentence["text"], char_idx)
+    tokens, terminal_idx = create_tokens(sentence, terminal_idx)
+    token_end = token_idx + len(tokens)
+    sentence = {
+        "relation": {
+          "type": "segment",
+          "references": [
+            {
+              "layer": 0,
+              "nodeRange": {"start": token_idx, "end": token_end},
+              "role": "part"
+            }
+          ]
+        },
+        "annotations": {
+          "unit": "sentence"
+        }
+      }
+    return data, terminals, tokens, sentence, token_end, terminal_idx, char_idx
+
+
+def layer_offsets(word_lengths, sentence_lengths, token_idx=0, terminal_idx=0, char_idx=0):
+    """ computes for a batch of sentences, with cumulative sums over the arrays of word lengths, the offsets
+    that create_terminals, create_tokens and process_sentence compute one word at a time: the start and
+    end of the terminal of every word (its space terminal ends one character later), the terminal node of
+    every token and the end of the nodeRange of every sentence. Returns the 5 lists and the token_idx,
+    terminal_idx and char_idx that follow the batch """
+    n_words = len(word_lengths)
+    if numpy is not None:
+        lengths = numpy.asarray(word_lengths, dtype=numpy.int64) + 2
+        # every word takes its length, the space included in its terminal and the space terminal
+        ends = numpy.cumsum(lengths) + char_idx
+        starts = (ends - lengths).tolist()
+        word_ends = (ends - 1).tolist()
+        ends = ends.tolist()
+        nodes = numpy.arange(terminal_idx, terminal_idx + 2 * n_words, 2).tolist()
+        sentence_ends = (numpy.cumsum(numpy.asarray(sentence_lengths, dtype=numpy.int64)) + token_idx).tolist()
+    else:
+        ends = list(accumulate((length + 2 for length in word_lengths), initial=char_idx))[1:]
+        starts = [end - length - 2 for end, length in zip(ends, word_lengths)]
+        word_ends = [end - 1 for end in ends]
+        nodes = list(range(terminal_idx, terminal_idx + 2 * n_words, 2))
+        sentence_ends = list(accumulate(sentence_lengths, initial=token_idx))[1:]
+    return (starts, word_ends, ends, nodes, sentence_ends, sentence_ends[-1] if sentence_ends else token_idx,
+            terminal_idx + 2 * n_words, ends[-1] if ends else char_idx)
+
+
+# value marking the places of the values in the templates of item_templates
+VALUE = "@@value@@"
+_templates = {}
+
+
+def item_templates(indent):
+    """ returns the beginning, item separator and end of a json list dumped by dump_json, and the templates
+    of its items: a word terminal followed by its space terminal, a token and a sentence node, with %s in
+    place of the values. They are made by dumping the same structures as process_sentence, so the text
+    is the one dump_json writes for them """
+    templates = _templates.get(indent)
+    if templates is None:
+        head, separator, tail = dump_json([0, 0], indent).split("0")
+        _, terminals, tokens, sentence, _, _, _ = process_sentence({"text": [""], "token": [""], "lemma": [""], "pos": [""]}, 0, 0, 0)
+        # the values become markers, replaced by %s once dumped. The order of the values of a template is
+        # the order of the keys: start, end, string, start and end of the space; node, pos, lemma; start, end
+        terminals[0].update(start=VALUE, end=VALUE, string=VALUE)
+        terminals[1].update(start=VALUE, end=VALUE)
+        tokens[0]["relation"]["references"][0]["node"] = VALUE
+        tokens[0]["annotations"].update(pos={"tag": VALUE}, lemma=VALUE)
+        sentence["relation"]["references"][0]["nodeRange"].update(start=VALUE, end=VALUE)
+        items = []
+        for values in (terminals, tokens, [sentence]):
+            text = dump_json(values, indent)[len(head):-len(tail)]
+            items.append(text.replace("%", "%%").replace('"' + VALUE + '"', "%s"))
+        templates = _templates[indent] = (head, separator, tail) + tuple(items)
+    return templates
+
+
+def serialize_sentences(segments, indent, token_idx=0, terminal_idx=0, char_idx=0):
+    """ converts a batch of sentences at once, like process_sentence does for each one: the offsets are
+    computed by layer_offsets and the json of the terminals, tokens and sentence nodes is written from the
+    lists of offsets, without creating a dict per node. It returns the text of every sentence, the 3 json
+    lists as dump_json(items, indent) would serialize them, and the next token_idx, terminal_idx and char_idx """
+    head, separator, tail, terminal_template, token_template, sentence_template = item_templates(indent)
+    words = list(chain.from_iterable(segment["text"] for segment in segments))
+    sentence_lengths = [len(segment["text"]) for segment in segments]
+    starts, word_ends, ends, nodes, sentence_ends, token_idx, terminal_idx, char_idx = layer_offsets(
+        [len(word) for word in words], sentence_lengths, token_idx, terminal_idx, char_idx)
+    sentence_starts = [sentence_end - length for sentence_end, length in zip(sentence_ends, sentence_lengths)]
+    encoded = [encode_basestring_ascii(word) for word in words]
+    terminals = head + separator.join(terminal_template % values for values in zip(starts, word_ends, encoded, word_ends, ends)) + tail
+    pos = [encode_basestring_ascii(tag) for tag in chain.from_iterable(segment["pos"] for segment in segments)]
+    lemmas = [encode_basestring_ascii(lemma) for lemma in chain.from_iterable(segment["lemma"] for segment in segments)]
+    tokens = head + separator.join(token_template % values for values in zip(nodes, pos, lemmas)) + tail
+    sentences = head + separator.join(sentence_template % values for values in zip(sentence_starts, sentence_ends)) + tail
+    data = [" ".join(segment["text"]) for segment in segments]
+    return data, terminals, tokens, sentences, token_idx, terminal_idx, char_idx
+
+
+def rows_segment(rows):
+    """ the sentence dictionary of the converters, from the rows of columns of a sentence (see pipeline.py) """
+    return {"text": [row[0] for row in rows], "token": [row[1] for row in rows],
+            "lemma": [row[2] for row in rows], "pos": [row[3] for row in rows]}
+
+
+def document_layers(doc_id, doc, terminals, text, tokens, sentences):
+    """ builds the json structure of the 5 output files of a document: document, datalayer, terminals,
+    tokens and sentences """
+    document_json = {
+        "$schema": "corpusDocument.schema.json",
+        "id": doc_id+".doc",
+        "metadata": doc
+    }
+
+    terminals_json = {
+        "$schema": "corpus.schema.json",
+        "documentId": doc_id + ".doc",
+        "id": doc_id + ".terminals",
+        "type": "terminal",
+        "content": {
+            "dataLayerRef": doc_id + ".data",
+            "terminals": terminals
+        }
+    }
+
+    datalayer_json = {
+        "$schema": "corpus.schema.json",
+        "id": doc_id + ".data",
+        "type": "data",
+        "documentId": doc_id + ".doc",
+        "content": {
+            "text": text
+        }
+    }
+
+    tokens_json = {
+        "$schema": "corpus.schema.json",
+        "id": doc_id + ".tokens",
+        "documentId": doc_id + ".document",
+        "type": "annotation",
+        "metadata": {
+            "annotationType": "tokenization",
+            "annotationSource": "",
+            "created": ""
+        },
+        "content":{
+            "layerRefs": [doc_id + ".terminals"],
+            "annotationNodes": tokens
+        }
+    }
+
+    sentences_json = {
+        "$schema": "corpus.schema.json",
+        "id": doc_id + ".sentences",
+        "documentId": doc_id + ".document",
+        "type": "annotation",
+        "metadata": {
+            "annotationTypes": ["segmentation"],
+            "annotationSource": "",
+            "created": ""
+        },
+        "content": {
+            "layerRefs": [doc_id + ".tokens"],
+            "annotationNodes": sentences
+        }
+    }
+    return document_json, datalayer_json, terminals_json, tokens_json, sentences_json
+
+
+def write_document(doc_id, doc, segments, f_datalayer, f_document, f_sentences, f_terminals, f_tokens):
+    """takes the json data created for a document and writes the json files """
+    document_json, datalayer_json, terminals_json, tokens_json, sentences_json = document_layers(
+        doc_id, doc, segments["terminals"], " ".join(segments["data"]), segments["tokens"], segments["sentences"])
+    json.dump(document_json, f_document, indent=2)
+    json.dump(terminals_json, f_terminals, indent=2)
+    json.dump(datalayer_json, f_datalayer, indent=2)
+    json.dump(tokens_json, f_tokens, indent=2)
+    json.dump(sentences_json, f_sentences, indent=2)
+
+
+# value used in the json templates of the streaming writers to mark where the streamed content goes
+PLACEHOLDER = "@@streamed@@"
+
+
+_encoders = {}
+
+
+def dump_json(data, indent):
+    """ serializes json data either indented or, when indent is None, in the most compact form.
+    The encoders are created once, json.dumps would create a new one on every call """
+    encoder = _encoders.get(indent)
+    if encoder is None:
+        if indent is None:
+            encoder = json.JSONEncoder(separators=(",", ":"))
+        else:
+            encoder = json.JSONEncoder(indent=indent)
+        _encoders[indent] = encoder
+    return encoder.encode(data)
+
+
+class JsonListWriter(object):
+    """ writes a json file made of a template where one value is a list whose items are appended one
+    at a time. The result is the same as dumping the whole structure with json.dump """
+
+    def __init__(self, f_out, template, indent):
+        self.f_out = f_out
+        head, self.tail = dump_json(template, indent).split('"' + PLACEHOLDER + '"')
+        if indent is None:
+            self.reindent = ""
+            self.end = "]"
+        else:
+            line = head[head.rfind("\n") + 1:]
+            depth = len(line) - len(line.lstrip(" "))
+            self.reindent = "\n" + " " * depth
+            self.end = "\n" + " " * depth + "]"
+        self.indent = indent
+        self.empty = True
+        f_out.write(head)
+
+    def write(self, items):
+        """ appends a list of items """
+        if not items:
+            return
+        # the items are serialized in one call, as a list
+        self.write_serialized(dump_json(items, self.indent))
+
+    def write_serialized(self, text):
+        """ appends the items of a non empty list already serialized with dump_json(items, indent). The
+        brackets are removed """
+        if self.indent is None:
+            text = text[1:-1]
+        else:
+            text = text[1:-2].replace("\n", self.reindent)
+        self.f_out.write(("[" if self.empty else ",") + text)
+        self.empty = False
+
+    def close(self):
+        """ writes the end of the list and of the template, closes the file and returns its size in bytes """
+        self.f_out.write(("[]" if self.empty else self.end) + self.tail)
+        size = self.f_out.tell()
+        self.f_out.close()
+        return size
+
+
+class JsonTextWriter(object):
+    """ writes a json file made of a template where one value is a string built by joining pieces
+    of text with a space. The pieces are appended one at a time """
+
+    def __init__(self, f_out, template, indent):
+        self.f_out = f_out
+        head, self.tail = dump_json(template, indent).split('"' + PLACEHOLDER + '"')
+        self.empty = True
+        f_out.write(head + '"')
+
+    def write(self, text):
+        """ appends a piece of text """
+        self.f_out.write(("" if self.empty else " ") + dump_json(text, None)[1:-1])
+        self.empty = False
+
+    def close(self):
+        """ writes the end of the string and of the template, closes the file and returns its size in bytes """
+        self.f_out.write('"' + self.tail)
+        size = self.f_out.tell()
+        self.f_out.close()
+        return size
+
+
+class JsonDocumentWriter(object):
+    """ writes the 5 json files of a document while the document is read: the terminals, tokens and
+    sentence nodes of every sentence are written as soon as the sentence is complete, so the memory
+    used does not depend on the size of the document. With indent=2 the files are the same as the
+    ones written by write_document, with indent=None they are written in compact form.
+    With batch_tokens the sentences are kept until they have batch_tokens tokens (or the document ends)
+    and are converted together by serialize_sentences, which writes the same files faster """
+
+    def __init__(self, output_file, doc_id, doc, indent=2, batch_tokens=0):
+        self.output_file = output_file
+        self.indent = indent
+        self.batch_tokens = batch_tokens
+        self.batch = []
+        self.batch_size = 0
+        self.token_idx = self.terminal_idx = self.char_idx = 0
+        document_json, datalayer_json, terminals_json, tokens_json, sentences_json = document_layers(
+            doc_id, doc, PLACEHOLDER, PLACEHOLDER, PLACEHOLDER, PLACEHOLDER)
+        f_document = self.open_file("document")
+        f_document.write(dump_json(document_json, indent))
+        # the sizes of the files are their positions when they are closed, no stat call is needed
+        self.size = f_document.tell()
+        f_document.close()
+        self.datalayer = JsonTextWriter(self.open_file("datalayer"), datalayer_json, indent)
+        self.terminals = JsonListWriter(self.open_file("terminals"), terminals_json, indent)
+        self.tokens = JsonListWriter(self.open_file("tokens"), tokens_json, indent)
+        self.sentences = JsonListWriter(self.open_file("sentences"), sentences_json, indent)
+
+    def open_file(self, file_type):
+        return io.open(self.output_file + "." + file_type + ".json", mode="w", encoding="utf-8")
+
+    def write_sentence(self, segment):
+        """ converts a sentence read from the vertical file and appends it to the output files """
+        if self.batch_tokens:
+            self.batch.append(segment)
+            self.batch_size += len(segment["text"])
+            if self.batch_size >= self.batch_tokens:
+                self.flush()
+            return
+        started = perf_counter()
+        data, terminals, tokens, sentence, self.token_idx, self.terminal_idx, self.char_idx = process_sentence(
+            segment, self.token_idx, self.terminal_idx, self.char_idx)
+        built = perf_counter()
+        self.datalayer.write(data)
+        self.terminals.write(terminals)
+        self.tokens.write(tokens)
+        self.sentences.write([sentence])
+        stats.times["layer_building"] += built - started
+        stats.times["serialization"] += perf_counter() - built
+
+    def flush(self):
+        """ converts the sentences of the batch and appends them to the output files """
+        if not self.batch:
+            return
+        started = perf_counter()
+        data, terminals, tokens, sentences, self.token_idx, self.terminal_idx, self.char_idx = serialize_sentences(
+            self.batch, self.indent, self.token_idx, self.terminal_idx, self.char_idx)
+        self.datalayer.write(" ".join(data))
+        if self.batch_size:
+            self.terminals.write_serialized(terminals)
+            self.tokens.write_serialized(tokens)
+        self.sentences.write_serialized(sentences)
+        # the layers are built and serialized in the same pass
+        stats.times["serialization"] += perf_counter() - started
+        self.batch = []
+        self.batch_size = 0
+
+    def output_size(self):
+        """ number of bytes written for the document, once it is closed """
+        return self.size
+
+    def close(self):
+        """ completes and closes the output files """
+        self.flush()
+        for writer in (self.datalayer, self.terminals, self.tokens, self.sentences):
+            self.size += writer.close()
+        stats.counts["bytes_written"] += self.output_size()
+
+    def abort(self):
+        """ closes and removes the output files of a document that was not completed """
+        for writer in (self.datalayer, self.terminals, self.tokens, self.sentences):
+            writer.f_out.close()
+        for file_type in ("document", "datalayer", "terminals", "tokens", "sentences"):
+            os.remove(self.output_file + "." + file_type + ".json")
+
+
+def stream_documents(f_in, out_dir=None, f=None, indent=2, new_writer=None, batch_tokens=0):
+    """ reads a vertical file with pipeline.read_events and writes the json files of every document while
+    it is read using a JsonDocumentWriter. It yields the output prefix of every document written.
+    new_writer(doc_id, doc) can be given to create other writers, e.g. the writers of the pack files of
+    packed_corpus.py """
+    writer = None
+    try:
+        for kind, document, _, rows in read_events(f_in, f or ""):
+            if kind == SENTENCE:
+                writer.write_sentence(rows_segment(rows))
+            elif kind == DOCUMENT_START:
+                doc = document_metadata(document.header)
+                if new_writer is not None:
+                    writer = new_writer(document.doc_id, doc)
+                else:
+                    writer = JsonDocumentWriter(join(out_dir, f + "." + document.doc_id), document.doc_id, doc,
+                                                indent, batch_tokens)
+            elif kind == DOCUMENT_END:
+                written, writer = writer, None
+                written.close()
+                yield written.output_file
+            else:
+                # a document without </doc> is not written
+                writer.abort()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.abort()
+
+
+def convert_file(f_in, out_dir, f, indent=2, writer_threads=0, batch_tokens=0):
+    """ stream_documents, with the output files written by a pool of writer_threads threads when it is not 0.
+    It yields the output prefix of every document, and it raises a WriteError if a file could not be written """
+    if not writer_threads:
+        for output_file in stream_documents(f_in, out_dir, f, indent, batch_tokens=batch_tokens):
+            yield output_file
+        return
+    from .background_writer import BackgroundWriter, BackgroundDocumentWriter
+    pool = BackgroundWriter(writer_threads)
+    documents = stream_documents(f_in, indent=indent, new_writer=lambda doc_id, doc: BackgroundDocumentWriter(
+        pool, join(out_dir, f + "." + doc_id), doc_id, doc, indent, batch_tokens))
+    completed = False
+    try:
+        for output_file in documents:
+            yield output_file
+        completed = True
+    finally:
+        # the document being read is discarded before the threads are stopped; the write errors are not
+        # raised over another exception
+        documents.close()
+        pool.close(raise_errors=completed)
+
+
+def split_file(filename, n_ranges):
+    """ splits a vertical file in at most n_ranges byte ranges. Every range but the first one starts at
+    the beginning of a "<doc " line, so no document is split between two ranges """
+    size = getsize(filename)
+    starts = [0]
+    with io.open(filename, mode="rb") as f_in:
+        for i in range(1, n_ranges):
+            f_in.seek(max(size * i // n_ranges, starts[-1]))
+            # skip the (possibly partial) line we landed on
+            f_in.readline()
+            pos = f_in.tell()
+            line = f_in.readline()
+            while line and not line.startswith(b"<doc "):
+                pos = f_in.tell()
+                line = f_in.readline()
+            if not line:
+                break
+            if pos > starts[-1]:
+                starts.append(pos)
+    ends = starts[1:] + [size]
+    return list(zip(starts, ends))
+
+
+def read_range(filename, start, end):
+    """ yields the lines of a vertical file found between two byte offsets """
+    with io.open(filename, mode="rb") as f_in:
+        f_in.seek(start)
+        pos = start
+        for line in f_in:
+            if pos >= end:
+                break
+            pos += len(line)
+            yield line.decode("utf-8")
+
+
+def convert_range(job):
+    """ worker function: converts the documents found in a byte range of a vertical file, or all the
+    documents of a compressed vertical file. It returns a summary of the work done, used to report the progress of every worker, and the
+    counters and timers of the range """
+    d, f, start, end, out_dir, indent, pack_file, writer_threads, batch_tokens = job
+    started = time.time()
+    # worker processes convert several ranges, the counters are the ones of this range only
+    stats.reset()
+    stats.counts["bytes_read"] += end - start
+    n_docs = 0
+    compression = detect_compression(join(d, f))
+    f_input = open_vertical(join(d, f)) if compression else read_range(join(d, f), start, end)
+    name = source_name(f, compression)
+    if pack_file:
+        from .packed_corpus import PackWriter, stream_to_pack
+        pack = PackWriter(join(out_dir, pack_file), name)
+        for _ in stream_to_pack(f_input, pack, indent, batch_tokens):
+            n_docs += 1
+        pack.close()
+    else:
+        for _ in convert_file(f_input, out_dir, name, indent, writer_threads, batch_tokens):
+            n_docs += 1
+    f_input.close()
+    return os.getpid(), f, n_docs, end - start, time.time() - started, stats.as_dict()
+
+
+def convert_parallel(filenames_list, out_dir, workers, indent=2, pack=False, quiet=False, writer_threads=0, batch_tokens=0):
+    """ splits every input file in byte ranges and converts them with a pool of worker processes; a
+    compressed file is a single range. Prints a progress line per finished range and a summary per worker at the end, unless quiet is set.
+    The counters and timers of the workers are added to the stats of the main process """
+    jobs = []
+    for d, f in filenames_list:
+        compression = detect_compression(join(d, f))
+        # a few ranges per worker so that a slow range does not leave the others idle
+        ranges = [(0, getsize(join(d, f)))] if compression else split_file(join(d, f), workers * 4)
+        for i, (start, end) in enumerate(ranges):
+            pack_file = "%s.%d.pack" % (source_name(f, compression), i) if pack else None
+            jobs.append((d, f, start, end, out_dir, indent, pack_file, writer_threads, batch_tokens))
+
+    summary = {}
+    with Pool(workers) as pool:
+        for i, (pid, f, n_docs, n_bytes, seconds, range_stats) in enumerate(pool.imap_unordered(convert_range, jobs)):
+            stats.merge(range_stats)
+            if not quiet:
+                print("Finished range %d/%d of %s: %d documents" % (i + 1, len(jobs), f, n_docs))
+            ranges, docs, total_bytes, total_seconds = summary.get(pid, (0, 0, 0, 0.0))
+            summary[pid] = (ranges + 1, docs + n_docs, total_bytes + n_bytes, total_seconds + seconds)
+
+    if quiet:
+        return
+    print("Worker summary:")
+    for pid, (ranges, docs, total_bytes, total_seconds) in sorted(summary.items()):
+        print("  worker %d: %d ranges, %d documents, %.1f MB in %.2f s" % (pid, ranges, docs, total_bytes / 1e6, total_seconds))
+
+
+def output_files(out_dir, f, doc_id):
+    """ names of the 5 json files written for a document """
+    return [join(out_dir, f + "." + doc_id + "." + file_type + ".json")
+            for file_type in ("document", "datalayer", "terminals", "tokens", "sentences")]
+
+
+def convert_incremental(d, f, out_dir, manifest, indent=2, batch_tokens=0):
+    """ converts the documents of a vertical file that are not up to date in the manifest and removes the
+    outputs of the documents recorded for the file that it no longer contains. Returns the numbers of
+    documents converted, skipped and removed """
+    filename = join(d, f)
+    options = {"indent": indent, "batch_tokens": batch_tokens}
+    # when a doc_id is repeated the last document wins, as in a full run
+    documents = {}
+    for doc_id, start, end, digest in document_digests(filename):
+        documents.pop(doc_id, None)
+        documents[doc_id] = (start, end, digest)
+
+    converted = skipped = removed = 0
+    for doc_id in manifest.documents(f):
+        if doc_id not in documents:
+            manifest.remove(f, doc_id)
+            removed += 1
+    for doc_id, (start, end, digest) in documents.items():
+        if manifest.up_to_date(f, doc_id, digest, options):
+            skipped += 1
+            continue
+        for _ in stream_documents(read_range(filename, start, end), out_dir, f, indent, batch_tokens=batch_tokens):
+            manifest.record(f, doc_id, digest, output_files(out_dir, f, doc_id), options)
+            converted += 1
+    return converted, skipped, removed
+
+
+def convert_followed(filename, out_dir, checkpoint, indent=2, writer_threads=0, batch_tokens=0,
+                     poll_interval=follow.POLL_INTERVAL, idle_timeout=None):
+    """ converts the documents appended to a vertical file as they are completed (see follow.py). It yields
+    the output prefixes of the documents of every new part of the file once their files are written; the
+    checkpoint is saved when the next part is asked for """
+    name = source_name(basename(filename), None)
+    for lines in follow_documents(filename, checkpoint, poll_interval, idle_timeout):
+        yield list(convert_file(lines, out_dir, name, indent, writer_threads, batch_tokens))
+
+
+def remove_missing_sources(manifest, sources):
+    """ removes the outputs of the documents of the input files recorded in the manifest that are not in
+    sources. Returns the number of documents removed """
+    removed = 0
+    for source in manifest.sources() - set(sources):
+        for doc_id in manifest.documents(source):
+            manifest.remove(source, doc_id)
+            removed += 1
+    return removed
+
+
+def main(argv=None):
+    """ if the input parameter is a folder, reads all the files in the folder and process them to extract the 
+    text information. 5 output files are created for every document in the vertical files. Note that every 
+    vertical file can contain more than one document. """
+    parser = argparse.ArgumentParser(description='Reads input file in vertical format and outputs a collection of json files')
+    parser.add_argument("--input", help="input filename")
+    parser.add_argument("--out_dir", help="output folder")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--compact", action="store_true", help="write the json files without indentation")
+    parser.add_argument("--incremental", action="store_true", help="only convert the documents that changed since the last run")
+    parser.add_argument("--manifest", help="manifest file of the incremental runs, by default manifest.jsonl in out_dir")
+    parser.add_argument("--pack", action="store_true", help="write one pack file per input file instead of 5 files per document")
+    parser.add_argument("--writer_threads", type=int, default=0, help="number of threads writing the output files in the background")
+    parser.add_argument("--batch_tokens", type=int, default=0, help="convert the sentences of a document in batches of N tokens")
+    parser.add_argument("--validate", choices=["exhaustive", "sampled"], help="validate the json files of the output folder at the end")
+    validate_json.add_arguments(parser)
+    compressed_input.add_arguments(parser)
+    follow.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.follow:
+        if not args.input or isdir(args.input) or (isfile(args.input) and detect_compression(args.input)):
+            parser.error("--follow needs an uncompressed input file")
+        if args.workers > 1 or args.incremental or args.pack:
+            parser.error("--follow cannot be used with --workers, --incremental or --pack")
+    if args.incremental and args.workers > 1:
+        parser.error("--incremental runs with a single worker")
+    if args.incremental and args.pack:
+        parser.error("--incremental writes individual files, it cannot be used with --pack")
+    if args.writer_threads and (args.incremental or args.pack):
+        parser.error("--writer_threads cannot be used with --incremental or --pack")
+    if args.validate and args.pack:
+        parser.error("--validate checks the json files, it cannot be used with --pack")
+    if args.schema_dir and validate_json.jsonschema is None:
+        parser.error("--schema_dir needs the jsonschema module")
+
+    if not args.quiet:
+        print('Reading from:', args.input)
+        print('Writing to:', args.out_dir)
+    makedirs(args.out_dir, exist_ok=True)
+
+    # determine if the input is a file or a folder, a followed file is read by convert_followed
+    filenames_list = [] if args.follow else input_files(args.input)
+    if args.incremental and any(detect_compression(join(d, f)) for d, f in filenames_list):
+        parser.error("--incremental reads uncompressed input files only")
+
+    indent = None if args.compact else 2
+    instrumentation.start(args)
+    if args.follow:
+        checkpoint = Checkpoint(args.checkpoint or checkpoint_filename(args.input))
+        # stopped as with Ctrl-C: the checkpoint is the one of the last documents written
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            for output_files_list in convert_followed(args.input, args.out_dir, checkpoint, indent, args.writer_threads,
+                                                      args.batch_tokens, args.poll_interval, args.idle_timeout):
+                if not args.quiet:
+                    for output_file in output_files_list:
+                        print("Wrote files with prefix", output_file)
+        except KeyboardInterrupt:
+            pass
+    elif args.incremental:
+        manifest = Manifest(args.manifest or join(args.out_dir, MANIFEST))
+        for d, f in filenames_list:
+            if not args.quiet:
+                print('Reading :', join(d, f))
+            stats.counts["bytes_read"] += getsize(join(d, f))
+            converted, skipped, removed = convert_incremental(d, f, args.out_dir, manifest, indent, args.batch_tokens)
+            if not args.quiet:
+                print("Converted %d documents, skipped %d unchanged, removed %d orphans" % (converted, skipped, removed))
+        # a single input file says nothing about the other files recorded in the manifest
+        if isdir(args.input):
+            removed = remove_missing_sources(manifest, [f for _, f in filenames_list])
+            if not args.quiet and removed:
+                print("Removed %d documents of input files no longer in %s" % (removed, args.input))
+        manifest.close()
+    elif args.workers > 1:
+        convert_parallel(filenames_list, args.out_dir, args.workers, indent, args.pack, args.quiet, args.writer_threads,
+                         args.batch_tokens)
+    elif args.pack:
+        from .packed_corpus import PackWriter, stream_to_pack
+        for d, f in filenames_list:
+            f_input = open_vertical(join(d, f), args.decompress_threads)
+            name = source_name(f, detect_compression(join(d, f)))
+            if not args.quiet:
+                print('Reading :', join(d, f))
+            stats.counts["bytes_read"] += getsize(join(d, f))
+            pack = PackWriter(join(args.out_dir, name + ".pack"), name)
+            n_docs = 0
+            for _ in stream_to_pack(f_input, pack, indent, args.batch_tokens):
+                n_docs += 1
+            pack.close()
+            f_input.close()
+            if not args.quiet:
+                print("Wrote", n_docs, "documents to", pack.filename)
+    else:
+        for d, f in filenames_list:
+            # open input file
+            f_input = open_vertical(join(d, f), args.decompress_threads)
+            name = source_name(f, detect_compression(join(d, f)))
+            if not args.quiet:
+                print('Reading :', join(d, f))
+            stats.counts["bytes_read"] += getsize(join(d, f))
+            for output_file in convert_file(f_input, args.out_dir, name, indent, args.writer_threads, args.batch_tokens):
+                if not args.quiet:
+                    print("Wrote files with prefix", output_file)
+            f_input.close()
+    instrumentation.finish(args)
+    if args.validate:
+        started = perf_counter()
+        n_documents, errors = validate_json.validate_folder(args.out_dir, args.schema_dir, args.validate, args.sample_rate,
+                                                            args.workers, args.batch)
+        validate_json.report(n_documents, errors, perf_counter() - started)
+        if errors:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Byte offset index over a vertical file, to convert single documents without reading the whole file.
+
+The index is a sidecar file (by default <input file>.idx) that records, for every document, its
+primary_doc_id, the byte range of its lines from <doc ...> to </doc>, and its number of sentences and
+tokens. It also records the size and modification time of the vertical file, so a stale index is
+detected and rebuilt.
+
+Binary layout of the index file (little endian):
+* header: 8 bytes magic "VRTIDX01", source size (uint64), source mtime in ns (uint64), number of
+  documents (uint32)
+* one record per document: start offset (uint64), length in bytes (uint32), sentences (uint32),
+  tokens (uint32), length of the doc_id (uint16), doc_id encoded in utf-8
+
+The documents are read from a memory map of the vertical file and sent to the sinks of vertical2all.py.
+The byte offsets are offsets in the file itself, so compressed vertical files cannot be indexed; they
+raise a ValueError and must be decompressed first.
+
+How to run it:
+python -m sdllod19.vertical_index --input <input file> [--index <index file>]
+    builds the index (or rebuilds it when it is stale) and prints a summary.
+python -m sdllod19.vertical_index --input <input file> --list
+    prints the doc_id, sentences and tokens of every document.
+python -m sdllod19.vertical_index --input <input file> --docs <doc_id> ... [--docs_file <file>] [--json_dir <folder>] ...
+    converts only the given documents, with the same output parameters as vertical2all.py.
+"""
+
+import io
+import os
+import mmap
+import struct
+import argparse
+from os.path import basename, isfile
+from collections import namedtuple
+
+from .doc_header import parse_header, HeaderError
+from .compressed_input import detect_compression
+
+MAGIC = b"VRTIDX01"
+_HEADER = struct.Struct("<8sQQI")
+_RECORD = struct.Struct("<QIIIH")
+
+DocumentEntry = namedtuple("DocumentEntry", ["doc_id", "start", "end", "sentences", "tokens"])
+
+
+def scan_documents(f_in):
+    """ reads a vertical file opened in binary mode and yields a DocumentEntry for every complete
+    document. Documents whose header cannot be parsed are skipped, as the converters do """
+    pos = 0
+    doc_id = start = None
+    sentences = tokens = 0
+    for line in f_in:
+        if line.startswith(b"<doc "):
+            try:
+                doc_id = parse_header(line.decode("utf-8"))["primary_doc_id"]
+            except (HeaderError, KeyError):
+                doc_id = None
+            start = pos
+            sentences = tokens = 0
+        elif doc_id is None:
+            pass
+        elif line.startswith(b"</doc>"):
+            yield DocumentEntry(doc_id, start, pos + len(line), sentences, tokens)
+            doc_id = None
+        elif line.startswith(b"</s>"):
+            sentences += 1
+        elif not line.startswith(b"<s>"):
+            tokens += 1
+        pos += len(line)
+
+
+def source_signature(filename):
+    """ size and modification time of a vertical file, stored in the index to detect changes """
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns
+
+
+def check_uncompressed(filename):
+    """ raises a ValueError when a vertical file is compressed: its documents cannot be read at byte offsets """
+    compression = detect_compression(filename)
+    if compression:
+        raise ValueError("%s is compressed with %s, decompress it before indexing it" % (filename, compression))
+
+
+def build_index(filename, index_filename=None):
+    """ scans a vertical file and writes its index file. It returns the list of DocumentEntry """
+    check_uncompressed(filename)
+    index_filename = index_filename or filename + ".idx"
+    size, mtime_ns = source_signature(filename)
+    with io.open(filename, mode="rb") as f_in:
+        entries = list(scan_documents(f_in))
+    with io.open(index_filename, mode="wb") as f_out:
+        f_out.write(_HEADER.pack(MAGIC, size, mtime_ns, len(entries)))
+        for entry in entries:
+            doc_id = entry.doc_id.encode("utf-8")
+            f_out.write(_RECORD.pack(entry.start, entry.end - entry.start, entry.sentences, entry.tokens, len(doc_id)))
+            f_out.write(doc_id)
+    return entries
+
+
+def read_index(index_filename):
+    """ reads an index file. It returns the source signature and the list of DocumentEntry """
+    with io.open(index_filename, mode="rb") as f_in:
+        data = f_in.read()
+    magic, size, mtime_ns, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("%s is not a vertical index file" % index_filename)
+    entries = []
+    pos = _HEADER.size
+    for _ in range(count):
+        start, length, sentences, tokens, id_length = _RECORD.unpack_from(data, pos)
+        pos += _RECORD.size
+        doc_id = data[pos:pos + id_length].decode("utf-8")
+        pos += id_length
+        entries.append(DocumentEntry(doc_id, start, start + length, sentences, tokens))
+    return (size, mtime_ns), entries
+
+
+class VerticalIndex(object):
+    """ random access to the documents of a vertical file through its index. The index is built when
+    it does not exist or when the vertical file has changed since it was built """
+
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        self.index_filename = index_filename or filename + ".idx"
+        check_uncompressed(filename)
+        entries = None
+        if isfile(self.index_filename):
+            signature, entries = read_index(self.index_filename)
+            if signature != source_signature(filename):
+                entries = None
+        if entries is None:
+            entries = build_index(filename, self.index_filename)
+        self.entries = entries
+        self.by_id = dict((entry.doc_id, entry) for entry in entries)
+        self.f_in = self.map = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.by_id
+
+    def document_bytes(self, doc_id):
+        """ returns the bytes of a document, from its <doc ...> line to its </doc> line """
+        if self.map is None:
+            self.f_in = io.open(self.filename, mode="rb")
+            self.map = mmap.mmap(self.f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        entry = self.by_id[doc_id]
+        return self.map[entry.start:entry.end]
+
+    def document_lines(self, doc_id):
+        """ returns the lines of a document, ready to be given to pipeline.read_events or read_vertical. They are
+        decoded as by open_vertical: str.splitlines would also split on characters such as \x0c, \x85 or
+        \u2028, which occur in the tokens of web pages """
+        return list(io.TextIOWrapper(io.BytesIO(self.document_bytes(doc_id)), encoding="utf-8"))
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.f_in.close()
+            self.map = self.f_in = None
+
+
+if __name__ == '__main__':
+    from .vertical2all import add_sink_arguments, make_sinks, read_vertical
+
+    parser = argparse.ArgumentParser(description='Builds the byte offset index of a vertical file and converts single documents with it')
+    parser.add_argument("--input", required=True, help="input vertical file")
+    parser.add_argument("--index", help="index file, by default <input>.idx")
+    parser.add_argument("--list", action="store_true", help="print the documents found in the index")
+    parser.add_argument("--docs", nargs="*", default=[], help="ids of the documents to convert")
+    parser.add_argument("--docs_file", help="file with the ids of the documents to convert, one per line")
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        index = VerticalIndex(args.input, args.index)
+    except ValueError as ex:
+        parser.error(str(ex))
+    print("Index", index.index_filename, ":", len(index), "documents,",
+          sum(e.sentences for e in index.entries), "sentences,", sum(e.tokens for e in index.entries), "tokens")
+    if args.list:
+        for entry in index.entries:
+            print(entry.doc_id, entry.sentences, entry.tokens)
+
+    doc_ids = list(args.docs)
+    if args.docs_file:
+        with io.open(args.docs_file, mode="r", encoding="utf-8") as f_docs:
+            doc_ids.extend(line.strip() for line in f_docs if line.strip())
+    if doc_ids:
+        sinks = make_sinks(args)
+        if not sinks:
+            parser.error("at least one of --json_dir, --conll_dir, --metadata_dir, --conllrdf_dir and --tokens_dir is required")
+        n_docs = 0
+        for doc_id in doc_ids:
+            if doc_id not in index:
+                print("Document not found:", doc_id)
+                continue
+            for _ in read_vertical(index.document_lines(doc_id), basename(args.input), sinks):
+                n_docs += 1
+        for sink in sinks:
+            sink.close()
+        index.close()
+        print("Converted", n_docs, "documents")
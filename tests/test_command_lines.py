@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the command lines of the scripts that share the sink parameters of vertical2all.py build
+their argument parsers: a parameter defined twice makes argparse fail before anything is read.
+
+How to run it:
+python -m pytest tests
+"""
+
+import sys
+import subprocess
+import unittest
+from os.path import abspath, dirname
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+SCRIPTS = ("vertical_index", "vertical2all", "near_duplicates")
+
+
+class CommandLineTest(unittest.TestCase):
+
+    def test_help(self):
+        for script in SCRIPTS:
+            with self.subTest(script=script):
+                result = subprocess.run([sys.executable, "-m", "sdllod19." + script, "--help"], cwd=ROOT,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+                self.assertEqual(result.returncode, 0, result.stderr)
+                self.assertIn("usage:", result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
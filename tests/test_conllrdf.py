@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the CoNLL-RDF files written by conllrdf.py from the sample Komodo vertical file have the
+same triples as the files of the CoNLL-RDF toolchain in datasets/oup/conll-rdf.
+
+The files are not read with conllrdf.read_triples, whose bugs would show on both sides, but with a Turtle
+parser that shares no code with conllrdf.py: rdflib when it is installed, the TurtleParser of
+triple_store.py otherwise.
+
+How to run it:
+python -m pytest tests
+"""
+
+import io
+import sys
+import shutil
+import tempfile
+import unittest
+from os import listdir
+from os.path import abspath, dirname, join
+
+try:
+    import rdflib
+except ImportError:
+    rdflib = None
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sdllod19.conllrdf import ConllRdfSink
+from sdllod19.triple_store import TurtleParser
+from sdllod19.vertical2all import read_vertical
+
+SAMPLE = join(ROOT, "datasets", "oup", "komodo_mar_concat_100K.docend.txt")
+REFERENCE = join(ROOT, "datasets", "oup", "conll-rdf")
+
+
+def file_triples(filename):
+    """ the set of triples of a Turtle file """
+    if rdflib is not None:
+        return set(rdflib.Graph().parse(filename, format="turtle"))
+    triples = set()
+    with io.open(filename, mode="r", encoding="utf-8") as f_in:
+        TurtleParser(f_in.read(), lambda s, p, o: triples.add((s, p, o))).parse()
+    return triples
+
+
+class ConllRdfTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.out_dir = tempfile.mkdtemp(prefix="test_conllrdf_")
+        sink = ConllRdfSink(cls.out_dir)
+        with io.open(SAMPLE, mode="r", encoding="utf-8") as f_in:
+            cls.doc_ids = list(read_vertical(f_in, "sample", [sink]))
+        sink.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.out_dir)
+
+    def test_same_documents(self):
+        self.assertEqual(sorted(doc_id + ".ttl" for doc_id in self.doc_ids), sorted(listdir(REFERENCE)))
+        self.assertEqual(sorted(listdir(self.out_dir)), sorted(listdir(REFERENCE)))
+
+    def test_same_triples(self):
+        for name in sorted(listdir(REFERENCE)):
+            with self.subTest(document=name):
+                expected = file_triples(join(REFERENCE, name))
+                written = file_triples(join(self.out_dir, name))
+                self.assertTrue(expected)
+                self.assertEqual(written, expected, "%d triples missing, %d unexpected"
+                                 % (len(expected - written), len(written - expected)))
+
+
+if __name__ == '__main__':
+    unittest.main()